@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:04
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from utils.migrations import PostgresOnly
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_rename_email_verified_user_account_activated'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        PostgresOnly(
+            migrations.AddIndex(
+                model_name='user',
+                index=django.contrib.postgres.indexes.GinIndex(fields=['username'], name='accounts_user_username_trgm', opclasses=('gin_trgm_ops',)),
+            )
+        ),
+    ]
@@ -2,6 +2,7 @@ from uuid import uuid4
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
 
 
 class User(AbstractUser):
@@ -23,6 +24,10 @@ class User(AbstractUser):
         ordering = ('-created',)
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # fuzzy and prefix username matching with pg_trgm
+            GinIndex(fields=('username',), name='accounts_user_username_trgm', opclasses=('gin_trgm_ops',)),
+        ]
 
     def __str__(self):
         return self.username
@@ -0,0 +1,27 @@
+from rest_framework import serializers
+
+from utils.files import get_accepted_image_formats
+
+
+class RenditionsField(serializers.ReadOnlyField):
+
+    """
+    Serializes an ImageRenditions object into a mapping of
+    rendition names to absolute URLs, in the best image format
+    listed in the request's Accept header (JPEG otherwise).
+    """
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+
+        if request is None:
+            return value.urls()
+
+        urls = value.urls(
+            accept=get_accepted_image_formats(request.META.get('HTTP_ACCEPT', ''))
+        )
+
+        return {
+            rendition: request.build_absolute_uri(url)
+            for rendition, url in urls.items()
+        }
@@ -0,0 +1,48 @@
+from django.conf import settings
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+from utils.pagination import KeysetPaginator, CursorPage
+
+
+class PostCursorPagination(CursorPagination):
+
+    """
+    Cursor pagination for post listings, backed by the same keyset
+    paginator as the HTML grids. Never runs a count query.
+    """
+
+    page_size = getattr(settings, 'POSTS_PER_PAGE', 5)
+    ordering = ('-created', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        paginator = KeysetPaginator(
+            queryset, per_page=self.page_size, ordering=self.ordering
+        )
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        if cursor and paginator.get_cursor_values(cursor) is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return self.paginate_page(paginator.page(cursor), request)
+
+    def paginate_page(self, page: CursorPage, request):
+        self.page = page
+        self.request = request
+
+        return list(page)
+
+    def get_next_link(self):
+        if not self.page.has_next():
+            return None
+
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.page.next_cursor
+        )
+
+    def get_previous_link(self):
+        return None
@@ -4,6 +4,8 @@ from apps.posts.models import (
     Post, Tag, PostMedia, Comment
 )
 
+from apps.api.fields import RenditionsField
+
 
 class TagSerializer(serializers.ModelSerializer):
 
@@ -13,7 +15,7 @@ class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'slug')
 
 
 class PostMediaSerializer(serializers.ModelSerializer):
@@ -21,10 +23,12 @@ class PostMediaSerializer(serializers.ModelSerializer):
     """
     Serializer for post media files.
     """
+
+    renditions = RenditionsField(source='images')
     
     class Meta:
         model = PostMedia
-        fields = ('id', 'file', 'created')
+        fields = ('id', 'file', 'renditions', 'created')
 
 
 class PostSerializer(serializers.ModelSerializer):
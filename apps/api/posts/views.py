@@ -1,9 +1,5 @@
-from django.db.models import (
-    Count, Exists, OuterRef, Q, F, Case, When, IntegerField
-)
-from django.utils import timezone
-
-from datetime import timedelta
+from django.db.models import Exists, OuterRef
+from django.db import transaction
 
 from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
@@ -11,7 +7,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
 
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
@@ -23,9 +19,14 @@ from .serializers import (
     CommentSerializer
 )
 from apps.api.permissions import IsAuthorOrReadOnly
+from apps.api.pagination import PostCursorPagination
 
 from apps.posts.models import Post, Like, Save, Comment
-from apps.posts.views import get_feed_queryset
+from apps.posts import counters, engagement
+from apps.posts.media import create_post_media
+from apps.posts import timeline
+
+from utils.pagination import sort_by_ids
 
 
 class PostViewSet(ModelViewSet):
@@ -37,7 +38,9 @@ class PostViewSet(ModelViewSet):
     serializer_class = PostSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated, IsAuthorOrReadOnly]
+    pagination_class = PostCursorPagination
     http_method_names = ['get', 'patch', 'post', 'delete']
+    lookup_value_regex = r'\d+'
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -54,12 +57,9 @@ class PostViewSet(ModelViewSet):
                 'author', 'author__profile'
             )
             .prefetch_related(
-                'media', 'tags', 'likes', 'comments'
+                'media', 'tags'
             )
             .annotate(
-                likes_count=Count('likes', distinct=True),
-                comments_count=Count('comments', distinct=True),
-
                 liked_by_user=Exists(
                     Like.objects.filter(
                         user=self.request.user, post=OuterRef('pk')
@@ -83,6 +83,30 @@ class PostViewSet(ModelViewSet):
             queryset = queryset.filter(caption__icontains=caption)
 
         return queryset
+
+    def apply_engagement(self, posts) -> list:
+        return engagement.apply_state(
+            posts,
+            self.request.user.pk,
+            liked_attr='liked_by_user',
+            saved_attr='saved_by_user'
+        )
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+
+        if page is None:
+            return None
+
+        return self.apply_engagement(page)
+
+    def get_object(self):
+        post = super().get_object()
+
+        if self.action == 'retrieve':
+            self.apply_engagement([post])
+
+        return post
     
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -107,10 +131,15 @@ class PostViewSet(ModelViewSet):
 
         serializer = PostMediaSerializer(data=data, many=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save(post=post)
+
+        media = create_post_media(
+            post, [item['file'] for item in serializer.validated_data]
+        )
 
         return Response(
-            serializer.data,
+            PostMediaSerializer(
+                media, many=True, context=self.get_serializer_context()
+            ).data,
             status=status.HTTP_201_CREATED
         )
 
@@ -120,17 +149,38 @@ class PostViewSet(ModelViewSet):
         url_path='like'
     )
     def like(self, request, pk=None):
-        post = get_object_or_404(Post, pk=pk)
+        if engagement.is_enabled():
+            state = engagement.set_state(
+                engagement.LIKES, int(pk), request.user.pk, active=True
+            )
+            if state is None:
+                raise NotFound()
+
+            if not state[0]:
+                return Response(
+                    {'detail': 'You have already liked this post.'},
+                    status=status.HTTP_409_CONFLICT
+                )
 
-        if Like.objects.filter(
-            user=self.request.user, post=post
-        ).exists():
             return Response(
-                {'detail': 'You have already liked this post.'},
-                status=status.HTTP_409_CONFLICT
+                {'detail': 'You liked this post.'},
+                status=status.HTTP_201_CREATED
             )
-        
-        Like.objects.create(user=self.request.user, post=post)
+
+        post = get_object_or_404(Post, pk=pk)
+
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(
+                user=self.request.user, post=post
+            )
+
+            if not created:
+                return Response(
+                    {'detail': 'You have already liked this post.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            counters.adjust_counter(post.pk, 'likes_count', 1)
 
         return Response(
             {'detail': 'You liked this post.'},
@@ -143,23 +193,41 @@ class PostViewSet(ModelViewSet):
         url_path='unlike'
     )
     def unlike(self, request, pk=None):
-        post = get_object_or_404(Post, pk=pk)
-
-        try:
-            like = Like.objects.get(
-                user=self.request.user, post=post
+        if engagement.is_enabled():
+            state = engagement.set_state(
+                engagement.LIKES, int(pk), request.user.pk, active=False
             )
+            if state is None:
+                raise NotFound()
 
-            like.delete()
+            if not state[0]:
+                return Response(
+                    {'detail': 'You have not liked this post.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
 
             return Response(
                 status=status.HTTP_204_NO_CONTENT
             )
-        except Like.DoesNotExist:
-            return Response(
-                {'detail': 'You have not liked this post.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+
+        post = get_object_or_404(Post, pk=pk)
+
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(
+                user=self.request.user, post=post
+            ).delete()
+
+            if not deleted:
+                return Response(
+                    {'detail': 'You have not liked this post.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            counters.adjust_counter(post.pk, 'likes_count', -1)
+
+        return Response(
+            status=status.HTTP_204_NO_CONTENT
+        )
 
     @action(
         methods=["GET"],
@@ -170,9 +238,10 @@ class PostViewSet(ModelViewSet):
         user = request.user
 
         queryset = self.get_queryset().filter(author=user)
-        serializer = PostListSerializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = PostListSerializer(page, many=True)
 
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
     
     @action(
         methods=['GET'],
@@ -183,9 +252,10 @@ class PostViewSet(ModelViewSet):
         user = request.user
 
         queryset = self.get_queryset().filter(likes__user=user)
-        serializer = PostListSerializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = PostListSerializer(page, many=True)
 
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
     
     @action(
         methods=['GET'],
@@ -196,9 +266,10 @@ class PostViewSet(ModelViewSet):
         user = request.user
 
         queryset = self.get_queryset().filter(saves__user=user)
-        serializer = PostListSerializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = PostListSerializer(page, many=True)
 
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=['GET'],
@@ -207,10 +278,20 @@ class PostViewSet(ModelViewSet):
     )
     def feed(self, request):
         user = request.user
-        queryset = get_feed_queryset(user)
-        serializer = PostListSerializer(queryset, many=True)
 
-        return Response(serializer.data)
+        page = timeline.get_timeline_page(
+            user,
+            cursor=request.query_params.get(self.paginator.cursor_query_param),
+            per_page=self.paginator.page_size
+        )
+        page_ids = self.paginator.paginate_page(page, request)
+
+        posts = self.apply_engagement(
+            sort_by_ids(self.get_queryset().filter(pk__in=page_ids), page_ids)
+        )
+        serializer = PostListSerializer(posts, many=True)
+
+        return self.get_paginated_response(serializer.data)
 
 
 class CommentViewSet(ModelViewSet):
@@ -238,10 +319,12 @@ class CommentViewSet(ModelViewSet):
         if parent and parent.level >= 4:
             raise ValidationError('Maximum reply depth reached (5 levels).')
 
-        serializer.save(
-            author=self.request.user,
-            post=post
-        )
+        with transaction.atomic():
+            serializer.save(
+                author=self.request.user,
+                post=post
+            )
+            counters.adjust_counter(post.pk, 'comments_count', 1)
 
     def destroy(self, request, *args, **kwargs):
         return Response(
@@ -260,11 +343,14 @@ class CommentViewSet(ModelViewSet):
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(
-            author=request.user,
-            post=post,
-            parent=comment
-        )
+
+        with transaction.atomic():
+            serializer.save(
+                author=request.user,
+                post=post,
+                parent=comment
+            )
+            counters.adjust_counter(post.pk, 'comments_count', 1)
 
         return Response(
             serializer.data,
@@ -2,6 +2,8 @@ from rest_framework import serializers
 
 from apps.profiles.models import Profile, Follow
 
+from apps.api.fields import RenditionsField
+
 
 class ProfileSerializer(serializers.ModelSerializer):
 
@@ -15,6 +17,7 @@ class ProfileSerializer(serializers.ModelSerializer):
     email = serializers.CharField(source='user.email', read_only=True)
 
     image = serializers.ImageField(required=False, allow_null=True)
+    renditions = RenditionsField(source='images')
 
     followers_count = serializers.IntegerField(read_only=True)
     following_count = serializers.IntegerField(read_only=True)
@@ -27,6 +30,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             'full_name',
             'email',
             'image',
+            'renditions',
             'followers_count',
             'following_count',
             'bio',
@@ -58,6 +62,7 @@ class ProfileListSerializer(ProfileSerializer):
             'username',
             'full_name',
             'image',
+            'renditions',
             'followed_by_me',
         )
 
@@ -2,6 +2,8 @@ from rest_framework import serializers
 
 from apps.stories.models import Story, Collection
 
+from apps.api.fields import RenditionsField
+
 
 class StorySerializer(serializers.ModelSerializer):
 
@@ -11,12 +13,15 @@ class StorySerializer(serializers.ModelSerializer):
 
     author = serializers.ReadOnlyField(source='author.username')
 
+    renditions = RenditionsField(source='images')
+
     class Meta:
         model = Story
         fields = (
             'id',
             'author',
             'media',
+            'renditions',
             'created',
             'expires_at'
         )
@@ -0,0 +1,14 @@
+from rest_framework import serializers
+
+
+class TrendingTagSerializer(serializers.Serializer):
+
+    """
+    Serializer for the cached trending tags.
+    """
+
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    slug = serializers.SlugField()
+    uses = serializers.IntegerField()
+    velocity = serializers.FloatField()
@@ -0,0 +1,100 @@
+from django.db.models import Exists, OuterRef
+
+from rest_framework.viewsets import GenericViewSet
+from rest_framework.mixins import RetrieveModelMixin
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .serializers import TrendingTagSerializer
+from apps.api.posts.serializers import TagSerializer, PostListSerializer
+from apps.api.pagination import PostCursorPagination
+
+from apps.posts.models import Post, Tag, Like, Save
+from apps.posts import engagement
+from apps.discovery.tags import index as tag_index
+from apps.discovery.tags.trending import get_trending_tags
+
+from utils.pagination import sort_by_ids
+
+
+class TagViewSet(RetrieveModelMixin, GenericViewSet):
+
+    """
+    ViewSet for retrieving tags, their posts and the trending tags.
+    """
+
+    queryset = Tag.objects.all()
+    serializer_class = TagSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = PostCursorPagination
+
+    lookup_field = 'slug'
+
+    def get_posts_queryset(self):
+        return (
+            Post.objects.select_related(
+                'author', 'author__profile'
+            )
+            .prefetch_related(
+                'media', 'tags'
+            )
+            .annotate(
+                liked_by_user=Exists(
+                    Like.objects.filter(
+                        user=self.request.user, post=OuterRef('pk')
+                    )
+                ),
+                saved_by_user=Exists(
+                    Save.objects.filter(
+                        user=self.request.user, post=OuterRef('pk')
+                    )
+                )
+            )
+        )
+
+    @action(
+        methods=['GET'],
+        detail=True,
+        url_path='posts'
+    )
+    def posts(self, request, slug=None):
+        tag = self.get_object()
+
+        order = request.query_params.get('order', tag_index.RECENT)
+        if order not in tag_index.ORDERS:
+            raise ValidationError(
+                {'order': f'Must be one of: {', '.join(tag_index.ORDERS)}.'}
+            )
+
+        page = tag_index.get_tag_page(
+            tag.pk,
+            order=order,
+            cursor=request.query_params.get(self.paginator.cursor_query_param),
+            per_page=self.paginator.page_size
+        )
+        page_ids = self.paginator.paginate_page(page, request)
+
+        posts = engagement.apply_state(
+            sort_by_ids(self.get_posts_queryset().filter(pk__in=page_ids), page_ids),
+            request.user.pk,
+            liked_attr='liked_by_user',
+            saved_attr='saved_by_user'
+        )
+        serializer = PostListSerializer(posts, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='trending'
+    )
+    def trending(self, request):
+        serializer = TrendingTagSerializer(get_trending_tags(), many=True)
+
+        return Response(serializer.data)
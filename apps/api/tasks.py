@@ -0,0 +1,25 @@
+import logging
+
+from celery import shared_task
+
+from utils.uploads import delete_expired_uploads
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3)
+def delete_expired_uploads_task(self):
+
+    """
+    Celery task that removes the chunks of abandoned uploads.
+    """
+
+    try:
+        deleted = delete_expired_uploads()
+        logger.info(f'Deleted {deleted} expired uploads.')
+    except Exception as exc:
+        logger.warning(
+            f'Expired upload cleanup failed: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
@@ -1,3 +1,321 @@
-from django.test import TestCase
+import os
+import time
+import tempfile
 
-# Create your tests here.
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from django_redis import get_redis_connection
+
+from apps.posts.models import Post, PostMedia, Tag
+from apps.stories.models import Story
+from apps.profiles.models import Follow
+
+from apps.discovery.tags import index as tag_index
+
+from utils.pagination import encode_cursor
+from utils.testing import RedisTestCase, MediaTestCase, make_image
+from utils.uploads import get_upload_dir, delete_expired_uploads
+
+
+User = get_user_model()
+
+
+class APITestCase(RedisTestCase):
+
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('reader')
+        self.client.force_authenticate(self.user)
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='password'
+        )
+
+    def create_post(self, author, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=author, **kwargs)
+
+    def get_all_pages(self, url):
+        ids = []
+
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+            ids += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+
+        return ids
+
+
+# ---------- POSTS ----------
+
+
+class PostPaginationTests(APITestCase):
+
+    def test_list_follows_next_cursors(self):
+        posts = [self.create_post(self.user) for _ in range(7)]
+        Post.objects.update(created=timezone.now())
+
+        response = self.client.get('/api/posts/')
+
+        self.assertNotIn('count', response.data)
+        self.assertIn('cursor=', response.data['next'])
+        self.assertEqual(
+            self.get_all_pages('/api/posts/'),
+            sorted((post.pk for post in posts), reverse=True)
+        )
+
+    def test_tampered_cursors_are_not_found(self):
+        self.create_post(self.user)
+
+        response = self.client.get('/api/posts/', {'cursor': encode_cursor(['x', 'y'])})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_pages_the_timeline(self):
+        author = self.create_user('author')
+        Follow.objects.create(user=author, follower=self.user)
+        posts = [self.create_post(author) for _ in range(7)]
+
+        self.assertEqual(
+            self.get_all_pages('/api/posts/feed/'),
+            [post.pk for post in reversed(posts)]
+        )
+
+
+@override_settings(ENGAGEMENT_WRITE_BEHIND=False)
+class PostCounterTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post(self.create_user('author'))
+
+    def test_like_and_unlike_adjust_counter_once(self):
+        url = f'/api/posts/{self.post.pk}/'
+
+        self.assertEqual(self.client.post(url + 'like/').status_code, 201)
+        self.assertEqual(self.client.post(url + 'like/').status_code, 409)
+        self.assertEqual(self.client.get(url).data['likes_count'], 1)
+
+        self.assertEqual(self.client.post(url + 'unlike/').status_code, 204)
+        self.assertEqual(self.client.post(url + 'unlike/').status_code, 404)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comment_creation_adjusts_counter(self):
+        response = self.client.post(
+            f'/api/posts/{self.post.pk}/comments/', {'body': 'Nice'}
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+
+@override_settings(ENGAGEMENT_WRITE_BEHIND=True)
+class PostEngagementTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post(self.create_user('author'))
+
+    def test_like_is_read_back_before_flush(self):
+        url = f'/api/posts/{self.post.pk}/'
+
+        self.assertEqual(self.client.post(url + 'like/').status_code, 201)
+        self.assertEqual(self.client.post(url + 'like/').status_code, 409)
+
+        response = self.client.get(url)
+        self.assertTrue(response.data['liked_by_user'])
+        self.assertEqual(response.data['likes_count'], 1)
+
+        response = self.client.get('/api/posts/')
+        self.assertTrue(response.data['results'][0]['liked_by_user'])
+
+        self.assertEqual(self.client.post(url + 'unlike/').status_code, 204)
+        self.assertEqual(self.client.post(url + 'unlike/').status_code, 404)
+        self.assertEqual(
+            self.client.post(f'/api/posts/{self.post.pk + 1}/like/').status_code, 404
+        )
+
+
+# ---------- TAGS ----------
+
+
+class TagTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author')
+        self.tag = Tag.objects.create(name='sunset')
+
+    def create_tagged_post(self, **kwargs):
+        post = self.create_post(self.author, **kwargs)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.add(self.tag)
+
+        return post
+
+    def test_posts_are_paged_from_the_tag_index(self):
+        quiet = [self.create_tagged_post() for _ in range(6)]
+        popular = self.create_tagged_post(likes_count=10)
+        url = f'/api/tags/{self.tag.slug}/posts/'
+
+        self.assertEqual(
+            self.get_all_pages(url), [post.pk for post in reversed(quiet + [popular])]
+        )
+        self.assertEqual(
+            self.get_all_pages(url + '?order=top')[0], popular.pk
+        )
+        self.assertTrue(
+            get_redis_connection('default').exists(
+                tag_index.get_index_key(self.tag.pk, tag_index.TOP)
+            )
+        )
+
+    def test_unknown_orders_are_rejected(self):
+        response = self.client.get(f'/api/tags/{self.tag.slug}/posts/?order=random')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('order', response.data)
+
+    def test_trending_tags(self):
+        self.create_tagged_post()
+
+        response = self.client.get('/api/tags/trending/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['slug'], 'sunset')
+        self.assertEqual(response.data[0]['uses'], 1)
+
+
+# ---------- UPLOADS ----------
+
+
+class ChunkedUploadTests(MediaTestCase, APITestCase):
+
+    CHUNK_SIZE = 256
+
+    def setUp(self):
+        super().setUp()
+
+        override = self.settings(
+            CHUNKED_UPLOAD_DIR=tempfile.mkdtemp(dir=self._media_root),
+            CHUNKED_UPLOAD_CHUNK_SIZE=self.CHUNK_SIZE
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.post = self.create_post(self.user)
+        self.content = make_image(
+            'photo.jpg', size=(200, 200), image_format='JPEG'
+        ).read()
+
+    def start(self, **data):
+        data = {
+            'filename': 'photo.jpg', 'size': len(self.content),
+            'target': 'post', 'post_id': self.post.pk, **data
+        }
+        return self.client.post(
+            '/api/uploads/', {key: value for key, value in data.items() if value is not None}
+        )
+
+    def put_chunk(self, upload_id, index, content=None):
+        if content is None:
+            content = self.content[index * self.CHUNK_SIZE:(index + 1) * self.CHUNK_SIZE]
+
+        return self.client.put(
+            f'/api/uploads/{upload_id}/chunks/{index}/', content,
+            content_type='application/octet-stream'
+        )
+
+    def test_chunks_are_resumed_in_any_order_and_completed(self):
+        upload = self.start().data
+        total = upload['total_chunks']
+        self.assertGreater(total, 2)
+
+        for index in reversed(range(1, total)):
+            self.assertEqual(self.put_chunk(upload['id'], index).status_code, 200)
+
+        response = self.client.get(f'/api/uploads/{upload["id"]}/')
+        self.assertEqual(response.data['missing'], [0])
+
+        response = self.client.post(f'/api/uploads/{upload["id"]}/complete/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['missing'], [0])
+
+        self.put_chunk(upload['id'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/uploads/{upload["id"]}/complete/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(os.path.exists(get_upload_dir(upload['id'])))
+
+        media = PostMedia.objects.get(post=self.post)
+        self.assertEqual(media.media_type, PostMedia.MEDIA_TYPES.IMAGE)
+        self.assertEqual(media.renditions['thumb']['width'], 160)
+
+    def test_chunks_of_the_wrong_size_are_rejected(self):
+        upload = self.start().data
+
+        response = self.put_chunk(upload['id'], 0, b'short')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['expected_size'], self.CHUNK_SIZE)
+
+        response = self.put_chunk(upload['id'], upload['total_chunks'])
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.put_chunk(upload['id'], 0).status_code, 200)
+        self.assertEqual(
+            sorted(os.listdir(get_upload_dir(upload['id']))), ['00000.part', 'upload.json']
+        )
+
+    def test_uploads_are_private_to_their_user(self):
+        other = self.create_user('other')
+        upload = self.start().data
+
+        self.client.force_authenticate(other)
+
+        self.assertEqual(self.client.get(f'/api/uploads/{upload["id"]}/').status_code, 404)
+        self.assertEqual(self.start().status_code, 400)
+
+    def test_uploads_are_validated_up_front(self):
+        self.assertEqual(self.start(filename='notes.txt').status_code, 400)
+        self.assertEqual(self.start(post_id=None).status_code, 400)
+
+        with self.settings(MAX_MEDIA_SIZE=0):
+            self.assertEqual(self.start().status_code, 400)
+
+    def test_story_uploads_create_a_story(self):
+        upload = self.start(target='story').data
+
+        for index in range(upload['total_chunks']):
+            self.put_chunk(upload['id'], index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/uploads/{upload["id"]}/complete/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Story.objects.filter(author=self.user).exists())
+
+    def test_expired_uploads_are_deleted(self):
+        upload = self.start().data
+
+        with mock.patch('utils.uploads.time.time', return_value=time.time() + 3600):
+            with self.settings(CHUNKED_UPLOAD_TTL=60):
+                self.assertEqual(self.client.get(f'/api/uploads/{upload["id"]}/').status_code, 404)
+                self.assertEqual(delete_expired_uploads(), 1)
+
+        self.assertFalse(os.path.exists(get_upload_dir(upload['id'])))
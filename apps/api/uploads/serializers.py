@@ -0,0 +1,54 @@
+from django.conf import settings
+
+from rest_framework import serializers
+
+from apps.posts.models import Post
+
+from utils.files import (
+    ALLOWED_IMAGE_EXTENSIONS,
+    ALLOWED_VIDEO_EXTENSIONS,
+    get_file_ext
+)
+
+
+class UploadSerializer(serializers.Serializer):
+
+    """
+    Serializer for starting a chunked upload of a post media file
+    or a story.
+    """
+
+    TARGETS = ('post', 'story')
+
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    target = serializers.ChoiceField(choices=TARGETS)
+    post_id = serializers.IntegerField(required=False)
+
+    def validate_filename(self, value):
+        if get_file_ext(value) not in ALLOWED_IMAGE_EXTENSIONS + ALLOWED_VIDEO_EXTENSIONS:
+            raise serializers.ValidationError('Unsupported file extension.')
+        return value
+
+    def validate_size(self, value):
+        max_size_mb = getattr(settings, 'MAX_MEDIA_SIZE', 50)
+
+        if value > max_size_mb * 1024 * 1024:
+            raise serializers.ValidationError(f'File size cannot exceed {max_size_mb}')
+        return value
+
+    def validate(self, data):
+        if data['target'] == 'post':
+            post_id = data.get('post_id')
+
+            if post_id is None:
+                raise serializers.ValidationError({'post_id': 'Post id not provided.'})
+
+            user = self.context['request'].user
+
+            if not Post.objects.filter(pk=post_id, author=user).exists():
+                raise serializers.ValidationError({'post_id': 'Post not found.'})
+        else:
+            data.pop('post_id', None)
+
+        return data
@@ -0,0 +1,158 @@
+from django.db import transaction
+
+from rest_framework import status
+from rest_framework.viewsets import ViewSet
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .serializers import UploadSerializer
+from apps.api.posts.serializers import PostMediaSerializer
+from apps.api.stories.serializers import StorySerializer
+
+from apps.posts.models import Post
+from apps.posts.media import create_post_media
+
+from utils.uploads import (
+    create_upload,
+    get_upload,
+    get_received_chunks,
+    get_missing_chunks,
+    get_expected_chunk_size,
+    save_chunk,
+    assemble_upload,
+    delete_upload
+)
+
+
+class UploadViewSet(ViewSet):
+
+    """
+    ViewSet for resumable chunked uploads of post media and stories.
+
+    A client starts an upload, PUTs its numbered chunks in any order
+    and completes it. Chunks are kept on local disk until completion,
+    so a failed chunk is retried on its own and an interrupted upload
+    is resumed by asking which chunks are still missing.
+    """
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    lookup_value_regex = r'[A-Za-z0-9]{22}'
+
+    def get_upload(self, pk):
+        upload = get_upload(pk, user_id=self.request.user.pk)
+
+        if upload is None:
+            raise NotFound('Upload not found.')
+
+        return upload
+
+    def get_status(self, upload):
+        received = get_received_chunks(upload)
+
+        return {
+            'id': upload['id'],
+            'filename': upload['filename'],
+            'size': upload['size'],
+            'chunk_size': upload['chunk_size'],
+            'total_chunks': upload['total_chunks'],
+            'received': received,
+            'missing': get_missing_chunks(upload),
+        }
+
+    def create(self, request):
+        serializer = UploadSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        upload = create_upload(user_id=request.user.pk, **serializer.validated_data)
+
+        return Response(
+            self.get_status(upload),
+            status=status.HTTP_201_CREATED
+        )
+
+    def retrieve(self, request, pk=None):
+        return Response(self.get_status(self.get_upload(pk)))
+
+    def destroy(self, request, pk=None):
+        delete_upload(self.get_upload(pk)['id'])
+
+        return Response(
+            status=status.HTTP_204_NO_CONTENT
+        )
+
+    @action(
+        methods=['PUT'],
+        detail=True,
+        url_path=r'chunks/(?P<index>\d+)'
+    )
+    def chunk(self, request, pk=None, index=None):
+        upload = self.get_upload(pk)
+        index = int(index)
+
+        if index >= upload['total_chunks']:
+            return Response(
+                {'detail': 'Chunk index out of range.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.stream is None or not save_chunk(upload, index, request.stream):
+            return Response(
+                {
+                    'detail': 'Chunk size does not match.',
+                    'expected_size': get_expected_chunk_size(upload, index)
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(self.get_status(upload))
+
+    @action(
+        methods=['POST'],
+        detail=True,
+        url_path='complete'
+    )
+    def complete(self, request, pk=None):
+        upload = self.get_upload(pk)
+        missing = get_missing_chunks(upload)
+
+        if missing:
+            return Response(
+                {'detail': 'Upload is incomplete.', 'missing': missing},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        context = {'request': request}
+
+        if upload['target'] == 'post':
+            post = get_object_or_404(Post, pk=upload['post_id'], author=request.user)
+
+        file = assemble_upload(upload)
+
+        try:
+            with transaction.atomic():
+                if upload['target'] == 'post':
+                    serializer = PostMediaSerializer(data={'file': file})
+                    serializer.is_valid(raise_exception=True)
+
+                    media = create_post_media(post, [serializer.validated_data['file']])
+                    data = PostMediaSerializer(media[0], context=context).data
+                else:
+                    serializer = StorySerializer(data={'media': file}, context=context)
+                    serializer.is_valid(raise_exception=True)
+
+                    serializer.save(author=request.user)
+                    data = serializer.data
+        finally:
+            file.close()
+            delete_upload(upload['id'])
+
+        return Response(
+            data,
+            status=status.HTTP_201_CREATED
+        )
@@ -10,6 +10,8 @@ urlpatterns = [
     path('', include('apps.api.profiles.urls')),
     path('', include('apps.api.posts.urls')),
     path('', include('apps.api.stories.urls')),
+    path('', include('apps.api.tags.urls')),
+    path('', include('apps.api.uploads.urls')),
 
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from .models import Blob
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'kind', 'media_type', 'refcount', 'created')
+    list_filter = ('kind', 'media_type')
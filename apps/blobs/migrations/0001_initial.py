@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('media', 'Media'), ('cover', 'Cover')], max_length=10)),
+                ('file', models.CharField(max_length=255)),
+                ('media_type', models.CharField(choices=[('image', 'Image'), ('video', 'Video')], default='image', max_length=5)),
+                ('renditions', models.JSONField(blank=True, default=dict)),
+                ('variants', models.JSONField(blank=True, default=dict)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Blob',
+                'verbose_name_plural': 'Blobs',
+                'ordering': ('-created',),
+                'constraints': [models.UniqueConstraint(fields=('digest', 'kind'), name='unique_blob_digest_kind')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import models
+
+
+class Blob(models.Model):
+
+    """
+    A processed media file shared by every object uploaded with the
+    same content, keyed by the SHA-256 digest of the original bytes.
+    The kind tells apart the different processing of the same bytes.
+    """
+
+    class KINDS(models.TextChoices):
+        MEDIA = ('media', 'Media')
+        COVER = ('cover', 'Cover')
+
+    class MEDIA_TYPES(models.TextChoices):
+        IMAGE = ('image', 'Image')
+        VIDEO = ('video', 'Video')
+
+    digest = models.CharField(max_length=64)
+    kind = models.CharField(max_length=10, choices=KINDS.choices)
+
+    file = models.CharField(max_length=255)
+    media_type = models.CharField(max_length=5, choices=MEDIA_TYPES.choices, default=MEDIA_TYPES.IMAGE)
+
+    renditions = models.JSONField(default=dict, blank=True)
+    variants = models.JSONField(default=dict, blank=True)
+
+    refcount = models.PositiveIntegerField(default=0)
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Blob'
+        verbose_name_plural = 'Blobs'
+        constraints = [
+            models.UniqueConstraint(fields=('digest', 'kind'), name='unique_blob_digest_kind')
+        ]
+
+    def __str__(self):
+        return f'{self.kind}: {self.digest[:12]} ({self.refcount})'
+
+    @property
+    def names(self) -> set:
+        return {
+            self.file,
+            *(
+                name for stored in self.renditions.values()
+                for key, name in stored.items() if key not in ('width', 'height')
+            ),
+            *self.variants.values()
+        }
@@ -0,0 +1,343 @@
+import os
+import logging
+
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.core.files.storage import default_storage
+
+from django_redis import get_redis_connection
+
+from .models import Blob
+
+from utils.files import get_file_digest
+
+
+logger = logging.getLogger(__name__)
+
+
+BLOB_DIR = 'blobs'
+
+# Held while the files of a digest are written or deleted.
+BLOB_LOCK_KEY = 'blobs:{kind}:{digest}:lock'
+BLOB_LOCK_TIMEOUT = 60
+
+
+def get_blob_stem(digest: str, kind: str) -> str:
+    return f'{BLOB_DIR}/{kind}/{digest[:2]}/{digest}'
+
+
+def get_blob_lock(digest: str, kind: str):
+
+    """
+    Lock serializing file changes of one blob, so files stored for
+    the digest are never deleted by the release of an older blob.
+    """
+
+    return get_redis_connection('default').lock(
+        BLOB_LOCK_KEY.format(kind=kind, digest=digest), timeout=BLOB_LOCK_TIMEOUT
+    )
+
+
+def is_blob_file(file_name: str) -> bool:
+    return bool(file_name) and file_name.startswith(f'{BLOB_DIR}/')
+
+
+def move_stored_file(storage, old_name: str, new_name: str):
+
+    """
+    Move a stored file to new_name, renaming it in place when the
+    storage is on the local filesystem.
+    """
+
+    try:
+        old_path, new_path = storage.path(old_name), storage.path(new_name)
+    except NotImplementedError:
+        if storage.exists(new_name):
+            storage.delete(new_name)
+
+        with storage.open(old_name) as content:
+            storage.save(new_name, content)
+
+        storage.delete(old_name)
+        return
+
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    os.replace(old_path, new_path)
+
+
+def move_blob_files(storage, digest: str, kind: str, rename: dict):
+    moved = []
+
+    with get_blob_lock(digest, kind):
+        try:
+            for old_name, new_name in rename.items():
+                move_stored_file(storage, old_name, new_name)
+                moved.append((old_name, new_name))
+        except Exception:
+            for old_name, new_name in moved:
+                move_stored_file(storage, new_name, old_name)
+
+            logger.error(f'Could not move files into blob: {kind}: {digest}')
+            raise
+
+
+def delete_stored_files(storage, names):
+    for name in names:
+        if storage.exists(name):
+            storage.delete(name)
+
+
+def delete_blob_files(digest: str, kind: str, names):
+    with get_blob_lock(digest, kind):
+        # the content may have been stored again since the blob was deleted
+        if Blob.objects.filter(digest=digest, kind=kind).exists():
+            return
+
+        delete_stored_files(default_storage, names)
+
+
+def rename_stored(value: dict, rename: dict) -> dict:
+
+    """
+    Apply rename to the stored names of a renditions or variants mapping.
+    """
+
+    return {
+        key: rename_stored(item, rename) if isinstance(item, dict) else rename.get(item, item)
+        for key, item in value.items()
+    }
+
+
+def set_blob_fields(
+        obj, blob: Blob, file_field: str='file', renditions_field: str=None,
+        variants_field: str=None
+    ):
+    setattr(obj, file_field, blob.file)
+
+    if renditions_field:
+        setattr(obj, renditions_field, blob.renditions)
+
+    if variants_field:
+        setattr(obj, variants_field, blob.variants)
+
+    if hasattr(obj, 'media_type'):
+        obj.media_type = blob.media_type
+
+
+def attach_blob(
+        obj, file_field: str='file', kind: str=Blob.KINDS.MEDIA,
+        renditions_field: str=None, variants_field: str=None
+    ) -> bool:
+
+    """
+    Point obj at the stored blob for its digest and take a reference
+    to it. The object is only updated in memory. Returns False if no
+    blob holds that content.
+    """
+
+    updated = Blob.objects.filter(
+        digest=obj.digest, kind=kind, refcount__gt=0
+    ).update(refcount=F('refcount') + 1)
+
+    if not updated:
+        return False
+
+    blob = Blob.objects.get(digest=obj.digest, kind=kind)
+
+    set_blob_fields(
+        obj, blob, file_field=file_field, renditions_field=renditions_field,
+        variants_field=variants_field
+    )
+
+    return True
+
+
+def get_replaced_digest(
+        obj, file_field: str='file', renditions_field: str=None,
+        variants_field: str=None
+    ) -> str:
+
+    """
+    Return the digest of the blob a newly assigned file of an existing
+    obj replaces, for the caller to release once the change commits.
+    The old renditions belong to that blob, so they are cleared to keep
+    processing from deleting them.
+    """
+
+    file = getattr(obj, file_field)
+    if not obj.pk or not file or file._committed:
+        return ''
+
+    old_digest, old_file_name = (
+        type(obj).objects.filter(pk=obj.pk)
+        .values_list('digest', file_field)
+        .first()
+    ) or ('', '')
+
+    if not old_digest or not is_blob_file(old_file_name):
+        return ''
+
+    if renditions_field:
+        setattr(obj, renditions_field, {})
+
+    if variants_field:
+        setattr(obj, variants_field, {})
+
+    return old_digest
+
+
+def get_held_digest(obj, file_field: str='file') -> str:
+
+    """
+    Return the digest of the blob obj holds a reference to. Objects
+    whose processing is pending or failed have a digest but a file
+    outside the blob store, and hold no reference to release.
+    """
+
+    file = getattr(obj, file_field)
+
+    if not obj.digest or not file or not is_blob_file(file.name):
+        return ''
+
+    return obj.digest
+
+
+def dedupe_upload(
+        obj, file_field: str='file', kind: str=Blob.KINDS.MEDIA,
+        renditions_field: str=None, variants_field: str=None
+    ) -> bool:
+
+    """
+    Hash a newly assigned file of obj before it is written. If the
+    same content was uploaded before, obj is pointed at the stored blob
+    and the upload is neither written nor processed again. Returns True
+    if a blob was reused.
+    """
+
+    file = getattr(obj, file_field)
+    if not file or file._committed:
+        return False
+
+    obj.digest = get_file_digest(file)
+
+    return attach_blob(
+        obj, file_field=file_field, kind=kind, renditions_field=renditions_field,
+        variants_field=variants_field
+    )
+
+
+def store_blob(
+        obj, file_field: str='file', kind: str=Blob.KINDS.MEDIA,
+        renditions_field: str=None, variants_field: str=None, save: bool=True
+    ) -> bool:
+
+    """
+    Move the processed files of obj into the blob store under its
+    digest, so later uploads of the same content reuse them. If the
+    same content was stored concurrently, obj is pointed at that blob
+    and its own copies are deleted. With save=False the object is only
+    updated in memory. Returns True if obj now references a blob.
+
+    Files are only moved or deleted once the surrounding transaction
+    commits, so a rollback leaves obj and its files as they were.
+    """
+
+    file = getattr(obj, file_field)
+    if not obj.digest or not file or is_blob_file(file.name):
+        return False
+
+    storage = file.storage
+
+    blob = Blob(
+        digest=obj.digest, kind=kind, file=file.name,
+        media_type=getattr(obj, 'media_type', Blob.MEDIA_TYPES.IMAGE),
+        renditions=getattr(obj, renditions_field) if renditions_field else {},
+        variants=getattr(obj, variants_field) if variants_field else {},
+        refcount=1
+    )
+
+    names = blob.names
+    stem = os.path.splitext(file.name)[0]
+
+    # every derived file is stored next to the original as <stem>_<suffix>
+    if any(not name.startswith(stem) for name in names):
+        logger.warning(f'Unexpected stored names for {obj}, not storing blob.')
+        return False
+
+    blob_stem = get_blob_stem(obj.digest, kind)
+    rename = {name: blob_stem + name[len(stem):] for name in names}
+
+    blob.file = rename[blob.file]
+    blob.renditions = rename_stored(blob.renditions, rename)
+    blob.variants = rename_stored(blob.variants, rename)
+
+    digest = obj.digest
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            if not attach_blob(
+                obj, file_field=file_field, kind=kind,
+                renditions_field=renditions_field, variants_field=variants_field
+            ):
+                return False
+
+            transaction.on_commit(lambda: delete_stored_files(storage, names))
+        else:
+            set_blob_fields(
+                obj, blob, file_field=file_field, renditions_field=renditions_field,
+                variants_field=variants_field
+            )
+
+            transaction.on_commit(lambda: move_blob_files(storage, digest, kind, rename))
+
+        if save:
+            obj._skip_signals = True
+            obj.save(update_fields=[
+                field for field in (file_field, renditions_field, variants_field) if field
+            ])
+
+    return True
+
+
+def release_blobs(digests, kind: str=Blob.KINDS.MEDIA) -> int:
+
+    """
+    Drop one reference to the blob of each digest. Blobs whose last
+    reference went away are deleted with their files once the deletion
+    commits, unless the same content has been stored again by then.
+    Returns the number of deleted blobs.
+    """
+
+    deleted = 0
+
+    for digest in digests:
+        if not digest:
+            continue
+
+        with transaction.atomic():
+            blob = (
+                Blob.objects.select_for_update()
+                .filter(digest=digest, kind=kind)
+                .first()
+            )
+
+            if blob is None:
+                continue
+
+            if blob.refcount > 1:
+                Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                continue
+
+            blob.delete()
+
+            names = blob.names
+            transaction.on_commit(
+                lambda digest=digest, names=names: delete_blob_files(digest, kind, names)
+            )
+
+        deleted += 1
+
+    return deleted
@@ -0,0 +1,25 @@
+import logging
+
+from celery import shared_task
+
+from .store import release_blobs
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3)
+def release_blobs_task(self, digests=None, kind='media'):
+
+    """
+    Celery task that drops a reference to each of the given
+    blobs, deleting the ones that are no longer referenced.
+    """
+
+    try:
+        release_blobs(digests or [], kind=kind)
+    except Exception as exc:
+        logger.warning(
+            f'Blob release failed for: {digests}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
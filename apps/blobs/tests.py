@@ -0,0 +1,169 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from apps.posts.models import Post, PostMedia
+from apps.stories.models import Story, Collection
+
+from utils.testing import MediaTestCase, make_image
+
+from .models import Blob
+from .store import is_blob_file, store_blob, release_blobs
+
+
+User = get_user_model()
+
+
+class BlobTestCase(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+
+    def create_media(self, file=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.user)
+            media = PostMedia.objects.create(post=post, file=file or make_image())
+
+        media.refresh_from_db()
+        return media
+
+    def delete(self, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.delete()
+
+    def assertStored(self, blob, stored=True):
+        for name in blob.names:
+            self.assertEqual(default_storage.exists(name), stored, name)
+
+
+class BlobStoreTests(BlobTestCase):
+
+    def test_processed_files_move_into_the_blob_store(self):
+        media = self.create_media()
+        blob = Blob.objects.get()
+
+        self.assertTrue(is_blob_file(media.file.name))
+        self.assertEqual(media.digest, blob.digest)
+        self.assertEqual((blob.file, blob.refcount), (media.file.name, 1))
+        self.assertEqual(blob.renditions, media.renditions)
+        self.assertStored(blob)
+
+    def test_same_content_reuses_the_blob(self):
+        first = self.create_media()
+        second = self.create_media()
+
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(second.renditions, first.renditions)
+
+    def test_blob_is_released_only_at_refcount_zero(self):
+        first = self.create_media()
+        second = self.create_media()
+        blob = Blob.objects.get()
+
+        self.delete(first.post)
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertStored(blob)
+
+        self.delete(second.post)
+        self.assertFalse(Blob.objects.exists())
+        self.assertStored(blob, stored=False)
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        media = PostMedia.objects.get(pk=self.create_media().pk)
+        old_blob = Blob.objects.get()
+
+        media.file = make_image(color='blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            media.save()
+
+        media.refresh_from_db()
+        self.assertNotEqual(media.digest, old_blob.digest)
+        self.assertEqual(list(Blob.objects.values_list('digest', flat=True)), [media.digest])
+        self.assertStored(old_blob, stored=False)
+
+    def test_kinds_are_stored_apart(self):
+        self.create_media()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Story.objects.create(author=self.user, media=make_image())
+            Collection.objects.create(author=self.user, name='Trips', image=make_image())
+
+        self.assertEqual(
+            dict(Blob.objects.values_list('kind', 'refcount')),
+            {Blob.KINDS.MEDIA: 2, Blob.KINDS.COVER: 1}
+        )
+
+
+class BlobTransactionTests(BlobTestCase):
+
+    def test_rollback_leaves_the_files_in_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.user)
+        media = PostMedia(post=post, file=make_image(), digest='0' * 64)
+        PostMedia.objects.bulk_create([media])
+        old_name = media.file.name
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    store_blob(media, file_field='file')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Blob.objects.exists())
+        self.assertTrue(default_storage.exists(old_name))
+        self.assertEqual(PostMedia.objects.get().file.name, old_name)
+
+    def test_deleting_an_unprocessed_copy_keeps_the_blob(self):
+        media = self.create_media()
+        blob = Blob.objects.get()
+
+        # a copy of the same content whose processing is still pending
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.user)
+        PostMedia.objects.bulk_create(
+            [PostMedia(post=post, file=make_image(), digest=media.digest)]
+        )
+
+        self.delete(post)
+
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertStored(blob)
+
+    @mock.patch('apps.posts.signals.delete_post_media_task.delay')
+    def test_rolled_back_delete_releases_nothing(self, delay):
+        media = self.create_media()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    media.post.delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        delay.assert_not_called()
+
+    def test_content_stored_again_survives_a_stale_release(self):
+        media = self.create_media()
+        blob = Blob.objects.get()
+
+        with self.captureOnCommitCallbacks() as release_callbacks:
+            self.assertEqual(release_blobs([media.digest]), 1)
+
+        # the same content is uploaded and stored before the release commits
+        self.create_media()
+
+        for callback in release_callbacks:
+            callback()
+
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertStored(blob)
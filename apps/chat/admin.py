@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Chat, Message
+from .models import Chat, Message, ReadMarker
 
 
 @admin.register(Chat)
@@ -11,3 +11,8 @@ class ChatAdmin(admin.ModelAdmin):
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('chat', 'sender', 'message_type')
+
+
+@admin.register(ReadMarker)
+class ReadMarkerAdmin(admin.ModelAdmin):
+    list_display = ('chat', 'user', 'last_read')
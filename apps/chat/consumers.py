@@ -1,84 +1,222 @@
 import json
+import time
+import asyncio
 
 from asgiref.sync import sync_to_async
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
 from .models import Chat, Message
+from . import presence, receipts
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
 
     """
     WebSocket consumer for handling chat messages and online status.
+
+    Presence is kept in Redis (see presence.py) and refreshed by a
+    heartbeat while the socket is open, so it never touches the
+    database and clears itself if the process dies.
+
+    Read receipts are coalesced per connection: the newest position
+    read is kept in memory and written at most once per receipt
+    interval, then broadcast to the chat as a read event.
+
+    Typing frames are only forwarded when the state changes or once per
+    typing interval while it lasts, and presence changes of a chat are
+    broadcast at most once per broadcast interval, with a trailing
+    broadcast carrying the final state of a burst. The other member is
+    loaded once, so rendering the status needs no query.
     """
 
+    # pending trailing presence broadcasts of this process, by chat id
+    presence_tasks = {}
+
     async def connect(self):
         self.user = self.scope['user']
         self.chat_id = str(self.scope['url_route']['kwargs']['chat_id'])
 
-        self.chat = await self.get_chat(self.chat_id)
+        self.chat, self.other_user = await self.get_chat(self.chat_id)
+        self.is_online = None
+        self.status_html = {}
+
+        self.typing = False
+        self.typing_sent_at = 0
+
+        self.read_pending = None
+        self.read_flushed_at = 0
+        self.read_task = None
 
         await self.channel_layer.group_add(
             self.chat_id, self.channel_name
         )
 
-        await self.add_user_to_online(self.chat, self.user)
-        await self.update_online_status()
         await self.accept()
+        await self.update_online_status(online=True)
+
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
 
     async def disconnect(self, code):
+        heartbeat_task = getattr(self, 'heartbeat_task', None)
+        if heartbeat_task:
+            heartbeat_task.cancel()
+
+        read_task = getattr(self, 'read_task', None)
+        if read_task:
+            read_task.cancel()
+            await self.flush_read()
+
+        if getattr(self, 'typing', False):
+            await self.update_typing(False)
+
         await self.channel_layer.group_discard(
             self.chat_id, self.channel_name
         )
 
-        await self.remove_user_from_online(self.chat, self.user)
-        await self.update_online_status()
+        await self.update_online_status(online=False)
+
+    async def heartbeat(self):
+
+        """
+        Keep this connection online. Changes noticed here, like the
+        presence of a crashed worker expiring, are only sent to this
+        socket instead of being broadcast by every member.
+        """
+
+        while True:
+            await asyncio.sleep(presence.get_heartbeat_interval())
+
+            online_members = await self.update_presence(online=True)
+            await self.online_status_handler({'online_members': online_members})
 
     async def receive(self, text_data=None, bytes_data=None):
         text_data_json = json.loads(text_data)
         content = text_data_json.get('content', '')
 
-        if 'typing' in text_data_json:
-
-            event = {
-                'type': 'typing_event_handler',
-                'user_id': self.user.id,
-                'typing': bool(text_data_json.get('typing', False))
-            }
-
-            await self.channel_layer.group_send(
-                self.chat_id, event
-            )
+        if 'read' in text_data_json:
+            await self.mark_read(timezone.now())
+            return
 
+        if 'typing' in text_data_json:
+            await self.update_typing(bool(text_data_json.get('typing', False)))
             return
 
         if content and content.strip():
-            message = await self.create_message(
+            created, sender_html, html = await self.create_message(
                 self.chat, self.user, content
             )
             event = {
                 'type': 'message_handler',
-                'message_id': message.pk,
+                'sender_id': self.user.id,
+                'sender_html': sender_html,
+                'html': html,
+                'created': created.isoformat(),
             }
             await self.channel_layer.group_send(
                 self.chat_id, event
             )
 
     async def message_handler(self, event):
-        message_id = event.get('message_id')
-        message = await self.get_message(message_id)
+        if event.get('sender_id') == self.user.id:
+            await self.send(text_data=event.get('sender_html'))
+        else:
+            await self.send(text_data=event.get('html'))
+            await self.mark_read(parse_datetime(event['created']))
+
+    async def mark_read(self, last_read):
 
-        html = await self.render_message_partial(message, self.user)
+        """
+        Remember that this member has read up to last_read and schedule
+        a write unless one is already due.
+        """
 
-        await self.send(text_data=html)
+        if self.read_pending is None or last_read > self.read_pending:
+            self.read_pending = last_read
 
-    async def update_online_status(self):
-        online_members = await self.get_online_members(self.chat)
+        if self.read_task and not self.read_task.done():
+            return
+
+        delay = self.read_flushed_at + receipts.get_receipt_interval() - time.monotonic()
+        self.read_task = asyncio.create_task(self.flush_read(max(delay, 0)))
+
+    async def flush_read(self, delay: float = 0):
+        if delay:
+            await asyncio.sleep(delay)
+
+        last_read, self.read_pending = self.read_pending, None
+        if last_read is None:
+            return
 
+        self.read_flushed_at = time.monotonic()
+
+        if await self.save_read_marker(last_read):
+            await self.channel_layer.group_send(
+                self.chat_id, receipts.get_read_event(self.user.id, last_read)
+            )
+
+    async def read_handler(self, event):
+        if event.get('user_id') == self.user.id:
+            return
+
+        context = {
+            'type': 'read',
+            'last_read': event.get('last_read'),
+        }
+
+        await self.send(text_data=json.dumps(context))
+
+    async def update_typing(self, typing: bool):
+        now = time.monotonic()
+
+        if typing == self.typing and (
+            not typing or now - self.typing_sent_at < presence.get_typing_interval()
+        ):
+            return
+
+        self.typing = typing
+        self.typing_sent_at = now
+
+        event = {
+            'type': 'typing_event_handler',
+            'user_id': self.user.id,
+            'typing': typing
+        }
+
+        await self.channel_layer.group_send(
+            self.chat_id, event
+        )
+
+    async def update_online_status(self, online: bool):
+        online_members = await self.update_presence(online=online)
+
+        # a new connection learns the status right away
+        if online:
+            await self.online_status_handler({'online_members': online_members})
+
+        if await self.claim_broadcast():
+            await self.send_online_status(online_members)
+            return
+
+        task = self.presence_tasks.get(self.chat_id)
+        if task is None or task.done():
+            self.presence_tasks[self.chat_id] = asyncio.create_task(
+                self.send_trailing_online_status()
+            )
+
+    async def send_trailing_online_status(self):
+        await asyncio.sleep(presence.get_broadcast_interval())
+
+        self.presence_tasks.pop(self.chat_id, None)
+
+        await self.send_online_status(await self.get_online_members())
+
+    async def send_online_status(self, online_members):
         event = {
             'type': 'online_status_handler',
             'online_members': online_members,
@@ -89,13 +227,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def online_status_handler(self, event):
-        online_members = event.get('online_members')
-
-        html = await self.render_online_status_partial(
-            self.chat, online_members, self.user
+        is_online = self.other_user is not None and (
+            self.other_user.id in event.get('online_members', [])
         )
 
-        await self.send(text_data=html)
+        if is_online == self.is_online:
+            return
+
+        self.is_online = is_online
+
+        if is_online not in self.status_html:
+            self.status_html[is_online] = self.render_online_status_partial(is_online)
+
+        await self.send(text_data=self.status_html[is_online])
 
     async def typing_event_handler(self, event):
         if event.get('user_id') == self.user.id:
@@ -112,35 +256,50 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def get_chat(self, chat_id):
-        return get_object_or_404(Chat, id=chat_id)
+        chat = get_object_or_404(Chat, id=chat_id)
+        return chat, chat.get_other_user(self.user)
 
     @database_sync_to_async
     def create_message(self, chat, sender, content):
-        return Message.objects.create(
+
+        """
+        Create a message and render it once as seen by its sender and
+        once as seen by the other members, so the group handlers only
+        forward the HTML.
+        """
+
+        message = Message.objects.create(
             chat=chat, sender=sender, content=content
         )
 
-    @database_sync_to_async
-    def get_message(self, message_id):
-        return get_object_or_404(Message, pk=message_id)
+        return (
+            message.created,
+            self.render_message_partial(message, sender),
+            self.render_message_partial(message, None)
+        )
 
     @database_sync_to_async
-    def get_online_members(self, chat):
-        return list(chat.online_members.values_list("id", flat=True))
+    def save_read_marker(self, last_read):
+        return receipts.mark_read(self.chat.id, self.user.id, last_read)
 
-    @database_sync_to_async
-    def add_user_to_online(self, chat, user):
-        if not chat.online_members.filter(pk=user.pk).exists():
-            chat.online_members.add(user)
+    # ----------- Presence helpers -----------
 
-    @database_sync_to_async
-    def remove_user_from_online(self, chat, user):
-        if chat.online_members.filter(pk=user.pk).exists():
-            chat.online_members.remove(user)
+    @sync_to_async(thread_sensitive=False)
+    def update_presence(self, online: bool):
+        return presence.update_presence(
+            self.chat_id, self.user.id, self.channel_name, online=online
+        )
+
+    @sync_to_async(thread_sensitive=False)
+    def get_online_members(self):
+        return presence.get_online_members(self.chat_id)
+
+    @sync_to_async(thread_sensitive=False)
+    def claim_broadcast(self):
+        return presence.claim_broadcast(self.chat_id)
 
     # ----------- Rendering -----------
 
-    @sync_to_async
     def render_message_partial(self, message, user):
         context = {
             'message': message,
@@ -149,13 +308,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         return render_to_string('chat/partials/message_p.html', context)
 
-    @sync_to_async
-    def render_online_status_partial(self, chat, online_members, current_user):
-        other_user = chat.members.exclude(pk=current_user.pk).first()
-        is_online = other_user.id in online_members if other_user else False
-
+    def render_online_status_partial(self, is_online: bool):
         context = {
-            'other_user': other_user,
+            'other_user': self.other_user,
             'is_online': is_online,
         }
 
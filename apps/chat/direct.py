@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Chat
+
+
+def get_direct_key(user_id, other_id) -> tuple:
+    return (min(user_id, other_id), max(user_id, other_id))
+
+
+def get_direct_chats(user, others) -> dict:
+
+    """
+    Return the direct chats between user and each of others, keyed by
+    the other user's id, creating the missing ones. Runs a constant
+    number of queries however many users are given. Concurrent
+    creation of the same chat is resolved by the unique key.
+    """
+
+    other_ids = {other.pk for other in others} - {user.pk}
+    if not other_ids:
+        return {}
+
+    def fetch(ids):
+        chats = Chat.objects.filter(
+            Q(user_low=user, user_high__in=ids) | Q(user_high=user, user_low__in=ids)
+        )
+
+        return {
+            chat.user_high_id if chat.user_low_id == user.pk else chat.user_low_id: chat
+            for chat in chats
+        }
+
+    chats = fetch(other_ids)
+    missing = other_ids - chats.keys()
+
+    if missing:
+        with transaction.atomic():
+            new_chats = [
+                Chat(**dict(zip(('user_low_id', 'user_high_id'), get_direct_key(user.pk, other_id))))
+                for other_id in missing
+            ]
+
+            Chat.objects.bulk_create(new_chats, ignore_conflicts=True)
+
+            created = fetch(missing)
+            new_pks = {chat.pk for chat in new_chats}
+
+            Chat.members.through.objects.bulk_create(
+                [
+                    Chat.members.through(chat_id=chat.pk, user_id=member_id)
+                    for chat in created.values() if chat.pk in new_pks
+                    for member_id in (chat.user_low_id, chat.user_high_id)
+                ],
+                ignore_conflicts=True
+            )
+
+        chats.update(created)
+
+    return chats
+
+
+def get_direct_chat(user, other):
+    return get_direct_chats(user, [other]).get(other.pk)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:47
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_alter_message_message_type'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chat',
+            name='online_members',
+        ),
+    ]
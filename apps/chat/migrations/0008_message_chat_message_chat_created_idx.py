@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_remove_chat_online_members'),
+        ('posts', '0014_postmedia_digest'),
+        ('stories', '0009_collection_digest_story_digest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'created'], name='chat_message_chat_created_idx'),
+        ),
+    ]
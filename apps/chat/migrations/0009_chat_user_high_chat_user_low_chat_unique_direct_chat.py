@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_direct_chat_keys(apps, schema_editor):
+    Chat = apps.get_model('chat', 'Chat')
+    Members = Chat.members.through
+
+    chat_members = {}
+    for chat_id, user_id in Members.objects.values_list('chat_id', 'user_id'):
+        chat_members.setdefault(chat_id, []).append(user_id)
+
+    seen = set()
+    chats = []
+
+    # the oldest chat of a pair becomes its direct chat
+    for chat in Chat.objects.order_by('created'):
+        member_ids = chat_members.get(chat.pk, [])
+        if len(member_ids) != 2:
+            continue
+
+        key = (min(member_ids), max(member_ids))
+        if key in seen:
+            continue
+
+        seen.add(key)
+        chat.user_low_id, chat.user_high_id = key
+        chats.append(chat)
+
+    Chat.objects.bulk_update(chats, ['user_low', 'user_high'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_chat_message_chat_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='user_low',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_direct_chat_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='unique_direct_chat'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_read_markers(apps, schema_editor):
+    Chat = apps.get_model('chat', 'Chat')
+    Message = apps.get_model('chat', 'Message')
+    ReadMarker = apps.get_model('chat', 'ReadMarker')
+
+    # latest read message of each sender in each chat
+    last_read_by_sender = {}
+    for row in (
+        Message.objects.filter(is_read=True)
+        .values('chat_id', 'sender_id')
+        .annotate(last_read=Max('created'))
+    ):
+        last_read_by_sender.setdefault(row['chat_id'], []).append(
+            (row['sender_id'], row['last_read'])
+        )
+
+    markers = []
+
+    # a member has read up to the latest read message sent by someone else
+    for chat_id, user_id in Chat.members.through.objects.values_list('chat_id', 'user_id'):
+        last_read = max(
+            (
+                created for sender_id, created in last_read_by_sender.get(chat_id, [])
+                if sender_id != user_id
+            ),
+            default=None
+        )
+
+        if last_read:
+            markers.append(ReadMarker(chat_id=chat_id, user_id=user_id, last_read=last_read))
+
+    ReadMarker.objects.bulk_create(markers, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_chat_user_high_chat_user_low_chat_unique_direct_chat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadMarker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read', models.DateTimeField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_markers', to='chat.chat')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_markers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Read marker',
+                'verbose_name_plural': 'Read markers',
+                'constraints': [models.UniqueConstraint(fields=('chat', 'user'), name='unique_read_marker')],
+            },
+        ),
+        migrations.RunPython(backfill_read_markers, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
@@ -15,7 +15,13 @@ class Chat(models.Model):
 
     members = models.ManyToManyField(User, related_name='chats')
 
-    online_members = models.ManyToManyField(User, related_name='online', blank=True)
+    # canonical key of a direct chat: the lower and higher member id
+    user_low = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    user_high = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
 
     created = models.DateTimeField(auto_now_add=True)
     id = models.UUIDField(default=uuid4, unique=True, editable=False, primary_key=True)
@@ -24,6 +30,9 @@ class Chat(models.Model):
         verbose_name = 'Chat'
         verbose_name_plural = 'Chats'
         ordering = ('-created',)
+        constraints = [
+            models.UniqueConstraint(fields=('user_low', 'user_high'), name='unique_direct_chat'),
+        ]
 
     def __str__(self):
         return f'Chat: {', '.join([user.username for user in self.members.all()])}'
@@ -45,8 +54,6 @@ class Message(models.Model):
     
     content = models.TextField()
 
-    is_read = models.BooleanField(default=False)
-
     message_type = models.CharField(
         max_length=15,
         choices=MESSAGE_TYPES.choices,
@@ -68,6 +75,9 @@ class Message(models.Model):
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=('chat', 'created'), name='chat_message_chat_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.sender.username}: {self.content[:20]}'
@@ -75,3 +85,28 @@ class Message(models.Model):
     @property
     def time_sent(self):
         return timezone.localtime(self.created).strftime('%H:%M')
+
+
+class ReadMarker(models.Model):
+
+    """
+    How far a member has read a chat. Every message of the chat created
+    up to last_read counts as read by them, so reading a conversation
+    moves one row instead of updating each message.
+    """
+
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='read_markers')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='read_markers')
+
+    last_read = models.DateTimeField()
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Read marker'
+        verbose_name_plural = 'Read markers'
+        constraints = [
+            models.UniqueConstraint(fields=('chat', 'user'), name='unique_read_marker'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} read {self.chat_id} up to {self.last_read}'
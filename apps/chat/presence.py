@@ -0,0 +1,89 @@
+import time
+
+from django.conf import settings
+
+from django_redis import get_redis_connection
+
+
+PRESENCE_KEY = 'chat:presence:{chat_id}'
+BROADCAST_KEY = 'chat:presence:broadcast:{chat_id}'
+
+
+def get_presence_key(chat_id) -> str:
+    return PRESENCE_KEY.format(chat_id=chat_id)
+
+
+def get_presence_ttl() -> int:
+    return getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+
+
+def get_heartbeat_interval() -> float:
+    return get_presence_ttl() / 3
+
+
+def get_typing_interval() -> float:
+    return getattr(settings, 'CHAT_TYPING_INTERVAL', 3)
+
+
+def parse_members(members) -> list:
+    return sorted({int(member.split(b':', 1)[0]) for member in members})
+
+
+def update_presence(chat_id, user_id, channel_name, online: bool = True) -> list:
+
+    """
+    Add, refresh or remove one connection of a user in the presence
+    set of a chat and return the ids of the users online in it.
+
+    Every connection is a sorted set member scored by the time it
+    expires, so a user stays online while any of their connections
+    keeps sending heartbeats, and connections of a crashed worker drop
+    out after the TTL. The key itself expires with its last member.
+    """
+
+    conn = get_redis_connection('default')
+    key = get_presence_key(chat_id)
+    member = f'{user_id}:{channel_name}'
+
+    now = time.time()
+    ttl = get_presence_ttl()
+
+    with conn.pipeline(transaction=False) as pipe:
+        if online:
+            pipe.zadd(key, {member: now + ttl})
+            pipe.expire(key, ttl)
+        else:
+            pipe.zrem(key, member)
+
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zrange(key, 0, -1)
+
+        members = pipe.execute()[-1]
+
+    return parse_members(members)
+
+
+def get_online_members(chat_id) -> list:
+    conn = get_redis_connection('default')
+
+    return parse_members(
+        conn.zrangebyscore(get_presence_key(chat_id), time.time(), '+inf')
+    )
+
+
+def get_broadcast_interval() -> float:
+    return getattr(settings, 'CHAT_PRESENCE_BROADCAST_INTERVAL', 1)
+
+
+def claim_broadcast(chat_id) -> bool:
+
+    """
+    Claim the right to broadcast the presence of a chat for the next
+    broadcast interval. Returns False if another connection, in any
+    process, broadcast it within that interval.
+    """
+
+    conn = get_redis_connection('default')
+    interval_ms = max(int(get_broadcast_interval() * 1000), 1)
+
+    return bool(conn.set(BROADCAST_KEY.format(chat_id=chat_id), 1, nx=True, px=interval_ms))
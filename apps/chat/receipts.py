@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Message, ReadMarker
+
+
+def get_receipt_interval() -> float:
+    return getattr(settings, 'CHAT_READ_RECEIPT_INTERVAL', 5)
+
+
+def mark_read(chat_id, user_id, last_read) -> bool:
+
+    """
+    Move the read marker of a member forward to last_read. Returns
+    False if they had already read that far. The marker never moves
+    back, so late or reordered receipts are harmless.
+    """
+
+    updated = ReadMarker.objects.filter(
+        chat_id=chat_id, user_id=user_id, last_read__lt=last_read
+    ).update(last_read=last_read)
+
+    if updated:
+        return True
+
+    # either the first receipt of this member or the marker is ahead
+    _, created = ReadMarker.objects.get_or_create(
+        chat_id=chat_id, user_id=user_id, defaults={'last_read': last_read}
+    )
+
+    return created
+
+
+def get_read_event(user_id, last_read) -> dict:
+    return {
+        'type': 'read_handler',
+        'user_id': user_id,
+        'last_read': last_read.isoformat(),
+    }
+
+
+def send_read_receipt(chat_id, user_id, last_read):
+    async_to_sync(get_channel_layer().group_send)(
+        str(chat_id), get_read_event(user_id, last_read)
+    )
+
+
+def get_unread_messages(user):
+
+    """
+    Messages sent to user that are newer than their read marker in the
+    chat, to be narrowed down to one chat with filter(chat=...).
+    """
+
+    return Message.objects.exclude(sender=user).exclude(
+        Exists(
+            ReadMarker.objects.filter(
+                chat=OuterRef('chat'), user=user, last_read__gte=OuterRef('created')
+            )
+        )
+    )
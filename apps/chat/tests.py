@@ -1,3 +1,524 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
 
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from apps.posts.models import Post
+
+from utils.pagination import encode_cursor
+from utils.testing import RedisTestCase
+
+from . import presence, receipts
+from .consumers import ChatConsumer
+from .direct import get_direct_chat, get_direct_chats
+from .views import get_messages_page
+from .models import Chat, Message, ReadMarker
+from .routing import websocket_urlpatterns
+
+
+User = get_user_model()
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_PRESENCE_BROADCAST_INTERVAL=0.05
+)
+class ChatTestCase(RedisTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('sender')
+        self.other = self.create_user('receiver')
+        self.chat = get_direct_chat(self.user, self.other)
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='password'
+        )
+
+    def send_message(self, chat, sender, content='Hello', minutes_ago=0):
+        message = Message.objects.create(chat=chat, sender=sender, content=content)
+
+        if minutes_ago:
+            message.created = timezone.now() - timedelta(minutes=minutes_ago)
+            Message.objects.filter(pk=message.pk).update(created=message.created)
+
+        return message
+
+    async def connect(self, user, chat=None):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/chat/{(chat or self.chat).id}/'
+        )
+        communicator.scope['user'] = user
+
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        return communicator
+
+    async def receive_until(self, communicator, text):
+
+        """
+        Skip the frames sent before the first one containing text,
+        e.g. presence updates, and return it.
+        """
+
+        while True:
+            frame = await communicator.receive_from(timeout=1)
+            if text in frame:
+                return frame
+
+
+# ---------- CONSUMER ----------
+
+
+class ChatMessageTests(ChatTestCase):
+
+    async def test_message_is_rendered_once_per_side(self):
+        sender = await self.connect(self.user)
+        receiver = await self.connect(self.other)
+
+        with mock.patch.object(
+            ChatConsumer, 'render_message_partial', autospec=True,
+            side_effect=ChatConsumer.render_message_partial
+        ) as render:
+            await sender.send_to(text_data=json.dumps({'content': 'Hello'}))
+
+            sent = await self.receive_until(sender, 'Hello')
+            received = await self.receive_until(receiver, 'Hello')
+
+        self.assertEqual(render.call_count, 2)
+        self.assertIn('message-me', sent)
+        self.assertIn('message-them', received)
+        self.assertEqual(await Message.objects.filter(chat=self.chat).acount(), 1)
+
+        await sender.disconnect()
+        await receiver.disconnect()
+
+    async def test_blank_messages_are_ignored(self):
+        sender = await self.connect(self.user)
+
+        await sender.send_to(text_data=json.dumps({'content': '   '}))
+        await sender.disconnect()
+
+        self.assertFalse(await Message.objects.aexists())
+
+
+# ---------- PRESENCE ----------
+
+
+class PresenceTests(ChatTestCase):
+
+    def test_user_stays_online_while_any_connection_is_open(self):
+        chat_id = self.chat.id
+
+        presence.update_presence(chat_id, self.user.id, 'first')
+        presence.update_presence(chat_id, self.user.id, 'second')
+        self.assertEqual(
+            presence.update_presence(chat_id, self.other.id, 'third'),
+            sorted([self.user.id, self.other.id])
+        )
+
+        self.assertEqual(
+            presence.update_presence(chat_id, self.user.id, 'first', online=False),
+            sorted([self.user.id, self.other.id])
+        )
+        self.assertEqual(
+            presence.update_presence(chat_id, self.user.id, 'second', online=False),
+            [self.other.id]
+        )
+
+    def test_connections_without_heartbeats_expire(self):
+        presence.update_presence(self.chat.id, self.user.id, 'crashed')
+        later = time.time() + presence.get_presence_ttl() + 1
+
+        with mock.patch('apps.chat.presence.time.time', return_value=later):
+            self.assertEqual(presence.get_online_members(self.chat.id), [])
+            self.assertEqual(
+                presence.update_presence(self.chat.id, self.other.id, 'alive'),
+                [self.other.id]
+            )
+
+    def test_broadcast_is_claimed_once_per_interval(self):
+        self.assertTrue(presence.claim_broadcast(self.chat.id))
+        self.assertFalse(presence.claim_broadcast(self.chat.id))
+
+        time.sleep(presence.get_broadcast_interval() * 2)
+        self.assertTrue(presence.claim_broadcast(self.chat.id))
+
+    async def test_status_is_sent_when_the_other_user_comes_and_goes(self):
+        sender = await self.connect(self.user)
+        self.assertIn('Offline', await sender.receive_from(timeout=1))
+
+        receiver = await self.connect(self.other)
+        self.assertIn('Online', await self.receive_until(sender, 'online_status'))
+        self.assertIn('Online', await self.receive_until(receiver, 'online_status'))
+
+        await receiver.disconnect()
+        self.assertIn('Offline', await self.receive_until(sender, 'online_status'))
+
+        # the status is only sent again when it changes
+        self.assertTrue(
+            await sender.receive_nothing(timeout=presence.get_broadcast_interval() * 2)
+        )
+        await sender.disconnect()
+
+
+# ---------- INBOX ----------
+
+
+class InboxTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def get_inbox(self, **params):
+        response = self.client.get(reverse('chat:inbox'), params)
+        self.assertEqual(response.status_code, 200)
+
+        return response.context['chats']
+
+    def test_chats_are_ordered_by_last_activity(self):
+        quiet = get_direct_chat(self.user, self.create_user('quiet'))
+        recent = get_direct_chat(self.user, self.create_user('recent'))
+        self.send_message(self.chat, self.other, minutes_ago=5)
+        self.send_message(recent, self.user, minutes_ago=1)
+        Chat.objects.filter(pk=quiet.pk).update(created=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(
+            [entry['chat'].pk for entry in self.get_inbox().object_list],
+            [recent.pk, self.chat.pk, quiet.pk]
+        )
+
+    def test_entries_carry_the_last_message_and_unread_count(self):
+        self.send_message(self.chat, self.other, 'first', minutes_ago=3)
+        read = self.send_message(self.chat, self.other, 'second', minutes_ago=2)
+        self.send_message(self.chat, self.other, 'third', minutes_ago=1)
+        last = self.send_message(self.chat, self.user, 'reply')
+        receipts.mark_read(self.chat.id, self.user.id, read.created)
+
+        entry = self.get_inbox().object_list[0]
+
+        self.assertEqual(entry['other_user'], self.other)
+        self.assertEqual(entry['last_message'], last)
+        self.assertEqual(entry['unread_count'], 1)
+
+    def test_queries_do_not_grow_with_the_chats(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                self.get_inbox()
+            return len(context)
+
+        self.send_message(self.chat, self.other)
+        queries = count_queries()
+
+        for index in range(5):
+            chat = get_direct_chat(self.user, self.create_user(f'friend{index}'))
+            self.send_message(chat, chat.members.exclude(pk=self.user.pk).get())
+
+        self.assertEqual(count_queries(), queries)
+
+    @override_settings(CHATS_PER_PAGE=2)
+    def test_pages_follow_the_cursor(self):
+        chats = [self.chat] + [
+            get_direct_chat(self.user, self.create_user(f'friend{index}'))
+            for index in range(3)
+        ]
+        for minutes_ago, chat in enumerate(chats):
+            self.send_message(chat, self.user, minutes_ago=minutes_ago + 1)
+
+        first = self.get_inbox()
+        second = self.get_inbox(cursor=first.next_cursor)
+
+        self.assertEqual(
+            [entry['chat'].pk for page in (first, second) for entry in page.object_list],
+            [chat.pk for chat in chats]
+        )
+
+        tampered = self.get_inbox(cursor=encode_cursor(['yesterday', 'x']))
+        self.assertEqual(
+            [entry['chat'].pk for entry in tampered.object_list],
+            [entry['chat'].pk for entry in first.object_list]
+        )
+
+
+# ---------- HISTORY ----------
+
+
+@override_settings(CHAT_MESSAGES_PER_PAGE=3)
+class MessageHistoryTests(ChatTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.messages = [
+            self.send_message(self.chat, self.user, f'message {index}', minutes_ago=10 - index)
+            for index in range(7)
+        ]
+
+    def test_pages_run_newest_first_without_gaps(self):
+        pages = [get_messages_page(self.chat)]
+        while pages[-1].has_next():
+            pages.append(get_messages_page(self.chat, pages[-1].next_cursor))
+
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(
+            [message.pk for page in pages for message in page.object_list],
+            [message.pk for message in reversed(self.messages)]
+        )
+
+    def test_page_is_stable_across_new_messages(self):
+        first = get_messages_page(self.chat)
+        self.send_message(self.chat, self.other)
+
+        second = get_messages_page(self.chat, first.next_cursor)
+
+        self.assertEqual(
+            [message.pk for message in second.object_list],
+            [message.pk for message in self.messages[3:0:-1]]
+        )
+
+    def test_messages_view_renders_older_pages_of_member_chats(self):
+        self.client.force_login(self.user)
+        url = reverse('chat:chat_messages', args=[self.chat.id])
+        cursor = get_messages_page(self.chat).next_cursor
+
+        response = self.client.get(url, {'cursor': cursor})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'message 3')
+        self.assertNotContains(response, 'message 4')
+        self.assertContains(response, '?cursor=')
+
+        self.client.force_login(self.create_user('stranger'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+# ---------- DIRECT CHATS ----------
+
+
+class DirectChatTests(ChatTestCase):
+
+    def create_users(self, count, prefix='friend'):
+        return [self.create_user(f'{prefix}{index}') for index in range(count)]
+
+    def test_missing_chats_are_created_in_constant_queries(self):
+        def count_queries(others):
+            with CaptureQueriesContext(connection) as context:
+                chats = get_direct_chats(self.user, others)
+            self.assertEqual(set(chats), {other.pk for other in others})
+            return len(context)
+
+        self.assertEqual(
+            count_queries(self.create_users(1, 'one')),
+            count_queries(self.create_users(5, 'many'))
+        )
+
+    def test_chats_are_symmetric_and_reused(self):
+        others = self.create_users(3)
+        chats = get_direct_chats(self.user, others)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_direct_chats(self.user, others), chats)
+
+        self.assertEqual(get_direct_chat(others[0], self.user), chats[others[0].pk])
+        self.assertEqual(get_direct_chat(self.other, self.user), self.chat)
+        self.assertEqual(
+            set(chats[others[1].pk].members.all()), {self.user, others[1]}
+        )
+        self.assertEqual(Chat.objects.count(), 4)
+
+    def test_no_chat_with_oneself(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_direct_chat(self.user, self.user))
+
+    def test_start_chat_redirects_to_the_direct_chat(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('chat:start_chat', args=[self.other.username]))
+        self.assertRedirects(response, reverse('chat:chat', args=[self.chat.id]))
+
+        response = self.client.get(reverse('chat:start_chat', args=[self.user.username]))
+        self.assertRedirects(response, reverse('chat:inbox'))
+
+    def test_sharing_a_post_messages_every_recipient(self):
+        others = self.create_users(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.other)
+
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:send_post_to_chat', args=[post.pk]),
+            {'recipients': ','.join(other.username for other in others)}
+        )
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            sorted(Message.objects.filter(post=post).values_list('chat__user_high', flat=True)),
+            sorted(other.pk for other in others)
+        )
+
+
+# ---------- READ RECEIPTS ----------
+
+
+class ReadReceiptTests(ChatTestCase):
+
+    def test_read_marker_only_moves_forward(self):
+        now = timezone.now()
+
+        self.assertTrue(receipts.mark_read(self.chat.id, self.user.id, now))
+        self.assertFalse(receipts.mark_read(self.chat.id, self.user.id, now))
+        self.assertFalse(
+            receipts.mark_read(self.chat.id, self.user.id, now - timedelta(minutes=1))
+        )
+        self.assertTrue(
+            receipts.mark_read(self.chat.id, self.user.id, now + timedelta(minutes=1))
+        )
+
+        self.assertEqual(
+            ReadMarker.objects.get(chat=self.chat, user=self.user).last_read,
+            now + timedelta(minutes=1)
+        )
+
+    def test_unread_messages_are_newer_than_the_marker(self):
+        read = self.send_message(self.chat, self.other, minutes_ago=2)
+        unread = self.send_message(self.chat, self.other, minutes_ago=1)
+        self.send_message(self.chat, self.user)
+        receipts.mark_read(self.chat.id, self.user.id, read.created)
+
+        self.assertEqual(list(receipts.get_unread_messages(self.user)), [unread])
+        self.assertEqual(receipts.get_unread_messages(self.other).count(), 1)
+
+    def test_opening_a_chat_marks_it_read(self):
+        message = self.send_message(self.chat, self.other)
+
+        self.client.force_login(self.user)
+        with mock.patch('apps.chat.views.send_read_receipt') as send_read_receipt:
+            response = self.client.get(reverse('chat:chat', args=[self.chat.id]))
+            self.client.get(reverse('chat:chat', args=[self.chat.id]))
+
+        self.assertFalse(response.context['is_seen'])
+        send_read_receipt.assert_called_once_with(self.chat.id, self.user.pk, message.created)
+        self.assertFalse(receipts.get_unread_messages(self.user).exists())
+
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('chat:chat', args=[self.chat.id]))
+        self.assertTrue(response.context['is_seen'])
+
+    async def test_receipts_are_coalesced_per_interval(self):
+        sender = await self.connect(self.user)
+        receiver = await self.connect(self.other)
+        await self.receive_until(sender, 'Online')
+
+        await receiver.send_to(text_data=json.dumps({'read': True}))
+        first = json.loads(await self.receive_until(sender, '"read"'))
+
+        # a second receipt within the interval waits for the next flush
+        await receiver.send_to(text_data=json.dumps({'read': True}))
+        self.assertTrue(await sender.receive_nothing(timeout=0.2))
+
+        await receiver.disconnect()
+        second = json.loads(await self.receive_until(sender, '"read"'))
+
+        self.assertGreater(second['last_read'], first['last_read'])
+        self.assertEqual(await ReadMarker.objects.acount(), 1)
+
+        await sender.disconnect()
+
+    async def test_disconnect_before_connect_finished(self):
+        consumer = ChatConsumer()
+        consumer.user = self.user
+        consumer.chat_id = str(self.chat.id)
+        consumer.channel_layer = get_channel_layer()
+        consumer.channel_name = 'closed'
+
+        await consumer.disconnect(1000)
+
+        self.assertEqual(await sync_to_async(presence.get_online_members)(self.chat.id), [])
+
+
+# ---------- TYPING AND PRESENCE BROADCASTS ----------
+
+
+@override_settings(CHAT_TYPING_INTERVAL=0.2)
+class ChatBroadcastTests(ChatTestCase):
+
+    async def send_typing(self, communicator, typing):
+        await communicator.send_to(text_data=json.dumps({'typing': typing}))
+
+    async def test_typing_is_forwarded_on_change_and_once_per_interval(self):
+        sender = await self.connect(self.user)
+        receiver = await self.connect(self.other)
+        await self.receive_until(sender, 'Online')
+
+        await self.send_typing(receiver, True)
+        self.assertEqual(
+            json.loads(await self.receive_until(sender, 'typing')),
+            {'type': 'typing', 'typing': True}
+        )
+
+        await self.send_typing(receiver, True)
+        self.assertTrue(await sender.receive_nothing(timeout=0.1))
+
+        await asyncio.sleep(0.2)
+        await self.send_typing(receiver, True)
+        self.assertIn('true', await self.receive_until(sender, 'typing'))
+
+        # a disconnect while typing stops it
+        await receiver.disconnect()
+        self.assertIn('false', await self.receive_until(sender, 'typing'))
+
+        await sender.disconnect()
+
+    async def test_own_typing_is_not_echoed(self):
+        sender = await self.connect(self.user)
+        await sender.receive_from()
+
+        await self.send_typing(sender, True)
+        self.assertTrue(await sender.receive_nothing(timeout=0.1))
+
+        await sender.disconnect()
+
+    @override_settings(CHAT_PRESENCE_BROADCAST_INTERVAL=0.5)
+    async def test_presence_changes_within_an_interval_share_one_broadcast(self):
+        sender = await self.connect(self.user)
+        await sender.receive_from()
+
+        # let the broadcast of the sender's own connect go out and expire
+        await asyncio.sleep(presence.get_broadcast_interval() * 2)
+
+        with mock.patch.object(
+            ChatConsumer, 'send_online_status', autospec=True,
+            side_effect=ChatConsumer.send_online_status
+        ) as send_online_status:
+            receivers = [await self.connect(self.other) for _ in range(3)]
+
+            # the first change is broadcast right away, the others once after it
+            self.assertEqual(send_online_status.call_count, 1)
+            self.assertEqual(list(ChatConsumer.presence_tasks), [str(self.chat.id)])
+
+            await asyncio.sleep(presence.get_broadcast_interval() * 2)
+
+        self.assertEqual(send_online_status.call_count, 2)
+        self.assertEqual(ChatConsumer.presence_tasks, {})
+        self.assertIn('Online', await self.receive_until(sender, 'online_status'))
+
+        for receiver in receivers:
+            await receiver.disconnect()
+        await self.receive_until(sender, 'Offline')
+        await sender.disconnect()
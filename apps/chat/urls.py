@@ -9,5 +9,6 @@ app_name = 'chat'
 urlpatterns = [
     path('inbox/', views.inbox, name='inbox'),
     path('chat/<str:chat_id>/', views.chat, name='chat'),
+    path('chat/<str:chat_id>/messages/', views.chat_messages, name='chat_messages'),
     path('chat/start/<str:username>/', views.start_chat, name='start_chat'),
 ]
@@ -1,64 +1,169 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
+from django.db.models import Count, OuterRef, Subquery, Prefetch
+from django.db.models.functions import Coalesce
+from django.conf import settings
 
 from .forms import MessageForm
-from .models import Chat
+from .models import Message
+from .direct import get_direct_chat
+from .receipts import mark_read, send_read_receipt, get_unread_messages
+
+from utils.pagination import KeysetPaginator
 
 
 User = get_user_model()
 
 
+def get_inbox_queryset(user):
+
+    """
+    Chats of a user annotated with their last activity and unread
+    count, with the other member and the last message prefetched, so
+    a page of the inbox costs a constant number of queries.
+    """
+
+    last_message = (
+        Message.objects.filter(chat=OuterRef('pk'))
+        .order_by('-created', '-pk')
+        .values('created')[:1]
+    )
+
+    unread_count = (
+        get_unread_messages(user)
+        .filter(chat=OuterRef('pk'))
+        .order_by()
+        .values('chat')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+
+    return (
+        user.chats.annotate(
+            last_activity=Coalesce(Subquery(last_message), 'created'),
+            unread_count=Coalesce(Subquery(unread_count), 0)
+        )
+        .prefetch_related(
+            Prefetch(
+                'members',
+                queryset=User.objects.exclude(pk=user.pk).select_related('profile'),
+                to_attr='other_members'
+            ),
+            Prefetch(
+                'messages',
+                queryset=Message.objects.select_related('sender').order_by('-created', '-pk')[:1],
+                to_attr='last_messages'
+            )
+        )
+    )
+
+
 @login_required
 def inbox(request):
-    user_chats = request.user.chats.all()
-
-    chats = [
+    paginator = KeysetPaginator(
+        get_inbox_queryset(request.user),
+        per_page=getattr(settings, 'CHATS_PER_PAGE', 20),
+        ordering=('-last_activity', '-id')
+    )
+    chats = paginator.page(request.GET.get('cursor'))
+
+    chats.object_list = [
         {
             'chat': chat,
-            'other_user': chat.get_other_user(request.user),
-            'last_message': chat.messages.order_by('created').last()
+            'other_user': chat.other_members[0] if chat.other_members else None,
+            'last_message': chat.last_messages[0] if chat.last_messages else None,
+            'unread_count': chat.unread_count,
         }
-        for chat in user_chats
+        for chat in chats
     ]
+
+    if request.htmx:
+        template_name = 'chat/includes/chats_list.html'
+    else:
+        template_name = 'chat/inbox.html'
     
     context = {
         'chats': chats,
     }
 
-    return render(request, 'chat/inbox.html', context)
+    return render(request, template_name, context)
+
+
+def get_messages_page(chat, cursor=None):
+
+    """
+    A page of the history of a chat, newest first, keyset-paginated
+    on (created, id) with everything message.html renders preloaded.
+    """
+
+    paginator = KeysetPaginator(
+        chat.messages.select_related(
+            'sender', 'post__author__profile', 'story__author__profile'
+        )
+        .prefetch_related(
+            'post__media'
+        ),
+        per_page=getattr(settings, 'CHAT_MESSAGES_PER_PAGE', 30),
+        ordering=('-created', '-id')
+    )
+
+    return paginator.page(cursor)
 
 
 @login_required
 def chat(request, chat_id):
-    chat = get_object_or_404(Chat, id=chat_id)
+    chat = get_object_or_404(request.user.chats, id=chat_id)
 
     form = MessageForm()
 
     current_user = request.user
     other_user = chat.get_other_user(current_user)
 
-    chat_messages = chat.messages.all()
+    chat_messages = get_messages_page(chat)
+    last_message = chat_messages[0] if chat_messages else None
+
+    if last_message and last_message.sender_id != current_user.pk:
+        if mark_read(chat.id, current_user.pk, last_message.created):
+            send_read_receipt(chat.id, current_user.pk, last_message.created)
+
+    is_seen = bool(last_message) and last_message.sender_id == current_user.pk and (
+        chat.read_markers.exclude(user=current_user)
+        .filter(last_read__gte=last_message.created)
+        .exists()
+    )
     
     context = {
         'chat': chat,
         'form': form,
         'other_user': other_user,
         'chat_messages': chat_messages,
+        'is_seen': is_seen,
     }
     
     return render(request, 'chat/chat.html', context)
 
 
+@login_required
+def chat_messages(request, chat_id):
+    chat = get_object_or_404(request.user.chats, id=chat_id)
+
+    context = {
+        'chat': chat,
+        'chat_messages': get_messages_page(chat, request.GET.get('cursor')),
+    }
+
+    return render(request, 'chat/partials/messages_page.html', context)
+
+
 @login_required
 def start_chat(request, username):
     current_user = request.user
     other_user = get_object_or_404(User, username=username)
 
-    chat = current_user.chats.distinct().filter(members=other_user).first()
+    chat = get_direct_chat(current_user, other_user)
 
     if not chat:
-        chat = Chat.objects.create()
-        chat.members.add(current_user, other_user)
+        return redirect('chat:inbox')
 
     return redirect('chat:chat', chat.id)
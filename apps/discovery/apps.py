@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DiscoveryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.discovery'
+
+    def ready(self):
+        import apps.discovery.signals
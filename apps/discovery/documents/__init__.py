@@ -0,0 +1,3 @@
+from .posts import PostDocument
+from .profiles import ProfileDocument
+from .tags import TagDocument
@@ -34,12 +34,23 @@ class PostDocument(Document):
         fields = (
             'id',
             'public_id',
+            'created',
+            'likes_count',
+            'comments_count',
         )
         related_models = [User, Tag]
 
+    # fields of related models stored in the document
+    related_update_fields = {
+        User: {'username'},
+        Tag: {'name'},
+    }
+
     def get_queryset(self):
         return (
-            super().get_queryset().select_related('author')
+            super().get_queryset()
+            .select_related('author')
+            .prefetch_related('tags')
         )
 
     def get_instances_from_related(self, related_instance):
@@ -50,6 +61,4 @@ class PostDocument(Document):
         return None
 
     def prepare_tag_names(self, instance):
-        return list(
-            instance.tags.values_list('name', flat=True)
-        )
+        return [tag.name for tag in instance.tags.all()]
@@ -23,6 +23,15 @@ class ProfileDocument(Document):
         attr='user.full_name'
     )
     bio = fields.TextField()
+
+    # served straight from _source by autocomplete
+    username_suggest = fields.SearchAsYouTypeField(
+        attr='user.username'
+    )
+    avatar = fields.KeywordField(
+        attr='thumb_or_default',
+        index=False
+    )
     
     class Index:
         name = 'profiles'
@@ -38,6 +47,11 @@ class ProfileDocument(Document):
         )
         related_models = [User]
 
+    # fields of related models stored in the document
+    related_update_fields = {
+        User: {'username', 'full_name'},
+    }
+
     def get_queryset(self):
         return (
             super().get_queryset().select_related('user')
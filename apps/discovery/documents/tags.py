@@ -0,0 +1,29 @@
+from django_elasticsearch_dsl import Document, fields
+from django_elasticsearch_dsl.registries import registry
+
+from apps.posts.models import Tag
+
+
+@registry.register_document
+class TagDocument(Document):
+
+    """
+    Elasticsearch document for the Tag model, used for
+    search-as-you-type suggestions.
+    """
+
+    name = fields.SearchAsYouTypeField()
+    slug = fields.KeywordField()
+
+    class Index:
+        name = 'tags'
+        settings = {
+            'number_of_shards': 1,
+            'number_of_replicas': 0
+        }
+
+    class Django:
+        model = Tag
+        fields = (
+            'id',
+        )
@@ -0,0 +1,195 @@
+import heapq
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from django_redis import get_redis_connection
+
+from apps.posts.models import Post, Like
+from apps.profiles.models import Follow
+
+
+logger = logging.getLogger(__name__)
+
+
+CANDIDATES_KEY = 'explore:candidates'
+REFRESH_QUEUED_KEY = 'explore:candidates:refresh_queued'
+REFRESH_QUEUED_TTL = 60
+
+# Member kept in every stored pool, so an empty pool still exists.
+CANDIDATES_MARKER = b'built'
+
+LIKE_WEIGHT = 5
+COMMENT_WEIGHT = 3
+
+LIKED_BY_FOLLOWING_BOOST = 0.5
+FOAF_BOOST = 0.3
+
+GRAVITY = 1.5
+
+
+def get_candidates_size() -> int:
+    return getattr(settings, 'EXPLORE_CANDIDATES', 500)
+
+
+def get_window() -> timedelta:
+    return timedelta(days=getattr(settings, 'EXPLORE_WINDOW_DAYS', 30))
+
+
+def get_global_score(likes_count: int, comments_count: int, age_hours: float) -> float:
+
+    """
+    Engagement score that decays with the age of the post. Posts without
+    engagement still get a small score so fresh content can surface.
+    """
+
+    engagement = LIKE_WEIGHT * likes_count + COMMENT_WEIGHT * comments_count + 1
+
+    return engagement / (age_hours + 2) ** GRAVITY
+
+
+def refresh_candidates() -> int:
+
+    """
+    Score all active posts inside the explore window and store the top
+    EXPLORE_CANDIDATES of them in a Redis sorted set, along with a
+    marker so an empty pool is not mistaken for a missing one. Returns
+    the size of the new candidate pool.
+    """
+
+    now = timezone.now()
+
+    posts = (
+        Post.objects.filter(
+            status=Post.POST_STATUS.ACTIVE,
+            created__gte=now - get_window()
+        )
+        .values_list('id', 'likes_count', 'comments_count', 'created')
+        .iterator(chunk_size=2000)
+    )
+
+    top = heapq.nlargest(
+        get_candidates_size(),
+        (
+            (
+                get_global_score(
+                    likes_count, comments_count,
+                    (now - created).total_seconds() / 3600
+                ),
+                post_id
+            )
+            for post_id, likes_count, comments_count, created in posts
+        )
+    )
+
+    conn = get_redis_connection('default')
+    tmp_key = f'{CANDIDATES_KEY}:tmp'
+
+    entries = {post_id: score for score, post_id in top}
+    entries[CANDIDATES_MARKER] = float('-inf')
+
+    with conn.pipeline(transaction=True) as pipe:
+        pipe.delete(tmp_key)
+        pipe.zadd(tmp_key, entries)
+        pipe.rename(tmp_key, CANDIDATES_KEY)
+        pipe.delete(REFRESH_QUEUED_KEY)
+        pipe.execute()
+
+    return len(top)
+
+
+def get_candidates() -> list:
+
+    """
+    Return the (post_id, global_score) candidate pool, best first. If
+    the periodic job has not stored a pool yet, one refresh is queued
+    and the pool is empty until it runs, so scoring never happens on
+    the request path.
+    """
+
+    # imported here because the tasks module imports this one
+    from apps.discovery.tasks import refresh_explore_candidates_task
+
+    conn = get_redis_connection('default')
+    stored = conn.zrevrange(CANDIDATES_KEY, 0, -1, withscores=True)
+
+    if not stored:
+        if conn.set(REFRESH_QUEUED_KEY, 1, nx=True, ex=REFRESH_QUEUED_TTL):
+            refresh_explore_candidates_task.delay()
+        return []
+
+    return [
+        (int(post_id), score) for post_id, score in stored
+        if post_id != CANDIDATES_MARKER
+    ]
+
+
+def get_explore_entries(user) -> list:
+
+    """
+    Apply the per-user part of the explore ranking to the candidate pool:
+    drop the user's own and followed authors' posts, then boost posts
+    liked by followed users and posts whose authors they follow
+    (friend-of-a-friend). Returns (post_id, score) entries, best first.
+    """
+
+    candidates = dict(get_candidates())
+    if not candidates:
+        return []
+
+    following_ids = set(
+        user.following.values_list('user_id', flat=True)
+    )
+
+    authors = dict(
+        Post.objects.filter(
+            pk__in=candidates,
+            status=Post.POST_STATUS.ACTIVE
+        )
+        .exclude(author_id__in=following_ids | {user.pk})
+        .values_list('id', 'author_id')
+    )
+
+    liked_by_following = {}
+    foaf = {}
+
+    if following_ids and authors:
+        liked_by_following = dict(
+            Like.objects.filter(
+                post_id__in=authors, user_id__in=following_ids
+            )
+            .order_by()
+            .values('post_id')
+            .annotate(count=Count('pk'))
+            .values_list('post_id', 'count')
+        )
+
+        foaf = dict(
+            Follow.objects.filter(
+                user_id__in=set(authors.values()), follower_id__in=following_ids
+            )
+            .order_by()
+            .values('user_id')
+            .annotate(count=Count('pk'))
+            .values_list('user_id', 'count')
+        )
+
+    entries = [
+        (
+            post_id,
+            candidates[post_id] * (
+                1
+                + LIKED_BY_FOLLOWING_BOOST * liked_by_following.get(post_id, 0)
+                + FOAF_BOOST * foaf.get(author_id, 0)
+            )
+        )
+        for post_id, author_id in authors.items()
+    ]
+
+    return sorted(
+        entries, key=lambda entry: (entry[1], entry[0]), reverse=True
+    )
@@ -1,67 +1,34 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q, F
-from django.core.paginator import (
-    Paginator,
-    PageNotAnInteger,
-    EmptyPage
-)
 from django.urls import reverse
 
 from apps.posts.models import Post
+from apps.posts import engagement
 
+from utils.pagination import paginate_scored_ids, sort_by_ids
 
-@login_required
-def explore(request):
-    user = request.user
-    following_ids = user.following.values_list('user__id', flat=True)
-
-    posts = (
-        Post.objects.all()
-        .exclude(author__id__in=following_ids)
-        .exclude(author__id=user.id)
-        .select_related('author', 'author__profile')
-        .prefetch_related('media')
-        .annotate(
-            likes_count=Count('likes', distinct=True),
-            comments_count=Count('comments', distinct=True),
+from apps.discovery.tags.trending import get_trending_tags
 
-            foaf_score = Count(
-                'author__followers',
-                filter=Q(author__followers__follower__in=following_ids),
-                distinct=True
-            ),
+from .ranking import get_explore_entries
 
-            liked_by_following_score = Count(
-                'likes',
-                filter=Q(likes__user__id__in=following_ids),
-                distinct=True
-            ),
 
-            explore_score = (
-                5 * F('likes_count') +
-                3 * F('comments_count') +
-                10 * F('liked_by_following_score') +
-                6 * F('foaf_score')
-            )
-        )
-        .order_by(
-            '-explore_score',
-            '-created'
-        )
+@login_required
+def explore(request):
+    posts = paginate_scored_ids(
+        get_explore_entries(request.user),
+        cursor=request.GET.get('cursor'),
+        per_page=6
     )
 
-    paginator = Paginator(
-        posts, per_page=6
+    posts.object_list = engagement.apply_state(
+        sort_by_ids(
+            Post.objects.filter(pk__in=posts.object_list)
+            .select_related('author', 'author__profile')
+            .prefetch_related('media'),
+            posts.object_list
+        ),
+        request.user.pk
     )
-    page = request.GET.get('page', 1)
-
-    try:
-        posts = paginator.page(page)
-    except PageNotAnInteger:
-        posts = paginator.page(1)
-    except EmptyPage:
-        posts = paginator.page(paginator.num_pages)
 
     if request.htmx:
         template_name = 'posts/partials/posts_grid.html'
@@ -70,6 +37,7 @@ def explore(request):
 
     context = {
         'posts': posts,
+        'trending_tags': get_trending_tags(),
         'load_url': reverse('discovery:explore')
     }
 
@@ -0,0 +1,314 @@
+import logging
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import QuerySet
+from django.core.exceptions import ObjectDoesNotExist
+
+from django_redis import get_redis_connection
+from django_elasticsearch_dsl.apps import DEDConfig
+from django_elasticsearch_dsl.registries import registry
+from django_elasticsearch_dsl.signals import BaseSignalProcessor
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX = 'index'
+DELETE = 'delete'
+
+# Reindex of rows whose counters changed. Counters change with every
+# like, so these do not invalidate cached results, which expire soon
+# enough on their own.
+REFRESH = 'refresh'
+
+PENDING_KEY = 'search:{index}:{action}:pending'
+
+# Name of the index a full reindex is filling, so flushes write to it too.
+REINDEX_KEY = 'search:{index}:reindex'
+REINDEX_TTL = 60 * 60 * 24
+
+# Counter bumped whenever an index changes, so cached results go stale.
+GENERATION_KEY = 'search:{index}:generation'
+
+
+def get_batch_size() -> int:
+    return getattr(settings, 'SEARCH_INDEX_BATCH_SIZE', 500)
+
+
+def get_pending_key(index: str, action: str) -> str:
+    return PENDING_KEY.format(index=index, action=action)
+
+
+def get_reindex_key(index: str) -> str:
+    return REINDEX_KEY.format(index=index)
+
+
+def get_generation_key(index: str) -> str:
+    return GENERATION_KEY.format(index=index)
+
+
+def get_generation(index: str) -> int:
+    generation = get_redis_connection('default').get(get_generation_key(index))
+    return int(generation) if generation else 0
+
+
+def bump_generation(index: str) -> int:
+    return get_redis_connection('default').incr(get_generation_key(index))
+
+
+def get_document(index: str):
+    for document in registry.get_documents():
+        if document._index._name == index:
+            return document
+    return None
+
+
+def get_pks(instances) -> list:
+    if instances is None:
+        return []
+
+    if isinstance(instances, QuerySet):
+        return list(instances.values_list('pk', flat=True))
+
+    if hasattr(instances, 'pk'):
+        return [instances.pk]
+
+    return [instance.pk for instance in instances]
+
+
+def get_related_pks(instance, update_fields=None) -> dict:
+
+    """
+    Primary keys of the documents that embed data of instance, by
+    index, like the posts of a user or of a tag. A save limited to
+    update_fields the document does not embed, as listed in its
+    related_update_fields, affects nothing.
+    """
+
+    related = {}
+
+    for document in registry.get_documents():
+        if instance.__class__ not in document.django.related_models:
+            continue
+
+        embedded = getattr(document, 'related_update_fields', {}).get(instance.__class__)
+        if update_fields and embedded and not embedded & set(update_fields):
+            continue
+
+        try:
+            pks = get_pks(document().get_instances_from_related(instance))
+        except ObjectDoesNotExist:
+            pks = []
+
+        if pks:
+            related.setdefault(document._index._name, []).extend(pks)
+
+    return related
+
+
+def get_model_indices(model) -> list:
+    return [
+        document._index._name
+        for document in registry.get_documents([model])
+        if not document.django.ignore_signals
+    ]
+
+
+def get_own_indices(instance) -> list:
+    return get_model_indices(instance.__class__)
+
+
+def queue(changes: dict):
+
+    """
+    Queue document changes given as {(index, action): pks} for the next
+    flush. Pending changes are sets, so repeated saves of the same row
+    are indexed once.
+    """
+
+    conn = get_redis_connection('default')
+
+    with conn.pipeline(transaction=False) as pipe:
+        for (index, action), pks in changes.items():
+            if pks:
+                pipe.sadd(get_pending_key(index, action), *pks)
+        pipe.execute()
+
+
+def queue_updated(model, pks):
+
+    """
+    Queue the documents of rows whose counters changed with queryset
+    updates or bulk updates, which send no signals. The change is
+    queued once the transaction commits, as a refresh that leaves
+    cached results valid.
+    """
+
+    pks = list(pks)
+    if not pks or not DEDConfig.autosync_enabled():
+        return
+
+    changes = {(index, REFRESH): pks for index in get_model_indices(model)}
+
+    if changes:
+        transaction.on_commit(lambda: queue(changes))
+
+
+def get_target_indices(conn, index: str) -> list:
+    target = conn.get(get_reindex_key(index))
+    return [index, target.decode()] if target else [index]
+
+
+def index_documents(document, pks, indices) -> int:
+
+    """
+    Index the rows with the given primary keys into indices with one
+    bulk request. Rows are loaded through the document queryset, which
+    prefetches what the document embeds. Returns the number of rows.
+    """
+
+    doc = document()
+    instances = list(doc.get_queryset().filter(pk__in=pks))
+
+    actions = [
+        {**action, '_index': index}
+        for action in doc.get_actions(instances, INDEX)
+        for index in indices
+    ]
+
+    if actions:
+        doc.bulk(actions)
+
+    return len(instances)
+
+
+def delete_documents(document, pks, indices):
+    actions = [
+        {'_op_type': DELETE, '_index': index, '_id': pk}
+        for pk in pks
+        for index in indices
+    ]
+
+    # documents that were never indexed are not an error
+    document().bulk(actions, raise_on_error=False)
+
+
+def flush(index: str) -> int:
+
+    """
+    Apply the queued changes of an index with the bulk API, in batches,
+    and bump its generation so cached results of it are dropped, unless
+    only counters changed. Returns the number of flushed changes.
+    """
+
+    document = get_document(index)
+    if document is None:
+        return 0
+
+    conn = get_redis_connection('default')
+    indices = get_target_indices(conn, index)
+    batch_size = get_batch_size()
+    flushed = 0
+    changed = set()
+
+    for action in (INDEX, DELETE, REFRESH):
+        pending_key = get_pending_key(index, action)
+        flushing_key = f'{pending_key}:flushing'
+
+        # A leftover batch from a failed run is flushed before taking new changes.
+        if not conn.exists(flushing_key):
+            if not conn.exists(pending_key):
+                continue
+
+            conn.rename(pending_key, flushing_key)
+
+        pks = sorted(int(pk) for pk in conn.smembers(flushing_key))
+        flushed += len(pks)
+
+        if action == REFRESH:
+            # rows reindexed above already have their new counters
+            pks = [pk for pk in pks if pk not in changed]
+        else:
+            changed.update(pks)
+
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+
+            if action == DELETE:
+                delete_documents(document, batch, indices)
+            else:
+                index_documents(document, batch, indices)
+
+        conn.delete(flushing_key)
+
+    if changed:
+        bump_generation(index)
+
+    return flushed
+
+
+def flush_all() -> dict:
+    return {
+        document._index._name: flush(document._index._name)
+        for document in registry.get_documents()
+    }
+
+
+class BufferedSignalProcessor(BaseSignalProcessor):
+
+    """
+    Signal processor that queues the primary keys of changed documents
+    in Redis once the transaction commits, instead of calling
+    Elasticsearch during the request. A periodic Celery task flushes the
+    queue with the bulk API (see flush).
+    """
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+        models.signals.m2m_changed.connect(self.handle_m2m_changed)
+        models.signals.pre_delete.connect(self.handle_pre_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+        models.signals.m2m_changed.disconnect(self.handle_m2m_changed)
+        models.signals.pre_delete.disconnect(self.handle_pre_delete)
+
+    def queue_on_commit(self, changes: dict):
+        if changes and DEDConfig.autosync_enabled():
+            transaction.on_commit(lambda: queue(changes))
+
+    def handle_save(self, sender, instance, **kwargs):
+        if instance.__class__ not in registry:
+            return
+
+        changes = {(index, INDEX): [instance.pk] for index in get_own_indices(instance)}
+
+        for index, pks in get_related_pks(instance, kwargs.get('update_fields')).items():
+            changes.setdefault((index, INDEX), []).extend(pks)
+
+        self.queue_on_commit(changes)
+
+    def handle_pre_delete(self, sender, instance, **kwargs):
+
+        """
+        Documents embedding instance are reindexed without it, so they
+        are collected while the relation still exists.
+        """
+
+        if instance.__class__ not in registry:
+            return
+
+        self.queue_on_commit({
+            (index, INDEX): pks for index, pks in get_related_pks(instance).items()
+        })
+
+    def handle_delete(self, sender, instance, **kwargs):
+        if instance.__class__ not in registry:
+            return
+
+        self.queue_on_commit({
+            (index, DELETE): [instance.pk] for index in get_own_indices(instance)
+        })
@@ -0,0 +1,133 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from django_redis import get_redis_connection
+from django_elasticsearch_dsl.registries import registry
+
+from apps.discovery import indexing
+
+
+class Command(BaseCommand):
+
+    """
+    Rebuild search indices without downtime. Every document is bulk
+    indexed into a new timestamped index while searches keep reading
+    the old one through the alias, then the alias is switched over in
+    one atomic request. Changes flushed during the rebuild are written
+    to both indices.
+    """
+
+    help = 'Rebuild Elasticsearch indices behind their aliases without downtime.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index',
+            action='append',
+            dest='indices',
+            help='Name of an index to rebuild. Defaults to all indices.'
+        )
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help='Keep the previous indices instead of deleting them.'
+        )
+
+    def handle(self, *args, **options):
+        documents = sorted(registry.get_documents(), key=lambda document: document._index._name)
+
+        if options['indices']:
+            unknown = set(options['indices']) - {document._index._name for document in documents}
+            if unknown:
+                raise CommandError(f'Unknown indices: {', '.join(sorted(unknown))}')
+
+            documents = [
+                document for document in documents
+                if document._index._name in options['indices']
+            ]
+
+        for document in documents:
+            self.reindex(document, keep_old=options['keep_old'])
+
+    def reindex(self, document, keep_old: bool=False):
+        alias = document._index._name
+        new_index = f'{alias}-{timezone.now():%Y%m%d%H%M%S}'
+
+        es = document._get_connection()
+        conn = get_redis_connection('default')
+        reindex_key = indexing.get_reindex_key(alias)
+
+        document._index.clone(name=new_index).create(using=es)
+        conn.set(reindex_key, new_index, ex=indexing.REINDEX_TTL)
+
+        try:
+            # refreshing is pointless until the index is searched
+            es.indices.put_settings(index=new_index, settings={'refresh_interval': '-1'})
+
+            indexed = self.populate(document, new_index)
+
+            es.indices.put_settings(index=new_index, settings={'refresh_interval': None})
+            es.indices.refresh(index=new_index)
+
+            old_indices = self.switch_alias(es, alias, new_index)
+        except Exception:
+            es.indices.delete(index=new_index, ignore_unavailable=True)
+            raise
+        finally:
+            conn.delete(reindex_key)
+
+        indexing.bump_generation(alias)
+
+        if not keep_old:
+            for index in old_indices:
+                es.indices.delete(index=index, ignore_unavailable=True)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed} documents into {new_index} behind {alias}.')
+        )
+
+    def populate(self, document, index: str) -> int:
+        pks = (
+            document.django.model._default_manager
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+        batch_size = indexing.get_batch_size()
+        batch = []
+        indexed = 0
+
+        for pk in pks.iterator(chunk_size=batch_size):
+            batch.append(pk)
+
+            if len(batch) >= batch_size:
+                indexed += indexing.index_documents(document, batch, [index])
+                batch = []
+
+        if batch:
+            indexed += indexing.index_documents(document, batch, [index])
+
+        return indexed
+
+    def switch_alias(self, es, alias: str, new_index: str) -> list:
+
+        """
+        Point alias at new_index only and return the indices it pointed
+        at before. An index created under the alias name by an older
+        deployment is replaced in the same request.
+        """
+
+        actions = [{'add': {'index': new_index, 'alias': alias}}]
+        old_indices = []
+
+        if es.indices.exists_alias(name=alias):
+            old_indices = list(es.indices.get_alias(name=alias).keys())
+            actions += [
+                {'remove': {'index': index, 'alias': alias}}
+                for index in old_indices
+            ]
+        elif es.indices.exists(index=alias):
+            actions.append({'remove_index': {'index': alias}})
+
+        es.indices.update_aliases(actions=actions)
+
+        return old_indices
@@ -0,0 +1,323 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q, F
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity
+)
+
+from elasticsearch import ApiError, TransportError
+
+from apps.discovery.documents.posts import PostDocument
+from apps.posts.models import Post, Tag
+from apps.profiles.models import Profile
+
+from utils.pagination import (
+    CursorPage,
+    KeysetPaginator,
+    paginate_scored_ids
+)
+
+from . import queries
+
+
+logger = logging.getLogger(__name__)
+
+
+class SearchBackend:
+
+    """
+    Interface of a search engine. Searches return ids in result order
+    and the views load the rows themselves, so engines are
+    interchangeable; suggestions are returned ready to serialize.
+    """
+
+    name = None
+
+    # exceptions meaning the engine is down rather than the query wrong
+    errors = ()
+
+    def is_available(self) -> bool:
+        return True
+
+    def mark_unavailable(self):
+        pass
+
+    def search_post_entries(
+            self, search_query: str, start_date=None, end_date=None,
+            cursor: str=None, size: int=7
+        ) -> list:
+
+        """
+        Up to size (post id, score) entries sorted by (score, id)
+        descending, after the (score, id) cursor if one is given.
+        """
+
+        raise NotImplementedError
+
+    def search_post_ids(
+            self, search_query: str, start_date=None, end_date=None,
+            cursor: str=None, per_page: int=6
+        ) -> CursorPage:
+        entries = self.search_post_entries(
+            search_query, start_date=start_date, end_date=end_date,
+            cursor=cursor, size=per_page + 1
+        )
+
+        return paginate_scored_ids(entries, per_page=per_page)
+
+    def search_profile_ids(self, search_query: str) -> list:
+        raise NotImplementedError
+
+    def search_suggestions(self, prefix: str, size: int) -> dict:
+        raise NotImplementedError
+
+
+class ElasticsearchBackend(SearchBackend):
+
+    """
+    Search backed by the Elasticsearch documents of the discovery app.
+    Its health is checked with a ping whose result is cached, so a
+    down cluster costs one timeout per check interval, not per request.
+    """
+
+    name = 'elasticsearch'
+    errors = (ApiError, TransportError)
+
+    AVAILABLE_KEY = 'search:elasticsearch:available'
+
+    def get_check_interval(self) -> int:
+        return getattr(settings, 'SEARCH_HEALTH_CHECK_INTERVAL', 30)
+
+    def is_available(self) -> bool:
+        available = cache.get(self.AVAILABLE_KEY)
+
+        if available is None:
+            try:
+                available = bool(
+                    PostDocument._get_connection()
+                    .options(request_timeout=getattr(settings, 'SEARCH_HEALTH_CHECK_TIMEOUT', 1))
+                    .ping()
+                )
+            except Exception as e:
+                logger.warning(f'Elasticsearch health check failed: {e}')
+                available = False
+
+            cache.set(self.AVAILABLE_KEY, available, timeout=self.get_check_interval())
+
+        return available
+
+    def mark_unavailable(self):
+        cache.set(self.AVAILABLE_KEY, False, timeout=self.get_check_interval())
+
+    def search_post_entries(
+            self, search_query: str, start_date=None, end_date=None,
+            cursor: str=None, size: int=7
+        ) -> list:
+        return queries.search_post_entries(
+            search_query, start_date=start_date, end_date=end_date,
+            cursor=cursor, size=size
+        )
+
+    def search_profile_ids(self, search_query: str) -> list:
+        return queries.search_profile_ids(search_query)
+
+    def search_suggestions(self, prefix: str, size: int) -> dict:
+        return queries.search_suggestions(prefix, size)
+
+
+class PostgresBackend(SearchBackend):
+
+    """
+    Full-text search in PostgreSQL. Captions and bios are matched
+    against trigger-maintained search vectors with GIN indexes, and
+    usernames fuzzily with pg_trgm, so small deployments can run
+    without Elasticsearch and larger ones can fail over to it.
+    """
+
+    name = 'postgres'
+
+    # the text search configuration the search vector triggers use
+    config = 'english'
+
+    def get_query(self, search_query: str) -> SearchQuery:
+        return SearchQuery(search_query, config=self.config, search_type='websearch')
+
+    def search_post_entries(
+            self, search_query: str, start_date=None, end_date=None,
+            cursor: str=None, size: int=7
+        ) -> list:
+        query = self.get_query(search_query)
+
+        tagged = Post.tags.through.objects.filter(
+            post=OuterRef('pk'), tag__name__iexact=search_query
+        )
+
+        posts = (
+            Post.objects.annotate(rank=SearchRank(F('search_vector'), query))
+            .filter(
+                Q(search_vector=query)
+                | Q(Exists(tagged))
+                | Q(author__username__trigram_word_similar=search_query)
+            )
+        )
+
+        if start_date:
+            posts = posts.filter(created__date__gte=start_date)
+
+        if end_date:
+            posts = posts.filter(created__date__lte=end_date)
+
+        paginator = KeysetPaginator(posts, per_page=size, ordering=('-rank', '-id'))
+        posts = posts.order_by(*paginator.ordering)
+
+        values = paginator.get_cursor_values(cursor)
+        if values:
+            posts = posts.filter(paginator.get_seek_filter(values))
+
+        return list(posts.values_list('pk', 'rank')[:size])
+
+    def search_profile_ids(self, search_query: str) -> list:
+        return list(
+            Profile.objects.annotate(
+                similarity=TrigramWordSimilarity(search_query, 'user__username')
+            )
+            .filter(
+                Q(user__username__trigram_word_similar=search_query)
+                | Q(user__full_name__icontains=search_query)
+                | Q(search_vector=self.get_query(search_query))
+            )
+            .order_by('-similarity', '-pk')
+            # as many as an Elasticsearch search returns by default
+            .values_list('pk', flat=True)[:10]
+        )
+
+    def search_suggestions(self, prefix: str, size: int) -> dict:
+        profiles = (
+            Profile.objects.filter(user__username__istartswith=prefix)
+            .select_related('user')
+            .order_by('user__username')[:size]
+        )
+
+        tags = Tag.objects.filter(name__istartswith=prefix).order_by('name')[:size]
+
+        return {
+            'profiles': [
+                {
+                    'id': profile.pk,
+                    'username': profile.user.username,
+                    'avatar': profile.thumb_or_default,
+                }
+                for profile in profiles
+            ],
+            'tags': [
+                {
+                    'id': tag.pk,
+                    'name': tag.name,
+                    'slug': tag.slug,
+                }
+                for tag in tags
+            ],
+        }
+
+
+BACKENDS = {
+    ElasticsearchBackend.name: ElasticsearchBackend,
+    PostgresBackend.name: PostgresBackend,
+}
+
+
+def get_backend(name: str) -> SearchBackend:
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown search backend: {name}')
+    return BACKENDS[name]()
+
+
+def get_fallback_backend(backend: SearchBackend):
+    name = getattr(settings, 'SEARCH_FALLBACK_BACKEND', PostgresBackend.name)
+
+    if not name or name == backend.name:
+        return None
+
+    return get_backend(name)
+
+
+def get_search_backend() -> SearchBackend:
+
+    """
+    The configured search backend, or the fallback backend while the
+    configured one fails its health check.
+    """
+
+    backend = get_backend(getattr(settings, 'SEARCH_BACKEND', ElasticsearchBackend.name))
+
+    if not backend.is_available():
+        fallback = get_fallback_backend(backend)
+
+        if fallback is not None:
+            return fallback
+
+    return backend
+
+
+def run_search(method: str, *args, **kwargs):
+
+    """
+    Call a search method on the current backend. If the backend fails
+    with one of its errors, it is marked unavailable and the call is
+    retried on the fallback backend.
+    """
+
+    backend = get_search_backend()
+
+    try:
+        return getattr(backend, method)(*args, **kwargs)
+    except backend.errors as e:
+        fallback = get_fallback_backend(backend)
+
+        if fallback is None:
+            raise
+
+        logger.warning(f'Search on {backend.name} failed, using {fallback.name}: {e}')
+        backend.mark_unavailable()
+
+        return getattr(fallback, method)(*args, **kwargs)
+
+
+SUGGESTIONS_CACHE_KEY = 'search:suggestions:{prefix}'
+SUGGESTIONS_MAX_PREFIX = 50
+
+
+def normalize_prefix(prefix: str) -> str:
+    return ' '.join(prefix.lower().split())[:SUGGESTIONS_MAX_PREFIX]
+
+
+def get_suggestions(prefix: str) -> dict:
+
+    """
+    Suggestions for a typed prefix, cached briefly per prefix since
+    many users type the same first letters.
+    """
+
+    prefix = normalize_prefix(prefix)
+    if not prefix:
+        return {'profiles': [], 'tags': []}
+
+    cache_key = SUGGESTIONS_CACHE_KEY.format(prefix=prefix)
+    suggestions = cache.get(cache_key)
+
+    if suggestions is None:
+        suggestions = run_search(
+            'search_suggestions', prefix, getattr(settings, 'SEARCH_SUGGESTIONS_SIZE', 5)
+        )
+
+        cache.set(
+            cache_key,
+            suggestions,
+            timeout=getattr(settings, 'SEARCH_SUGGESTIONS_CACHE_TTL', 30)
+        )
+
+    return suggestions
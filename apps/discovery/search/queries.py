@@ -0,0 +1,162 @@
+from elasticsearch.dsl import MultiSearch
+
+from apps.discovery.documents.posts import PostDocument
+from apps.discovery.documents.profiles import ProfileDocument
+from apps.discovery.documents.tags import TagDocument
+
+from utils.pagination import decode_cursor
+
+
+def get_posts_search(search_query: str, start_date=None, end_date=None):
+
+    """
+    Relevance-ranked search of posts. Popular posts get a small boost
+    from the like counter stored in the document, and the date range
+    of PostFilter is applied as a filter, so it does not affect scores.
+    """
+
+    search = (
+        PostDocument.search()
+        .query(
+            'function_score',
+            query={
+                'multi_match': {
+                    'query': search_query,
+                    'fields': [
+                        'caption^3',
+                        'tag_names',
+                        'author_username',
+                    ],
+                    'fuzziness': 'AUTO',
+                }
+            },
+            functions=[
+                {
+                    'field_value_factor': {
+                        'field': 'likes_count',
+                        'modifier': 'log1p',
+                        'missing': 0,
+                    }
+                }
+            ],
+            boost_mode='sum'
+        )
+    )
+
+    created_range = {}
+
+    if start_date:
+        created_range['gte'] = start_date.isoformat()
+
+    if end_date:
+        # a date covers the whole day
+        created_range['lte'] = f'{end_date.isoformat()}||/d'
+
+    if created_range:
+        search = search.filter('range', created=created_range)
+
+    return search
+
+
+def search_post_entries(
+        search_query: str, start_date=None, end_date=None, cursor: str=None,
+        size: int=7
+    ) -> list:
+
+    """
+    Up to size (post id, score) entries in relevance order, continuing
+    after the (score, id) cursor with search_after. Only ids are
+    fetched, so the caller hydrates just the posts it shows.
+    """
+
+    search = (
+        get_posts_search(search_query, start_date=start_date, end_date=end_date)
+        .sort('_score', {'id': 'desc'})
+        .source(False)
+        .extra(size=size, track_total_hits=False)
+    )
+
+    values = decode_cursor(cursor)
+    if (
+        values and len(values) == 2
+        and all(isinstance(value, (int, float)) for value in values)
+    ):
+        search = search.extra(search_after=values)
+
+    return [(int(hit.meta.id), hit.meta.sort[0]) for hit in search.execute()]
+
+
+def get_profiles_search(search_query: str):
+    return (
+        ProfileDocument.search()
+        .query(
+            'multi_match',
+            query=search_query,
+            fields=[
+                'username^3',
+                'full_name^2',
+                'bio',
+            ],
+            fuzziness='AUTO'
+        )
+    )
+
+
+def search_profile_ids(search_query: str) -> list:
+    return [
+        int(hit.meta.id)
+        for hit in get_profiles_search(search_query).source(False).execute()
+    ]
+
+
+def get_suggestion_search(document, field: str, prefix: str, source: list, size: int):
+    return (
+        document.search()
+        .query(
+            'multi_match',
+            query=prefix,
+            type='bool_prefix',
+            fields=[field, f'{field}._2gram', f'{field}._3gram']
+        )
+        .source(source)
+        .extra(size=size, track_total_hits=False)
+    )
+
+
+def search_suggestions(prefix: str, size: int) -> dict:
+
+    """
+    Profiles and tags matching a typed prefix, read from the _source
+    of the documents without touching the database. Both searches go
+    out in one multi-search request.
+    """
+
+    profiles, tags = (
+        MultiSearch()
+        .add(get_suggestion_search(
+            ProfileDocument, 'username_suggest', prefix, ['username', 'avatar'], size
+        ))
+        .add(get_suggestion_search(
+            TagDocument, 'name', prefix, ['name', 'slug'], size
+        ))
+        .execute()
+    )
+
+    return {
+        'profiles': [
+            {
+                'id': int(hit.meta.id),
+                'username': hit.username,
+                'avatar': hit.avatar,
+            }
+            for hit in profiles
+        ],
+        'tags': [
+            {
+                'id': int(hit.meta.id),
+                'name': hit.name,
+                'slug': hit.slug,
+            }
+            for hit in tags
+        ],
+    }
@@ -0,0 +1,112 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.discovery import indexing
+from apps.discovery.documents.posts import PostDocument
+from apps.discovery.documents.profiles import ProfileDocument
+
+from utils.pagination import CursorPage, paginate_scored_ids
+
+from .backends import run_search
+
+
+RESULTS_CACHE_KEY = 'search:results:{index}:{generation}:{digest}'
+
+
+def get_cache_ttl() -> int:
+    return getattr(settings, 'SEARCH_RESULTS_CACHE_TTL', 60)
+
+
+def get_cache_size() -> int:
+    return getattr(settings, 'SEARCH_RESULTS_CACHE_SIZE', 120)
+
+
+def normalize_query(search_query: str) -> str:
+    return ' '.join(search_query.lower().split())
+
+
+def get_cache_key(index: str, search_query: str, **filters) -> str:
+
+    """
+    Cache key of the results of a normalized query and its filters in
+    the current generation of index, so flushing changes to the index
+    moves every query to new keys.
+    """
+
+    digest = hashlib.sha1(
+        json.dumps([search_query, filters], sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+    return RESULTS_CACHE_KEY.format(
+        index=index,
+        generation=indexing.get_generation(index),
+        digest=digest
+    )
+
+
+def search_post_ids(
+        search_query: str, start_date=None, end_date=None, cursor: str=None,
+        per_page: int=6
+    ) -> CursorPage:
+
+    """
+    A page of post ids in relevance order. The first pages of a query
+    are paged from a cached list of (id, score) entries, whose cursors
+    are the same (score, id) pairs the backends search after, so pages
+    past the cached list continue on the backend.
+    """
+
+    search_query = normalize_query(search_query)
+    size = get_cache_size()
+
+    cache_key = get_cache_key(
+        PostDocument._index._name, search_query, start_date=start_date, end_date=end_date
+    )
+    results = cache.get(cache_key)
+
+    if results is None:
+        entries = run_search(
+            'search_post_entries',
+            search_query,
+            start_date=start_date,
+            end_date=end_date,
+            size=size + 1
+        )
+
+        results = {
+            'entries': entries[:size],
+            'complete': len(entries) <= size,
+        }
+
+        cache.set(cache_key, results, timeout=get_cache_ttl())
+
+    page = paginate_scored_ids(results['entries'], cursor=cursor, per_page=per_page)
+
+    if page.has_next() or results['complete']:
+        return page
+
+    # the cached entries ran out but the query has more matches
+    return run_search(
+        'search_post_ids',
+        search_query,
+        start_date=start_date,
+        end_date=end_date,
+        cursor=cursor,
+        per_page=per_page
+    )
+
+
+def search_profile_ids(search_query: str) -> list:
+    search_query = normalize_query(search_query)
+    cache_key = get_cache_key(ProfileDocument._index._name, search_query)
+
+    profile_ids = cache.get(cache_key)
+
+    if profile_ids is None:
+        profile_ids = run_search('search_profile_ids', search_query)
+        cache.set(cache_key, profile_ids, timeout=get_cache_ttl())
+
+    return profile_ids
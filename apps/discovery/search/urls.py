@@ -5,4 +5,5 @@ from . import views
 
 urlpatterns = [
     path('', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
 ]
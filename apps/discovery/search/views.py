@@ -1,21 +1,26 @@
 from urllib.parse import urlencode
 
 from django.shortcuts import render
-from django.db.models import Q, Count
-from django.http import Http404
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.urls import reverse
+from django.http import JsonResponse
 
-from apps.discovery.documents.posts import PostDocument
-from apps.discovery.documents.profiles import ProfileDocument
-
+from apps.posts.models import Post
+from apps.posts import engagement
 from apps.posts.filters import PostFilter
+from apps.profiles.models import Profile
+
+from utils.pagination import sort_by_ids
+
+from .backends import get_suggestions
+from .results import search_post_ids, search_profile_ids
 
 
 def search(request):
     """
     Search for posts and profiles based on a query string
-    using Elasticsearch.
+    using the configured search backend. Result ids are cached
+    per query and filters, and only the current page of posts is
+    loaded from the database.
     """
 
     search_query = request.GET.get('query', '')
@@ -31,63 +36,37 @@ def search(request):
             }
         )
 
-    es_posts = (
-        PostDocument.search()
-        .query(
-            'multi_match',
-            query=search_query,
-            fields=[
-                'caption^3',
-                'tag_names',
-                'author__username',
-            ],
-            fuzziness='AUTO'
-        )
-        .extra(size=1000)
-        .to_queryset()
-        .select_related(
-            'author', 'author__profile'
-        )
-        .prefetch_related('media')
-        .annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments')
-        )
-        .order_by('-created')
+    posts_filter = PostFilter(
+        request.GET,
+        queryset=Post.objects.none()
     )
 
-    es_profiles = (
-        ProfileDocument.search()
-        .query(
-            'multi_match',
-            query=search_query,
-            fields=[
-                'username^3',
-                'full_name^2',
-                'bio',
-            ],
-            fuzziness='AUTO'
-        )
-        .to_queryset()
-        .select_related('user')
-    )
+    dates = posts_filter.form.cleaned_data if posts_filter.form.is_valid() else {}
 
-    posts_filter = PostFilter(
-        request.GET,
-        queryset=es_posts
+    posts = search_post_ids(
+        search_query,
+        start_date=dates.get('start_date'),
+        end_date=dates.get('end_date'),
+        cursor=request.GET.get('cursor'),
+        per_page=6
     )
 
-    paginator = Paginator(
-        posts_filter.qs, per_page=6
+    posts.object_list = engagement.apply_state(
+        sort_by_ids(
+            Post.objects.filter(pk__in=posts.object_list)
+            .select_related('author', 'author__profile')
+            .prefetch_related('media'),
+            posts.object_list
+        ),
+        request.user.pk
     )
-    page = request.GET.get('page', 1)
 
-    try:
-        posts = paginator.page(page)
-    except PageNotAnInteger:
-        posts = paginator.page(1)
-    except EmptyPage:
-        posts = paginator.page(paginator.num_pages)
+    profile_ids = search_profile_ids(search_query)
+
+    profiles = sort_by_ids(
+        Profile.objects.filter(pk__in=profile_ids).select_related('user'),
+        profile_ids
+    )
 
     if request.htmx:
         template_name = 'posts/partials/posts_grid.html'
@@ -96,16 +75,31 @@ def search(request):
 
     filter_url_params = {
         'query': search_query,
-        'page': page,
     }
 
+    # later pages keep the date range the cursor was issued for
+    load_params = urlencode({
+        key: value for key, value in request.GET.items()
+        if key in posts_filter.form.fields and value
+    })
+
     context = {
         'posts': posts,
-        'profiles': es_profiles,
+        'profiles': profiles,
         'search_query': search_query,
         'load_url': reverse('discovery:search'),
         'filter': posts_filter,
         'filter_url': f'{reverse('discovery:search')}?{urlencode(filter_url_params)}',
+        'load_params': load_params,
     }
 
     return render(request, template_name, context)
+
+
+def autocomplete(request):
+    """
+    Search-as-you-type suggestions of profiles and tags for
+    the prefix typed so far.
+    """
+
+    return JsonResponse(get_suggestions(request.GET.get('query', '')))
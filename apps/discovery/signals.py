@@ -0,0 +1,119 @@
+import logging
+
+from django.dispatch import receiver
+from django.db.models.signals import m2m_changed, post_save, pre_delete, post_delete
+from django.db import transaction
+
+from apps.posts.models import Post
+
+from .tasks import add_posts_to_tags_task, remove_posts_from_tags_task
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_indexes(sender, instance, action, reverse, pk_set, **kwargs):
+
+    """
+    Signal to keep the post indexes of tags in sync when tags are
+    added to or removed from posts, from either side of the relation.
+    """
+
+    if action == 'pre_clear':
+        related = instance.posts if reverse else instance.tags
+        instance._cleared_tag_index_pks = list(related.values_list('pk', flat=True))
+        return
+
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_tag_index_pks', None)
+        action = 'post_remove'
+
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    pks = list(pk_set)
+
+    if reverse:
+        post_ids, tag_ids = pks, [instance.pk]
+    else:
+        post_ids, tag_ids = [instance.pk], pks
+
+    try:
+        if action == 'post_add':
+            transaction.on_commit(
+                lambda: add_posts_to_tags_task.delay(post_ids=post_ids)
+            )
+        else:
+            transaction.on_commit(
+                lambda: remove_posts_from_tags_task.delay(
+                    post_ids=post_ids, tag_ids=tag_ids
+                )
+            )
+    except Exception as e:
+        logger.warning(
+            f'Tag index update failed for {instance.__class__.__name__}: {instance.pk}: {e}'
+        )
+
+
+@receiver(post_save, sender=Post)
+def update_post_tag_indexes(sender, instance, created, **kwargs):
+
+    """
+    Signal to add a re-activated Post to the indexes of its tags and
+    to remove a hidden one from them. New posts are indexed when
+    their tags are added.
+    """
+
+    previous_status = getattr(instance, '_previous_status', None)
+
+    if created or previous_status == instance.status:
+        return
+
+    post_id = instance.pk
+
+    try:
+        if instance.status == Post.POST_STATUS.ACTIVE:
+            transaction.on_commit(
+                lambda: add_posts_to_tags_task.delay(post_ids=[post_id])
+            )
+        else:
+            transaction.on_commit(
+                lambda: remove_posts_from_tags_task.delay(post_ids=[post_id])
+            )
+    except Exception as e:
+        logger.warning(
+            f'Tag index update failed for post: {post_id}: {e}'
+        )
+
+
+@receiver(pre_delete, sender=Post)
+def collect_post_tags(sender, instance, *args, **kwargs):
+
+    """
+    Signal to remember the tags of a Post before its tag
+    relations are deleted along with it.
+    """
+
+    instance._tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_tag_indexes(sender, instance, *args, **kwargs):
+
+    """
+    Signal to remove a deleted Post from the indexes of its tags.
+    """
+
+    tag_ids = getattr(instance, '_tag_ids', [])
+    if not tag_ids:
+        return
+
+    try:
+        remove_posts_from_tags_task.delay(
+            post_ids=[instance.pk], tag_ids=tag_ids
+        )
+    except Exception as e:
+        logger.warning(
+            f'Tag index removal failed for post: {instance.pk}: {e}'
+        )
@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.db.models import F
+
+from django_redis import get_redis_connection
+
+from apps.discovery.explore.ranking import LIKE_WEIGHT, COMMENT_WEIGHT
+from apps.posts.models import Post
+
+from utils.pagination import CursorPage, paginate_scored_ids
+
+
+RECENT = 'recent'
+TOP = 'top'
+
+ORDERS = (RECENT, TOP)
+
+TAG_POSTS_KEY = 'tags:{tag_id}:posts:{order}'
+
+# Member kept in every built index, so the index of a tag without
+# posts still exists.
+INDEX_MARKER = b'built'
+
+
+def get_index_key(tag_id, order: str) -> str:
+    return TAG_POSTS_KEY.format(tag_id=tag_id, order=order)
+
+
+def get_index_size() -> int:
+    return getattr(settings, 'TAG_INDEX_SIZE', 500)
+
+
+def get_index_ttl(order: str) -> int:
+    if order == TOP:
+        return getattr(settings, 'TAG_TOP_INDEX_TTL', 60 * 10)
+    return getattr(settings, 'TAG_INDEX_TTL', 60 * 60 * 24)
+
+
+def get_engagement_score(likes_count: int, comments_count: int) -> float:
+    return LIKE_WEIGHT * likes_count + COMMENT_WEIGHT * comments_count
+
+
+def get_scores(created, likes_count: int, comments_count: int) -> dict:
+    return {
+        RECENT: created.timestamp(),
+        TOP: get_engagement_score(likes_count, comments_count),
+    }
+
+
+def add_posts(post_ids):
+
+    """
+    Add active posts to the indexes of their tags. Only indexes that
+    are already built are updated, the rest are built on read.
+    """
+
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+
+    rows = list(
+        Post.tags.through.objects.filter(
+            post_id__in=post_ids,
+            post__status=Post.POST_STATUS.ACTIVE
+        )
+        .values_list(
+            'tag_id', 'post_id', 'post__created',
+            'post__likes_count', 'post__comments_count'
+        )
+    )
+
+    if not rows:
+        return
+
+    conn = get_redis_connection('default')
+    size = get_index_size()
+
+    entries = {}
+    for tag_id, post_id, created, likes_count, comments_count in rows:
+        for order, score in get_scores(created, likes_count, comments_count).items():
+            entries.setdefault(get_index_key(tag_id, order), {})[post_id] = score
+
+    keys = list(entries)
+
+    with conn.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.exists(key)
+        existing = [key for key, exists in zip(keys, pipe.execute()) if exists]
+
+    if not existing:
+        return
+
+    with conn.pipeline(transaction=False) as pipe:
+        for key in existing:
+            pipe.zadd(key, entries[key])
+            pipe.zremrangebyrank(key, 0, -size - 1)
+        pipe.execute()
+
+
+def remove_posts(post_ids, tag_ids=None):
+
+    """
+    Remove posts from the indexes of the given tags, by default
+    the tags they currently have.
+    """
+
+    post_ids = list(post_ids)
+
+    if tag_ids is None:
+        tag_ids = set(
+            Post.tags.through.objects.filter(post_id__in=post_ids)
+            .values_list('tag_id', flat=True)
+        )
+
+    tag_ids = list(tag_ids)
+    if not post_ids or not tag_ids:
+        return
+
+    conn = get_redis_connection('default')
+
+    with conn.pipeline(transaction=False) as pipe:
+        for tag_id in tag_ids:
+            for order in ORDERS:
+                pipe.zrem(get_index_key(tag_id, order), *post_ids)
+        pipe.execute()
+
+
+def rebuild_index(tag_id, order: str):
+
+    """
+    Build the index of a tag from the database, keeping its
+    TAG_INDEX_SIZE newest or most engaging active posts, plus the
+    marker that tells an empty index from a missing one.
+    """
+
+    posts = Post.objects.filter(tags=tag_id, status=Post.POST_STATUS.ACTIVE)
+
+    if order == RECENT:
+        posts = posts.order_by('-created', '-id')
+    else:
+        posts = posts.annotate(
+            engagement=LIKE_WEIGHT * F('likes_count') + COMMENT_WEIGHT * F('comments_count')
+        ).order_by('-engagement', '-id')
+
+    posts = posts.values_list(
+        'id', 'created', 'likes_count', 'comments_count'
+    )[:get_index_size()]
+
+    entries = {
+        post_id: get_scores(created, likes_count, comments_count)[order]
+        for post_id, created, likes_count, comments_count in posts
+    }
+    entries[INDEX_MARKER] = float('-inf')
+
+    conn = get_redis_connection('default')
+    key = get_index_key(tag_id, order)
+
+    with conn.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.zadd(key, entries)
+        pipe.expire(key, get_index_ttl(order))
+        pipe.execute()
+
+
+def get_tag_entries(tag_id, order: str=RECENT) -> list:
+
+    """
+    Return the (post_id, score) entries of a tag's index, best first,
+    building it on the spot if it is missing. The index is bounded, so
+    this costs the same for a tag with ten posts or ten million.
+    """
+
+    conn = get_redis_connection('default')
+    key = get_index_key(tag_id, order)
+
+    if not conn.exists(key):
+        rebuild_index(tag_id, order)
+
+    # Engagement scores drift with likes, so the top index is rebuilt
+    # when it expires instead of being kept alive by reads.
+    with conn.pipeline(transaction=False) as pipe:
+        pipe.zrevrange(key, 0, -1, withscores=True)
+        if order == RECENT:
+            pipe.expire(key, get_index_ttl(order))
+        stored = pipe.execute()[0]
+
+    # Redis breaks score ties by member bytes, the cursors by numeric id.
+    return sorted(
+        (
+            (int(post_id), score) for post_id, score in stored
+            if post_id != INDEX_MARKER
+        ),
+        key=lambda entry: (entry[1], entry[0]),
+        reverse=True
+    )
+
+
+def get_tag_page(tag_id, order: str=RECENT, cursor: str=None, per_page: int=6) -> CursorPage:
+    return paginate_scored_ids(
+        get_tag_entries(tag_id, order), cursor=cursor, per_page=per_page
+    )
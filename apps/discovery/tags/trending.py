@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.posts.models import Post, Tag
+
+
+TRENDING_KEY = 'tags:trending'
+
+
+def get_trending_size() -> int:
+    return getattr(settings, 'TAGS_TRENDING_SIZE', 20)
+
+
+def get_window() -> timedelta:
+    return timedelta(hours=getattr(settings, 'TAGS_TRENDING_WINDOW_HOURS', 24))
+
+
+def get_baseline() -> timedelta:
+    return timedelta(days=getattr(settings, 'TAGS_TRENDING_BASELINE_DAYS', 7))
+
+
+def get_velocity(recent_uses: int, baseline_uses: int, window: timedelta, baseline: timedelta) -> float:
+
+    """
+    How much faster a tag is used in the trending window than over the
+    baseline before it, in uses per hour. Steadily popular tags score
+    around zero, tags taking off score high.
+    """
+
+    recent_rate = recent_uses / (window.total_seconds() / 3600)
+    baseline_rate = baseline_uses / (baseline.total_seconds() / 3600)
+
+    return recent_rate - baseline_rate
+
+
+def refresh_trending() -> list:
+
+    """
+    Count the uses of every tag on active posts of the trending window
+    and of the baseline before it, in one aggregate query, and cache
+    the TAGS_TRENDING_SIZE tags with the highest positive velocity.
+    Returns the cached tags.
+    """
+
+    now = timezone.now()
+    window = get_window()
+    baseline = get_baseline()
+    window_start = now - window
+
+    uses = (
+        Post.tags.through.objects.filter(
+            post__status=Post.POST_STATUS.ACTIVE,
+            post__created__gte=window_start - baseline
+        )
+        .order_by()
+        .values('tag_id')
+        .annotate(
+            recent=Count('pk', filter=Q(post__created__gte=window_start)),
+            total=Count('pk')
+        )
+        .filter(recent__gt=0)
+        .values_list('tag_id', 'recent', 'total')
+    )
+
+    velocities = sorted(
+        (
+            (get_velocity(recent, total - recent, window, baseline), recent, tag_id)
+            for tag_id, recent, total in uses
+        ),
+        reverse=True
+    )
+
+    top = [entry for entry in velocities if entry[0] > 0][:get_trending_size()]
+
+    tags = Tag.objects.in_bulk([tag_id for _, _, tag_id in top])
+
+    trending = [
+        {
+            'id': tag_id,
+            'name': tags[tag_id].name,
+            'slug': tags[tag_id].slug,
+            'uses': recent,
+            'velocity': round(velocity, 4),
+        }
+        for velocity, recent, tag_id in top
+        if tag_id in tags
+    ]
+
+    cache.set(TRENDING_KEY, trending, timeout=None)
+
+    return trending
+
+
+def get_trending_tags() -> list:
+
+    """
+    Return the cached trending tags, computing them on the spot if the
+    periodic job has not run yet.
+    """
+
+    trending = cache.get(TRENDING_KEY)
+
+    if trending is None:
+        trending = refresh_trending()
+
+    return trending
@@ -0,0 +1,61 @@
+from urllib.parse import urlencode
+
+from django.shortcuts import render, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.urls import reverse
+
+from apps.posts.models import Post, Tag
+from apps.posts import engagement
+
+from utils.pagination import sort_by_ids
+
+from .index import ORDERS, RECENT, get_tag_page
+from .trending import get_trending_tags
+
+
+@login_required
+def tag(request, slug):
+    """
+    Posts of a tag, newest or most engaging first, paged from the
+    precomputed post index of the tag.
+    """
+
+    tag = get_object_or_404(Tag, slug=slug)
+
+    order = request.GET.get('order', RECENT)
+    if order not in ORDERS:
+        order = RECENT
+
+    posts = get_tag_page(
+        tag.pk,
+        order=order,
+        cursor=request.GET.get('cursor'),
+        per_page=6
+    )
+
+    posts.object_list = engagement.apply_state(
+        sort_by_ids(
+            Post.objects.filter(pk__in=posts.object_list)
+            .select_related('author', 'author__profile')
+            .prefetch_related('media'),
+            posts.object_list
+        ),
+        request.user.pk
+    )
+
+    if request.htmx:
+        template_name = 'posts/partials/posts_grid.html'
+    else:
+        template_name = 'discovery/tags/tag.html'
+
+    context = {
+        'tag': tag,
+        'posts': posts,
+        'order': order,
+        'orders': ORDERS,
+        'trending_tags': get_trending_tags(),
+        'load_url': reverse('discovery:tag', args=[tag.slug]),
+        'load_params': urlencode({'order': order}),
+    }
+
+    return render(request, template_name, context)
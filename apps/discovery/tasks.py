@@ -0,0 +1,98 @@
+import logging
+
+from celery import shared_task
+
+from apps.discovery.explore.ranking import refresh_candidates
+from apps.discovery.tags import index as tag_index
+from apps.discovery.tags.trending import refresh_trending
+from apps.discovery import indexing
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3)
+def refresh_explore_candidates_task(self):
+
+    """
+    Celery task that recomputes the global, time-decayed
+    explore ranking and stores the top candidates.
+    """
+
+    try:
+        size = refresh_candidates()
+        logger.info(f'Refreshed explore candidate pool with {size} posts.')
+    except Exception as exc:
+        logger.warning(
+            f'Explore candidate refresh failed: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task
+def flush_search_index_task():
+
+    """
+    Celery task that applies the document changes queued
+    by the buffered signal processor to Elasticsearch.
+    """
+
+    for index, flushed in indexing.flush_all().items():
+        if flushed:
+            logger.info(f'Flushed {flushed} queued {index} document changes.')
+
+
+@shared_task(bind=True, max_retries=3)
+def add_posts_to_tags_task(self, post_ids):
+
+    """
+    Celery task that adds the given posts to the
+    post indexes of their tags.
+    """
+
+    try:
+        tag_index.add_posts(post_ids)
+    except Exception as exc:
+        logger.warning(
+            f'Tag index update failed for posts: {post_ids}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def remove_posts_from_tags_task(self, post_ids, tag_ids=None):
+
+    """
+    Celery task that removes the given posts from the
+    post indexes of the given tags, or of their own tags.
+    """
+
+    try:
+        tag_index.remove_posts(post_ids, tag_ids)
+    except Exception as exc:
+        logger.warning(
+            f'Tag index removal failed for posts: {post_ids}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def refresh_trending_tags_task(self):
+
+    """
+    Celery task that recomputes the trending tags and
+    rescores the top post indexes of those tags.
+    """
+
+    try:
+        trending = refresh_trending()
+
+        for tag in trending:
+            tag_index.rebuild_index(tag['id'], tag_index.TOP)
+
+        logger.info(f'Refreshed {len(trending)} trending tags.')
+    except Exception as exc:
+        logger.warning(
+            f'Trending tags refresh failed: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
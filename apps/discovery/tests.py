@@ -1,3 +1,949 @@
-from django.test import TestCase
+from io import StringIO
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from elasticsearch import ConnectionError as ESConnectionError
+from elasticsearch.dsl import MultiSearch, Search
+
+from django_redis import get_redis_connection
+from django_elasticsearch_dsl import Document
+
+from apps.posts import counters
+from apps.posts.models import Post, Like, Tag
+from apps.profiles.models import Follow
+
+from utils.pagination import decode_cursor, encode_cursor
+from utils.testing import RedisTestCase
+
+from . import indexing
+from .tags import index as tag_index
+from .tags import trending
+from .tasks import flush_search_index_task, refresh_trending_tags_task
+from .explore import ranking
+from .search import queries, results
+from .documents.posts import PostDocument
+from .documents.profiles import ProfileDocument
+from .documents.tags import TagDocument
+from .search.backends import (
+    ElasticsearchBackend,
+    PostgresBackend,
+    get_backend,
+    get_search_backend,
+    get_suggestions,
+    run_search
+)
+
+
+User = get_user_model()
+
+
+class DiscoveryTestCase(RedisTestCase):
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='password'
+        )
+
+    def create_post(self, author, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=author, **kwargs)
+
+    def get_pending(self, index, action=indexing.INDEX):
+        return sorted(
+            int(pk) for pk in
+            get_redis_connection('default').smembers(indexing.get_pending_key(index, action))
+        )
+
+
+def make_hits(entries):
+    return [
+        SimpleNamespace(meta=SimpleNamespace(id=str(pk), sort=[score, pk]))
+        for pk, score in entries
+    ]
+
+
+# ---------- EXPLORE ----------
+
+
+class ExploreTests(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('reader')
+        self.author = self.create_user('author')
+
+    def test_refresh_keeps_the_best_recent_active_posts(self):
+        quiet = self.create_post(self.author)
+        popular = self.create_post(self.author, likes_count=10, comments_count=2)
+        self.create_post(self.author, status=Post.POST_STATUS.HIDDEN)
+        old = self.create_post(self.author, likes_count=100)
+        Post.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(days=31))
+
+        self.assertEqual(ranking.refresh_candidates(), 2)
+        self.assertEqual(
+            [post_id for post_id, _ in ranking.get_candidates()], [popular.pk, quiet.pk]
+        )
+
+        with override_settings(EXPLORE_CANDIDATES=1):
+            ranking.refresh_candidates()
+        self.assertEqual([post_id for post_id, _ in ranking.get_candidates()], [popular.pk])
+
+    @mock.patch('apps.discovery.tasks.refresh_explore_candidates_task.delay')
+    def test_missing_pool_queues_one_refresh(self, delay):
+        self.create_post(self.author)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(ranking.get_candidates(), [])
+            self.assertEqual(ranking.get_candidates(), [])
+
+        delay.assert_called_once_with()
+
+    @mock.patch('apps.discovery.tasks.refresh_explore_candidates_task.delay')
+    def test_empty_pool_stays_built(self, delay):
+        ranking.refresh_candidates()
+
+        self.assertEqual(ranking.get_candidates(), [])
+        delay.assert_not_called()
+
+    def test_entries_skip_followed_authors_and_boost_the_network(self):
+        friend = self.create_user('friend')
+        followed = self.create_user('followed')
+        Follow.objects.create(user=friend, follower=self.user)
+        Follow.objects.create(user=followed, follower=self.user)
+
+        plain = self.create_post(self.author, likes_count=1)
+        liked = self.create_post(self.create_user('stranger'))
+        foaf_author = self.create_user('foaf')
+        foaf = self.create_post(foaf_author)
+        self.create_post(followed, likes_count=50)
+        self.create_post(self.user, likes_count=50)
+
+        Like.objects.create(user=friend, post=liked)
+        Follow.objects.create(user=foaf_author, follower=friend)
+        Post.objects.update(created=timezone.now())
+
+        ranking.refresh_candidates()
+        entries = dict(ranking.get_explore_entries(self.user))
+        candidates = dict(ranking.get_candidates())
+
+        self.assertEqual(set(entries), {plain.pk, liked.pk, foaf.pk})
+        self.assertEqual(
+            entries[liked.pk],
+            candidates[liked.pk] * (1 + ranking.LIKED_BY_FOLLOWING_BOOST)
+        )
+        self.assertEqual(entries[foaf.pk], candidates[foaf.pk] * (1 + ranking.FOAF_BOOST))
+        self.assertEqual(entries[plain.pk], candidates[plain.pk])
+
+    def test_explore_view_pages_the_pool(self):
+        posts = [self.create_post(self.author) for _ in range(8)]
+        ranking.refresh_candidates()
+        self.client.force_login(self.user)
+
+        first = self.client.get(reverse('discovery:explore'))
+        second = self.client.get(
+            reverse('discovery:explore'), {'cursor': first.context['posts'].next_cursor}
+        )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(
+            sorted(
+                post.pk for response in (first, second)
+                for post in response.context['posts'].object_list
+            ),
+            [post.pk for post in posts]
+        )
+
+
+# ---------- SEARCH ----------
+
+
+class SearchQueryTests(DiscoveryTestCase):
+
+    def test_date_range_is_a_filter_covering_whole_days(self):
+        query = queries.get_posts_search(
+            'sunset', start_date=date(2024, 5, 1), end_date=date(2024, 5, 31)
+        ).to_dict()['query']
+
+        self.assertEqual(
+            query['bool']['filter'],
+            [{'range': {'created': {'gte': '2024-05-01', 'lte': '2024-05-31||/d'}}}]
+        )
+        self.assertIn('function_score', query['bool']['must'][0])
+
+    def test_entries_continue_after_the_cursor(self):
+        with mock.patch.object(
+            Search, 'execute', autospec=True, return_value=make_hits([(9, 2.5), (4, 1.0)])
+        ) as execute:
+            entries = queries.search_post_entries(
+                'sunset', cursor=encode_cursor([3.0, 12]), size=2
+            )
+
+        request = execute.call_args.args[0].to_dict()
+
+        self.assertEqual(entries, [(9, 2.5), (4, 1.0)])
+        self.assertEqual(request['search_after'], [3.0, 12])
+        self.assertEqual(request['size'], 2)
+        self.assertEqual(request['sort'], ['_score', {'id': 'desc'}])
+        self.assertFalse(request['_source'])
+
+    def test_malformed_cursors_start_from_the_top(self):
+        with mock.patch.object(Search, 'execute', autospec=True, return_value=[]) as execute:
+            queries.search_post_entries('sunset', cursor=encode_cursor(['a', 'b']))
+
+        self.assertNotIn('search_after', execute.call_args.args[0].to_dict())
+
+
+@mock.patch.object(ElasticsearchBackend, 'is_available', return_value=True)
+class SearchViewTests(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author')
+        self.posts = [self.create_post(self.author) for _ in range(8)]
+        self.client.force_login(self.create_user('reader'))
+
+    def test_pages_follow_relevance_and_load_only_their_posts(self, is_available):
+        # the oldest posts are the most relevant
+        entries = [(post.pk, 10.0 - index) for index, post in enumerate(self.posts)]
+
+        with (
+            mock.patch.object(
+                ElasticsearchBackend, 'search_post_entries', return_value=entries
+            ) as search_post_entries,
+            mock.patch.object(
+                ElasticsearchBackend, 'search_profile_ids',
+                return_value=[self.author.profile.pk]
+            )
+        ):
+            first = self.client.get(
+                reverse('discovery:search'),
+                {'query': 'Sunset ', 'start_date': '2024-05-01'}
+            )
+            second = self.client.get(
+                reverse('discovery:search'),
+                {'query': 'sunset', 'start_date': '2024-05-01',
+                 'cursor': first.context['posts'].next_cursor}
+            )
+
+        self.assertEqual(
+            [post.pk for post in first.context['posts'].object_list],
+            [pk for pk, _ in entries[:6]]
+        )
+        self.assertEqual(
+            [post.pk for post in second.context['posts'].object_list],
+            [pk for pk, _ in entries[6:]]
+        )
+        self.assertEqual(first.context['load_params'], 'start_date=2024-05-01')
+        self.assertEqual(list(first.context['profiles']), [self.author.profile])
+
+        # the normalized query is searched once, with its dates
+        search_post_entries.assert_called_once()
+        self.assertEqual(search_post_entries.call_args.args, ('sunset',))
+        self.assertEqual(search_post_entries.call_args.kwargs['start_date'], date(2024, 5, 1))
+
+    def test_empty_query_does_not_search(self, is_available):
+        with mock.patch.object(ElasticsearchBackend, 'search_post_entries') as search:
+            response = self.client.get(reverse('discovery:search'))
+
+        self.assertEqual(response.status_code, 200)
+        search.assert_not_called()
+
+    @override_settings(ENGAGEMENT_WRITE_BEHIND=False)
+    def test_counter_changes_queue_the_documents(self, is_available):
+        post = self.posts[0]
+        get_redis_connection('default').flushdb()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.adjust_counter(post.pk, 'likes_count', 1)
+
+        self.assertEqual(self.get_pending('posts', indexing.REFRESH), [post.pk])
+        self.assertEqual(self.get_pending('posts'), [])
+
+
+# ---------- INDEXING ----------
+
+
+@mock.patch.object(Document, 'bulk', autospec=True)
+class IndexingTests(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author')
+        self.posts = [self.create_post(self.author) for _ in range(3)]
+
+        # start from an empty queue
+        get_redis_connection('default').flushdb()
+
+    def get_indexed(self, bulk):
+        return [
+            (action['_index'], int(action['_id']))
+            for call in bulk.call_args_list
+            for action in call.args[1]
+        ]
+
+    def test_saves_are_queued_once_after_commit(self, bulk):
+        post = self.posts[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+            post.save()
+            self.assertEqual(self.get_pending('posts'), [])
+
+        self.assertEqual(self.get_pending('posts'), [post.pk])
+        bulk.assert_not_called()
+
+    def test_author_changes_queue_their_documents(self, bulk):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save(update_fields=['last_login'])
+
+        self.assertEqual(self.get_pending('posts'), [])
+        self.assertEqual(self.get_pending('profiles'), [])
+
+        self.author.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+
+        self.assertEqual(self.get_pending('posts'), [post.pk for post in self.posts])
+        self.assertEqual(self.get_pending('profiles'), [self.author.profile.pk])
+
+    def test_deletes_are_queued_as_deletes(self, bulk):
+        post = self.posts[0]
+        post_id = post.pk
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+
+        self.assertEqual(self.get_pending('posts', indexing.DELETE), [post_id])
+
+    @override_settings(SEARCH_INDEX_BATCH_SIZE=2)
+    def test_flush_bulk_indexes_in_batches(self, bulk):
+        indexing.queue({('posts', indexing.INDEX): [post.pk for post in self.posts]})
+
+        self.assertEqual(indexing.flush('posts'), 3)
+        self.assertEqual(bulk.call_count, 2)
+        self.assertEqual(
+            sorted(self.get_indexed(bulk)), [('posts', post.pk) for post in self.posts]
+        )
+        self.assertEqual(self.get_pending('posts'), [])
+        self.assertEqual(indexing.get_generation('posts'), 1)
+
+        self.assertEqual(indexing.flush('posts'), 0)
+        self.assertEqual(indexing.get_generation('posts'), 1)
+
+    def test_counter_refreshes_keep_cached_results(self, bulk):
+        indexing.queue({
+            ('posts', indexing.REFRESH): [post.pk for post in self.posts],
+            ('posts', indexing.INDEX): [self.posts[0].pk],
+        })
+
+        self.assertEqual(indexing.flush('posts'), 4)
+        self.assertEqual(
+            sorted(self.get_indexed(bulk)), [('posts', post.pk) for post in self.posts]
+        )
+        self.assertEqual(indexing.get_generation('posts'), 1)
+
+        indexing.queue({('posts', indexing.REFRESH): [self.posts[0].pk]})
+
+        self.assertEqual(indexing.flush('posts'), 1)
+        self.assertEqual(indexing.get_generation('posts'), 1)
+
+    def test_flush_prepares_documents_in_constant_queries(self, bulk):
+        tags = [Tag.objects.create(name=f'tag{index}') for index in range(3)]
+        for post in self.posts:
+            post.tags.set(tags)
+
+        def count_queries(posts):
+            indexing.queue({('posts', indexing.INDEX): [post.pk for post in posts]})
+            with CaptureQueriesContext(connection) as context:
+                indexing.flush('posts')
+            return len(context)
+
+        self.assertEqual(count_queries(self.posts[:1]), count_queries(self.posts))
+
+        action = bulk.call_args.args[1][0]
+        self.assertEqual(sorted(action['_source']['tag_names']), ['tag0', 'tag1', 'tag2'])
+
+    def test_flush_writes_to_the_index_being_rebuilt(self, bulk):
+        post = self.posts[0]
+        get_redis_connection('default').set(indexing.get_reindex_key('posts'), 'posts-new')
+        indexing.queue({('posts', indexing.INDEX): [post.pk]})
+
+        indexing.flush('posts')
+
+        self.assertEqual(self.get_indexed(bulk), [('posts', post.pk), ('posts-new', post.pk)])
+
+    def test_failed_batch_is_flushed_before_new_changes(self, bulk):
+        indexing.queue({('posts', indexing.INDEX): [post.pk for post in self.posts[:2]]})
+        bulk.side_effect = ConnectionError
+
+        with self.assertRaises(ConnectionError):
+            indexing.flush('posts')
+
+        bulk.side_effect = None
+        bulk.reset_mock()
+        indexing.queue({('posts', indexing.INDEX): [self.posts[2].pk]})
+
+        self.assertEqual(indexing.flush('posts'), 2)
+        self.assertEqual(self.get_pending('posts'), [self.posts[2].pk])
+        self.assertEqual(indexing.flush('posts'), 1)
+
+    def test_task_flushes_every_index(self, bulk):
+        indexing.queue({
+            ('posts', indexing.INDEX): [self.posts[0].pk],
+            ('profiles', indexing.INDEX): [self.author.profile.pk],
+        })
+
+        flush_search_index_task.delay()
+
+        self.assertEqual(
+            sorted(self.get_indexed(bulk)),
+            [('posts', self.posts[0].pk), ('profiles', self.author.profile.pk)]
+        )
+
+
+@mock.patch.object(Document, 'bulk', autospec=True)
+class ReindexCommandTests(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.es = mock.MagicMock()
+        self.es.indices.exists_alias.return_value = True
+        self.es.indices.get_alias.return_value = {'posts-old': {}}
+
+        patcher = mock.patch.object(Document, '_get_connection', return_value=self.es)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rebuilt_index_replaces_the_old_one_behind_the_alias(self, bulk):
+        author = self.create_user('author')
+        posts = [self.create_post(author) for _ in range(3)]
+
+        call_command('reindex_search', '--index', 'posts', stdout=StringIO())
+
+        new_index = self.es.indices.create.call_args.kwargs['index']
+        self.assertTrue(new_index.startswith('posts-'))
+        self.assertEqual(
+            sorted(int(action['_id']) for call in bulk.call_args_list for action in call.args[1]),
+            [post.pk for post in posts]
+        )
+        self.assertEqual(
+            {action['_index'] for call in bulk.call_args_list for action in call.args[1]},
+            {new_index}
+        )
+
+        self.es.indices.update_aliases.assert_called_once_with(actions=[
+            {'add': {'index': new_index, 'alias': 'posts'}},
+            {'remove': {'index': 'posts-old', 'alias': 'posts'}},
+        ])
+        self.es.indices.delete.assert_called_once_with(
+            index='posts-old', ignore_unavailable=True
+        )
+        self.assertIsNone(
+            get_redis_connection('default').get(indexing.get_reindex_key('posts'))
+        )
+        self.assertEqual(indexing.get_generation('posts'), 1)
+
+    def test_failed_rebuild_drops_the_new_index(self, bulk):
+        self.es.indices.update_aliases.side_effect = ConnectionError
+
+        with self.assertRaises(ConnectionError):
+            call_command('reindex_search', '--index', 'tags', stdout=StringIO())
+
+        new_index = self.es.indices.create.call_args.kwargs['index']
+        self.es.indices.delete.assert_called_once_with(index=new_index, ignore_unavailable=True)
+        self.assertEqual(indexing.get_generation('tags'), 0)
+
+    def test_unknown_indices_are_rejected(self, bulk):
+        with self.assertRaisesMessage(CommandError, 'Unknown indices: pages'):
+            call_command('reindex_search', '--index', 'pages', stdout=StringIO())
+
+
+# ---------- AUTOCOMPLETE ----------
+
+
+class AutocompleteTests(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('sunny')
+        self.tag = Tag.objects.create(name='sunset')
+
+    def test_suggestions_are_read_from_the_documents(self):
+        profile = ProfileDocument().prepare(self.user.profile)
+        tag = TagDocument().prepare(self.tag)
+
+        responses = [
+            [SimpleNamespace(
+                meta=SimpleNamespace(id=str(self.user.profile.pk)),
+                username=profile['username'], avatar=profile['avatar']
+            )],
+            [SimpleNamespace(
+                meta=SimpleNamespace(id=str(self.tag.pk)), name=tag['name'], slug=tag['slug']
+            )],
+        ]
+
+        with mock.patch.object(
+            MultiSearch, 'execute', autospec=True, return_value=responses
+        ) as execute:
+            with self.assertNumQueries(0):
+                suggestions = queries.search_suggestions('sun', 5)
+
+        # the multi-search body alternates headers and searches
+        profile_search, tag_search = execute.call_args.args[0].to_dict()[1::2]
+
+        self.assertEqual(
+            profile_search['query']['multi_match']['fields'],
+            ['username_suggest', 'username_suggest._2gram', 'username_suggest._3gram']
+        )
+        self.assertEqual(profile_search['_source'], ['username', 'avatar'])
+        self.assertEqual(tag_search['query']['multi_match']['type'], 'bool_prefix')
+        self.assertEqual(suggestions, {
+            'profiles': [{
+                'id': self.user.profile.pk,
+                'username': 'sunny',
+                'avatar': self.user.profile.thumb_or_default,
+            }],
+            'tags': [{'id': self.tag.pk, 'name': 'sunset', 'slug': 'sunset'}],
+        })
+
+    @mock.patch.object(ElasticsearchBackend, 'is_available', return_value=True)
+    def test_suggestions_are_cached_per_normalized_prefix(self, is_available):
+        suggestions = {'profiles': [], 'tags': [{'id': 1, 'name': 'sunset', 'slug': 'sunset'}]}
+
+        with mock.patch.object(
+            ElasticsearchBackend, 'search_suggestions', return_value=suggestions
+        ) as search_suggestions:
+            self.assertEqual(get_suggestions(' Sun '), suggestions)
+            self.assertEqual(get_suggestions('sun'), suggestions)
+            self.assertEqual(get_suggestions('  '), {'profiles': [], 'tags': []})
+
+        search_suggestions.assert_called_once_with('sun', 5)
+
+    @mock.patch.object(ElasticsearchBackend, 'is_available', return_value=True)
+    def test_view_answers_without_the_database(self, is_available):
+        suggestions = {'profiles': [], 'tags': []}
+
+        with mock.patch.object(
+            ElasticsearchBackend, 'search_suggestions', return_value=suggestions
+        ):
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('discovery:autocomplete'), {'query': 'su'})
+
+        self.assertEqual(response.json(), suggestions)
+
+
+# ---------- SEARCH BACKENDS ----------
+
+
+class SearchBackendTests(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.es = mock.MagicMock()
+
+        patcher = mock.patch.object(PostDocument, '_get_connection', return_value=self.es)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_health_check_is_cached(self):
+        self.es.options.return_value.ping.return_value = True
+        backend = ElasticsearchBackend()
+
+        self.assertTrue(backend.is_available())
+        self.assertTrue(backend.is_available())
+        self.es.options.return_value.ping.assert_called_once_with()
+
+        backend.mark_unavailable()
+        self.assertFalse(backend.is_available())
+
+    def test_failed_health_check_switches_to_the_fallback(self):
+        self.es.options.return_value.ping.side_effect = ESConnectionError('down')
+
+        with self.assertLogs('apps.discovery.search.backends', 'WARNING'):
+            self.assertIsInstance(get_search_backend(), PostgresBackend)
+
+        with override_settings(SEARCH_FALLBACK_BACKEND=None):
+            self.assertIsInstance(get_search_backend(), ElasticsearchBackend)
+
+    def test_failed_search_is_retried_on_the_fallback(self):
+        self.es.options.return_value.ping.return_value = True
+
+        with (
+            mock.patch.object(
+                ElasticsearchBackend, 'search_profile_ids', side_effect=ESConnectionError('down')
+            ),
+            mock.patch.object(PostgresBackend, 'search_profile_ids', return_value=[7]),
+            self.assertLogs('apps.discovery.search.backends', 'WARNING')
+        ):
+            self.assertEqual(run_search('search_profile_ids', 'sunny'), [7])
+            # the next search goes to the fallback right away
+            self.assertIsInstance(get_search_backend(), PostgresBackend)
+
+    def test_failed_search_without_fallback_raises(self):
+        self.es.options.return_value.ping.return_value = True
+
+        with (
+            override_settings(SEARCH_FALLBACK_BACKEND=None),
+            mock.patch.object(
+                ElasticsearchBackend, 'search_profile_ids', side_effect=ESConnectionError('down')
+            ),
+            self.assertRaises(ESConnectionError)
+        ):
+            run_search('search_profile_ids', 'sunny')
+
+    def test_backend_is_selected_by_setting(self):
+        with override_settings(SEARCH_BACKEND='postgres'):
+            self.assertIsInstance(get_search_backend(), PostgresBackend)
+
+        self.es.options.assert_not_called()
+
+        with self.assertRaises(ValueError):
+            get_backend('solr')
+
+    def test_postgres_suggestions_match_prefixes(self):
+        user = self.create_user('sunny')
+        self.create_user('rainy')
+        tag = Tag.objects.create(name='Sunset')
+
+        self.assertEqual(PostgresBackend().search_suggestions('sun', 5), {
+            'profiles': [{
+                'id': user.profile.pk,
+                'username': 'sunny',
+                'avatar': user.profile.thumb_or_default,
+            }],
+            'tags': [{'id': tag.pk, 'name': 'Sunset', 'slug': 'sunset'}],
+        })
+
+
+@skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+class PostgresSearchTests(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = PostgresBackend()
+        self.author = self.create_user('sunny')
+
+    def test_posts_match_captions_tags_and_authors(self):
+        caption = self.create_post(self.author, caption='Golden sunsets over the sea')
+        tagged = self.create_post(self.create_user('rainy'))
+        tagged.tags.add(Tag.objects.create(name='sunset'))
+        self.create_post(self.create_user('cloudy'), caption='Morning rain')
+
+        self.assertEqual(
+            {pk for pk, _ in self.backend.search_post_entries('sunset')},
+            {caption.pk, tagged.pk}
+        )
+        self.assertEqual(
+            {pk for pk, _ in self.backend.search_post_entries('sunny')}, {caption.pk}
+        )
+
+    def test_post_pages_continue_after_the_cursor(self):
+        posts = [self.create_post(self.author, caption='sunset') for _ in range(5)]
+
+        first = self.backend.search_post_ids('sunset', per_page=3)
+        second = self.backend.search_post_ids('sunset', cursor=first.next_cursor, per_page=3)
+
+        self.assertEqual(
+            sorted(first.object_list + second.object_list), [post.pk for post in posts]
+        )
+        self.assertIsNone(second.next_cursor)
+
+    def test_profiles_match_fuzzy_usernames(self):
+        self.create_user('rainy')
+
+        self.assertEqual(self.backend.search_profile_ids('sunnny'), [self.author.profile.pk])
+
+
+# ---------- SEARCH RESULTS CACHE ----------
+
+
+@mock.patch.object(ElasticsearchBackend, 'is_available', return_value=True)
+class SearchResultsCacheTests(DiscoveryTestCase):
+
+    ENTRIES = [(10, 4.0), (9, 3.0), (8, 2.0), (7, 1.0)]
+
+    def search_post_entries(
+            self, search_query, start_date=None, end_date=None, cursor=None, size=7
+        ):
+        values = decode_cursor(cursor)
+        entries = [
+            (pk, score) for pk, score in self.ENTRIES
+            if not values or (score, pk) < tuple(values)
+        ]
+        return entries[:size]
+
+    def patch_backend(self):
+        return mock.patch.object(
+            ElasticsearchBackend, 'search_post_entries', autospec=True,
+            side_effect=lambda backend, *args, **kwargs: self.search_post_entries(*args, **kwargs)
+        )
+
+    def test_results_are_cached_per_normalized_query_and_filters(self, is_available):
+        with self.patch_backend() as search_post_entries:
+            first = results.search_post_ids('Sunset  Beach', per_page=2)
+            second = results.search_post_ids('sunset beach', cursor=first.next_cursor, per_page=2)
+            self.assertEqual(search_post_entries.call_count, 1)
+
+            results.search_post_ids('sunset beach', start_date=date(2024, 5, 1), per_page=2)
+            self.assertEqual(search_post_entries.call_count, 2)
+
+        self.assertEqual(first.object_list + second.object_list, [10, 9, 8, 7])
+        self.assertIsNone(second.next_cursor)
+
+    def test_flushing_the_index_invalidates_its_results(self, is_available):
+        with self.patch_backend() as search_post_entries:
+            results.search_post_ids('sunset')
+
+            indexing.bump_generation('posts')
+            results.search_post_ids('sunset')
+
+        self.assertEqual(search_post_entries.call_count, 2)
+
+    @override_settings(ENGAGEMENT_WRITE_BEHIND=False)
+    @mock.patch.object(Document, 'bulk', autospec=True)
+    def test_counter_changes_keep_the_results(self, bulk, is_available):
+        post = self.create_post(self.create_user('author'))
+        indexing.flush('posts')
+        bulk.reset_mock()
+
+        with self.patch_backend() as search_post_entries:
+            results.search_post_ids('sunset')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                counters.adjust_counter(post.pk, 'likes_count', 1)
+            indexing.flush('posts')
+
+            results.search_post_ids('sunset')
+
+        bulk.assert_called_once()
+        self.assertEqual(search_post_entries.call_count, 1)
+
+    @override_settings(SEARCH_RESULTS_CACHE_SIZE=3)
+    def test_pages_past_the_cached_entries_continue_on_the_backend(self, is_available):
+        with self.patch_backend() as search_post_entries:
+            first = results.search_post_ids('sunset', per_page=2)
+            second = results.search_post_ids('sunset', cursor=first.next_cursor, per_page=2)
+
+        self.assertEqual(first.object_list + second.object_list, [10, 9, 8, 7])
+        self.assertEqual(search_post_entries.call_count, 2)
+        self.assertEqual(search_post_entries.call_args.kwargs['cursor'], first.next_cursor)
+
+    def test_profile_ids_are_cached(self, is_available):
+        with mock.patch.object(
+            ElasticsearchBackend, 'search_profile_ids', return_value=[3, 1]
+        ) as search_profile_ids:
+            self.assertEqual(results.search_profile_ids('Sunny'), [3, 1])
+            self.assertEqual(results.search_profile_ids('sunny '), [3, 1])
+
+            indexing.bump_generation('profiles')
+            results.search_profile_ids('sunny')
+
+        self.assertEqual(search_profile_ids.call_count, 2)
+
+
+# ---------- TAGS ----------
+
+
+class TagTestCase(DiscoveryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author')
+        self.tag = Tag.objects.create(name='sunset')
+
+    def create_tagged_post(self, *tags, **kwargs):
+        post = self.create_post(self.author, **kwargs)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.add(*(tags or [self.tag]))
+
+        return post
+
+    def get_index(self, order=tag_index.RECENT, tag=None):
+        return [post_id for post_id, _ in tag_index.get_tag_entries((tag or self.tag).pk, order)]
+
+
+class TagIndexTests(TagTestCase):
+
+    def test_index_is_built_on_read_newest_or_most_engaging_first(self):
+        old = self.create_tagged_post(likes_count=5)
+        new = self.create_tagged_post(comments_count=1)
+        self.create_tagged_post(status=Post.POST_STATUS.HIDDEN)
+        Post.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(self.get_index(), [new.pk, old.pk])
+        self.assertEqual(self.get_index(tag_index.TOP), [old.pk, new.pk])
+
+    def test_tagged_posts_are_added_to_built_indexes_only(self):
+        self.assertEqual(self.get_index(), [])
+
+        other_tag = Tag.objects.create(name='beach')
+        post = self.create_tagged_post(self.tag, other_tag)
+
+        self.assertEqual(self.get_index(), [post.pk])
+        self.assertFalse(
+            get_redis_connection('default').exists(
+                tag_index.get_index_key(other_tag.pk, tag_index.RECENT)
+            )
+        )
+
+    def test_posts_leave_the_index_when_untagged_hidden_or_deleted(self):
+        removed, cleared, hidden, deleted = [self.create_tagged_post() for _ in range(4)]
+        self.get_index()
+        self.get_index(tag_index.TOP)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            removed.tags.remove(self.tag)
+            cleared.tags.clear()
+
+            hidden.status = Post.POST_STATUS.HIDDEN
+            hidden.save()
+
+            deleted.delete()
+
+        self.assertEqual(self.get_index(), [])
+        self.assertEqual(self.get_index(tag_index.TOP), [])
+
+        hidden.status = Post.POST_STATUS.ACTIVE
+        with self.captureOnCommitCallbacks(execute=True):
+            hidden.save()
+
+        self.assertEqual(self.get_index(), [hidden.pk])
+
+    def test_removing_a_tag_from_its_side_updates_the_index(self):
+        post = self.create_tagged_post()
+        self.get_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.posts.remove(post)
+
+        self.assertEqual(self.get_index(), [])
+
+    def test_empty_index_is_not_rebuilt(self):
+        self.assertEqual(self.get_index(), [])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_index(), [])
+
+    def test_ties_are_ordered_by_numeric_id(self):
+        get_redis_connection('default').zadd(
+            tag_index.get_index_key(self.tag.pk, tag_index.TOP),
+            {9: 1.0, 10: 1.0, 2: 3.0, tag_index.INDEX_MARKER: float('-inf')}
+        )
+
+        self.assertEqual(self.get_index(tag_index.TOP), [2, 10, 9])
+
+        page = tag_index.get_tag_page(self.tag.pk, tag_index.TOP, per_page=2)
+        self.assertEqual(
+            tag_index.get_tag_page(
+                self.tag.pk, tag_index.TOP, cursor=page.next_cursor, per_page=2
+            ).object_list,
+            [9]
+        )
+
+    def test_reads_keep_only_the_recent_index_alive(self):
+        conn = get_redis_connection('default')
+        self.get_index()
+        self.get_index(tag_index.TOP)
+
+        for order in tag_index.ORDERS:
+            conn.expire(tag_index.get_index_key(self.tag.pk, order), 5)
+
+        self.get_index()
+        self.get_index(tag_index.TOP)
+
+        self.assertGreater(
+            conn.ttl(tag_index.get_index_key(self.tag.pk, tag_index.RECENT)), 5
+        )
+        self.assertLessEqual(
+            conn.ttl(tag_index.get_index_key(self.tag.pk, tag_index.TOP)), 5
+        )
+
+    @override_settings(TAG_INDEX_SIZE=2)
+    def test_index_is_bounded(self):
+        posts = [self.create_tagged_post() for _ in range(3)]
+        Post.objects.update(created=timezone.now())
+
+        self.assertEqual(self.get_index(), [posts[2].pk, posts[1].pk])
+
+        post = self.create_tagged_post()
+        self.assertEqual(self.get_index(), [post.pk, posts[2].pk])
+
+
+class TrendingTagTests(TagTestCase):
+
+    def test_tags_trend_by_usage_velocity(self):
+        steady = Tag.objects.create(name='steady')
+        rising = Tag.objects.create(name='rising')
+
+        for _ in range(2):
+            self.create_tagged_post(rising)
+        self.create_tagged_post(steady)
+        old = self.create_tagged_post(steady)
+        Post.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(days=2))
+
+        # used less in the window than over the baseline
+        for _ in range(10):
+            self.create_tagged_post()
+        Post.objects.filter(tags=self.tag).update(created=timezone.now() - timedelta(days=3))
+        self.create_tagged_post()
+
+        tags = trending.refresh_trending()
+
+        self.assertEqual([tag['slug'] for tag in tags], ['rising', 'steady'])
+        self.assertEqual(tags[0]['uses'], 2)
+        self.assertEqual(tags[0]['velocity'], round(2 / 24, 4))
+
+    def test_trending_tags_are_served_from_the_cache(self):
+        self.create_tagged_post()
+
+        self.assertEqual([tag['slug'] for tag in trending.get_trending_tags()], ['sunset'])
+
+        self.create_tagged_post(Tag.objects.create(name='beach'))
+        with self.assertNumQueries(0):
+            self.assertEqual(len(trending.get_trending_tags()), 1)
+
+    def test_task_rebuilds_the_top_index_of_trending_tags(self):
+        post = self.create_tagged_post()
+
+        refresh_trending_tags_task.delay()
+
+        self.assertTrue(
+            get_redis_connection('default').exists(
+                tag_index.get_index_key(self.tag.pk, tag_index.TOP)
+            )
+        )
+        self.assertEqual(self.get_index(tag_index.TOP), [post.pk])
+
+
+class TagViewTests(TagTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.author)
+
+    def test_tag_page_follows_the_index(self):
+        posts = [self.create_tagged_post() for _ in range(8)]
+        url = reverse('discovery:tag', args=[self.tag.slug])
+
+        first = self.client.get(url, {'order': 'unknown'})
+        second = self.client.get(url, {'cursor': first.context['posts'].next_cursor})
+
+        self.assertEqual(first.context['order'], tag_index.RECENT)
+        self.assertEqual(
+            [
+                post.pk for response in (first, second)
+                for post in response.context['posts'].object_list
+            ],
+            [post.pk for post in reversed(posts)]
+        )
+        self.assertEqual(self.client.get(reverse('discovery:tag', args=['none'])).status_code, 404)
@@ -7,4 +7,5 @@ app_name = 'discovery'
 urlpatterns = [
     path('explore/', include('apps.discovery.explore.urls')),
     path('search/', include('apps.discovery.search.urls')),
+    path('tags/', include('apps.discovery.tags.urls')),
 ]
@@ -22,9 +22,6 @@ class PostAdmin(admin.ModelAdmin):
 
     def caption_short(self, obj):
         return obj.caption[:20] + '...'
-    
-    def likes_count(self, obj):
-        return obj.likes.count()
 
 
 @admin.register(PostMedia)
@@ -0,0 +1,114 @@
+import logging
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.discovery import indexing
+
+from .models import Post, Like, Save, Comment
+
+
+logger = logging.getLogger(__name__)
+
+
+COUNTER_MODELS = {
+    'likes_count': Like,
+    'comments_count': Comment,
+    'saves_count': Save,
+}
+
+
+def adjust_counter(post_id: int, field: str, delta: int):
+
+    """
+    Atomically add delta to one of the denormalized counters of a post.
+    """
+
+    if field not in COUNTER_MODELS:
+        raise ValueError(f'Unknown post counter: {field}')
+
+    Post.objects.filter(pk=post_id).update(**{field: F(field) + delta})
+
+    # the search documents embed the counters
+    indexing.queue_updated(Post, [post_id])
+
+
+def get_actual_count(model):
+    counts = (
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+
+    return Coalesce(Subquery(counts), 0)
+
+
+def refresh_counters(post_ids, fields=None):
+
+    """
+    Recompute the given counters of the given posts from the related rows.
+    """
+
+    post_ids = list(post_ids)
+    fields = fields or list(COUNTER_MODELS)
+
+    if not post_ids:
+        return
+
+    Post.objects.filter(pk__in=post_ids).update(**{
+        field: get_actual_count(COUNTER_MODELS[field]) for field in fields
+    })
+
+    indexing.queue_updated(Post, post_ids)
+
+
+def reconcile_counters(batch_size: int = 1000) -> int:
+
+    """
+    Compare the denormalized counters of all posts against the related
+    rows, in primary key batches, and repair the ones that drifted.
+    Returns the number of repaired posts.
+    """
+
+    fields = list(COUNTER_MODELS)
+    repaired = 0
+    last_pk = 0
+
+    while True:
+        batch_pks = list(
+            Post.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+
+        if not batch_pks:
+            break
+
+        last_pk = batch_pks[-1]
+
+        drifted = (
+            Post.objects.filter(pk__in=batch_pks)
+            .annotate(**{
+                f'actual_{field}': get_actual_count(model)
+                for field, model in COUNTER_MODELS.items()
+            })
+            .exclude(**{
+                field: F(f'actual_{field}') for field in fields
+            })
+            .only('pk', *fields)
+        )
+
+        posts = []
+        for post in drifted:
+            for field in fields:
+                setattr(post, field, getattr(post, f'actual_{field}'))
+            posts.append(post)
+
+        if posts:
+            Post.objects.bulk_update(posts, fields)
+            indexing.queue_updated(Post, [post.pk for post in posts])
+            repaired += len(posts)
+
+    return repaired
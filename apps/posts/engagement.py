@@ -0,0 +1,260 @@
+import logging
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from django_redis import get_redis_connection
+
+from .models import Post, Like, Save
+from . import counters
+
+
+logger = logging.getLogger(__name__)
+
+
+LIKES = 'like'
+SAVES = 'save'
+
+ENGAGEMENT_MODELS = {
+    LIKES: (Like, 'likes_count'),
+    SAVES: (Save, 'saves_count'),
+}
+
+STATE_KEY = 'engagement:{kind}:{post_id}'
+PENDING_KEY = 'engagement:{kind}:pending'
+
+# Member added to every loaded state set, so an empty set still exists.
+SEED_MEMBER = 'seed'
+
+SEED_BATCH_SIZE = 10000
+SET_STATE_ATTEMPTS = 3
+FLUSH_BATCH_SIZE = 1000
+
+# Toggles a user in a loaded state set, queues the change and returns
+# {changed, active, count}, or nil if the set is not loaded, in one
+# atomic step. ARGV: user id, 'toggle'/'1'/'0', pending field, TTL.
+SET_STATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+
+local changed
+local active
+
+if ARGV[2] == 'toggle' then
+    changed = 1
+    active = redis.call('SADD', KEYS[1], ARGV[1])
+    if active == 0 then
+        redis.call('SREM', KEYS[1], ARGV[1])
+    end
+elseif ARGV[2] == '1' then
+    active = 1
+    changed = redis.call('SADD', KEYS[1], ARGV[1])
+else
+    active = 0
+    changed = redis.call('SREM', KEYS[1], ARGV[1])
+end
+
+if changed == 1 then
+    redis.call('HSET', KEYS[2], ARGV[3], active)
+end
+
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+
+return {changed, active, redis.call('SCARD', KEYS[1]) - 1}
+"""
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'ENGAGEMENT_WRITE_BEHIND', False)
+
+
+def get_state_ttl() -> int:
+    return getattr(settings, 'ENGAGEMENT_STATE_TTL', 60 * 60 * 24)
+
+
+def get_state_key(kind: str, post_id: int) -> str:
+    return STATE_KEY.format(kind=kind, post_id=post_id)
+
+
+def get_pending_key(kind: str) -> str:
+    return PENDING_KEY.format(kind=kind)
+
+
+def ensure_loaded(conn, kind: str, post_id: int) -> bool:
+
+    """
+    Make sure the set of users engaged with a post is loaded into Redis,
+    seeding it from the database on first use. Returns False if the
+    post does not exist.
+    """
+
+    key = get_state_key(kind, post_id)
+
+    if conn.expire(key, get_state_ttl()):
+        return True
+
+    if not Post.objects.filter(pk=post_id).exists():
+        return False
+
+    model, _ = ENGAGEMENT_MODELS[kind]
+    user_ids = model.objects.filter(post_id=post_id).values_list('user_id', flat=True)
+
+    with conn.pipeline(transaction=True) as pipe:
+        pipe.sadd(key, SEED_MEMBER)
+
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=SEED_BATCH_SIZE):
+            batch.append(user_id)
+
+            if len(batch) >= SEED_BATCH_SIZE:
+                pipe.sadd(key, *batch)
+                batch = []
+
+        if batch:
+            pipe.sadd(key, *batch)
+
+        pipe.expire(key, get_state_ttl())
+        pipe.execute()
+
+    return True
+
+
+def set_state(kind: str, post_id: int, user_id: int, active: bool = None):
+
+    """
+    Like/unlike or save/unsave a post in Redis and queue the change for
+    the write-behind flush. With active=None the state is toggled.
+    Returns (changed, active, count), or None if the post does not exist.
+    The toggle runs as one script that refuses to touch an unloaded
+    set, so an expiry can never leave a set without the other users.
+    """
+
+    conn = get_redis_connection('default')
+    script = conn.register_script(SET_STATE_SCRIPT)
+
+    keys = [get_state_key(kind, post_id), get_pending_key(kind)]
+    args = [
+        user_id,
+        'toggle' if active is None else int(active),
+        f'{post_id}:{user_id}',
+        get_state_ttl(),
+    ]
+
+    for _ in range(SET_STATE_ATTEMPTS):
+        result = script(keys=keys, args=args)
+
+        if result is not None:
+            changed, active, count = result
+            return bool(changed), bool(active), count
+
+        if not ensure_loaded(conn, kind, post_id):
+            return None
+
+    raise RuntimeError(f'Could not load {kind} state of post: {post_id}')
+
+
+def apply_state(posts, user_id: int, liked_attr: str = 'liked', saved_attr: str = 'saved'):
+
+    """
+    Overlay the like/save status and counters held in Redis onto posts
+    whose state is loaded, so reads reflect changes not yet flushed.
+    Without a user_id, e.g. for anonymous users, only the counters are.
+    """
+
+    posts = list(posts)
+
+    if not is_enabled() or not posts:
+        return posts
+
+    conn = get_redis_connection('default')
+    kinds = (
+        (LIKES, liked_attr, 'likes_count'),
+        (SAVES, saved_attr, 'saves_count'),
+    )
+
+    with conn.pipeline(transaction=False) as pipe:
+        for post in posts:
+            for kind, _, _ in kinds:
+                key = get_state_key(kind, post.pk)
+                pipe.exists(key)
+                pipe.sismember(key, user_id or 0)
+                pipe.scard(key)
+        results = iter(pipe.execute())
+
+    for post in posts:
+        for _, state_attr, count_attr in kinds:
+            loaded, is_member, size = next(results), next(results), next(results)
+
+            if loaded:
+                if user_id:
+                    setattr(post, state_attr, bool(is_member))
+                setattr(post, count_attr, size - 1)
+
+    return posts
+
+
+def flush(kind: str) -> int:
+
+    """
+    Write the queued like/save changes to the database in bulk and
+    refresh the counters of the affected posts. Returns the number of
+    flushed changes.
+    """
+
+    conn = get_redis_connection('default')
+
+    pending_key = get_pending_key(kind)
+    flushing_key = f'{pending_key}:flushing'
+
+    # A leftover batch from a failed run is flushed before taking new changes.
+    if not conn.exists(flushing_key):
+        if not conn.exists(pending_key):
+            return 0
+
+        conn.rename(pending_key, flushing_key)
+
+    changes = conn.hgetall(flushing_key)
+    if not changes:
+        conn.delete(flushing_key)
+        return 0
+
+    added = defaultdict(list)
+    removed = defaultdict(list)
+
+    for field, value in changes.items():
+        post_id, user_id = map(int, field.decode().split(':'))
+
+        if int(value):
+            added[post_id].append(user_id)
+        else:
+            removed[post_id].append(user_id)
+
+    post_ids = set(added) | set(removed)
+    existing_ids = set(
+        Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True)
+    )
+
+    model, counter_field = ENGAGEMENT_MODELS[kind]
+
+    with transaction.atomic():
+        model.objects.bulk_create(
+            [
+                model(post_id=post_id, user_id=user_id)
+                for post_id, user_ids in added.items() if post_id in existing_ids
+                for user_id in user_ids
+            ],
+            batch_size=FLUSH_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+        for post_id, user_ids in removed.items():
+            model.objects.filter(post_id=post_id, user_id__in=user_ids).delete()
+
+        counters.refresh_counters(existing_ids, [counter_field])
+
+    conn.delete(flushing_key)
+
+    return len(changes)
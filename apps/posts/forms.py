@@ -1,8 +1,9 @@
 from django import forms
 
 from .models import (
-    Post, Comment, Tag, PostMedia
+    Post, Comment, Tag
 )
+from .media import create_post_media
 
 
 class MultipleFileInput(forms.ClearableFileInput):
@@ -60,9 +61,9 @@ class PostForm(forms.ModelForm):
             post.tags.add(tag)
 
         files = self.files.getlist('files')
-        
-        for file in files:
-            PostMedia.objects.create(post=post, file=file)
+
+        if files:
+            create_post_media(post, files)
 
         return post
 
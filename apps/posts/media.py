@@ -0,0 +1,60 @@
+from django.db import transaction
+
+from utils.files import get_media_type
+
+from .models import PostMedia
+from .tasks import process_post_media_task, process_postmedia_video_task
+
+from apps.blobs.models import Blob
+from apps.blobs.store import dedupe_upload, is_blob_file
+
+
+def create_post_media(post, files) -> list:
+
+    """
+    Create the media of a post with a single INSERT, media_type set up
+    front, and queue one processing task for all of its images and one
+    transcoding task per video. Files whose content was uploaded before
+    reuse the stored blob and are not processed again. bulk_create sends
+    no pre_save or post_save signals, so the per-file deduplication and
+    processing in signals.py are not triggered.
+    """
+
+    media = [
+        PostMedia(post=post, file=file, media_type=get_media_type(file.name))
+        for file in files
+    ]
+
+    for obj in media:
+        dedupe_upload(
+            obj, file_field='file', kind=Blob.KINDS.MEDIA,
+            renditions_field='renditions', variants_field='variants'
+        )
+
+    media = PostMedia.objects.bulk_create(media)
+
+    image_ids = [
+        obj.pk for obj in media
+        if obj.media_type == PostMedia.MEDIA_TYPES.IMAGE and not is_blob_file(obj.file.name)
+    ]
+
+    video_ids = [
+        obj.pk for obj in media
+        if obj.media_type == PostMedia.MEDIA_TYPES.VIDEO and not is_blob_file(obj.file.name)
+    ]
+
+    if image_ids:
+        transaction.on_commit(
+            lambda: process_post_media_task.delay(
+                post_id=post.pk, postmedia_ids=image_ids
+            )
+        )
+
+    for video_id in video_ids:
+        transaction.on_commit(
+            lambda video_id=video_id: process_postmedia_video_task.delay(
+                postmedia_id=video_id
+            )
+        )
+
+    return media
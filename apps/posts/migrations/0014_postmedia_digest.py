@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_postmedia_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmedia',
+            name='digest',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
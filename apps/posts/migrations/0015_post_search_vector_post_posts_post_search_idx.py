@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:04
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+from utils.migrations import PostgresOnly
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_postmedia_digest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        PostgresOnly(
+            migrations.AddIndex(
+                model_name='post',
+                index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='posts_post_search_idx'),
+            )
+        ),
+        PostgresOnly(
+            migrations.RunSQL(
+                sql=[
+                    """
+                    CREATE TRIGGER posts_post_search_vector_update
+                    BEFORE INSERT OR UPDATE OF caption ON posts_post
+                    FOR EACH ROW EXECUTE FUNCTION
+                    tsvector_update_trigger(search_vector, 'pg_catalog.english', caption)
+                    """,
+                    "UPDATE posts_post SET search_vector = to_tsvector('pg_catalog.english', coalesce(caption, ''))",
+                ],
+                reverse_sql="DROP TRIGGER IF EXISTS posts_post_search_vector_update ON posts_post",
+            )
+        ),
+    ]
@@ -3,6 +3,8 @@ import shortuuid
 
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import FileExtensionValidator
 from django.utils.text import slugify
 from django.db import IntegrityError, transaction
@@ -12,9 +14,12 @@ from utils.files import (
     ALLOWED_VIDEO_EXTENSIONS,
     ALLOWED_IMAGE_EXTENSIONS,
     base_upload_to,
-    validate_file_size
+    validate_file_size,
+    ImageRenditions
 )
 
+from utils.video import get_variant_urls
+
 from mptt.models import MPTTModel, TreeForeignKey
 
 
@@ -41,15 +46,25 @@ class Post(models.Model):
     tags = models.ManyToManyField('Tag', related_name='posts', blank=True)
     status = models.CharField(max_length=10, choices=POST_STATUS.choices, default=POST_STATUS.ACTIVE)
 
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    saves_count = models.PositiveIntegerField(default=0)
+
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
     public_id = models.CharField(max_length=22, unique=True, default=generate_public_id)
 
+    # maintained from the caption by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        indexes = [
+            GinIndex(fields=('search_vector',), name='posts_post_search_idx'),
+        ]
 
     def __str__(self):
         return f'{self.author.username}: {self.caption[:20]}'
@@ -72,6 +87,11 @@ class PostMedia(models.Model):
     )
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPES.choices, default=MEDIA_TYPES.IMAGE)
 
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    digest = models.CharField(max_length=64, blank=True, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -89,6 +109,14 @@ class PostMedia(models.Model):
                 f'Unsupported file type: {ext}'
             )
 
+    @property
+    def images(self):
+        return ImageRenditions(self.file, self.renditions)
+
+    @property
+    def variant_urls(self):
+        return get_variant_urls(self.file, self.variants)
+
 
 class Tag(models.Model):
 
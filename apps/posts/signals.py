@@ -2,15 +2,25 @@ import os
 import logging
 
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.db import transaction
 
 from .models import PostMedia, Post
 from .tasks import (
     process_postmedia_image_task,
-    delete_post_media_task
+    process_postmedia_video_task,
+    delete_post_media_task,
+    fanout_post_task,
+    remove_post_from_timelines_task,
+    backfill_timeline_task,
+    purge_timeline_task
 )
 
+from apps.profiles.models import Follow
+from apps.blobs.models import Blob
+from apps.blobs.store import dedupe_upload, get_replaced_digest, is_blob_file
+from apps.blobs.tasks import release_blobs_task
+
 from utils.files import (
     get_file_ext,
     ALLOWED_IMAGE_EXTENSIONS,
@@ -21,6 +31,38 @@ from utils.files import (
 logger = logging.getLogger(__name__)
 
 
+@receiver(pre_save, sender=PostMedia)
+def dedupe_post_media_file(sender, instance, **kwargs):
+
+    """
+    Signal to hash a newly uploaded PostMedia file and reuse the
+    stored blob when the same content was uploaded before.
+    """
+
+    try:
+        old_digest = get_replaced_digest(
+            instance, file_field='file', renditions_field='renditions',
+            variants_field='variants'
+        )
+
+        if dedupe_upload(
+            instance, file_field='file', kind=Blob.KINDS.MEDIA,
+            renditions_field='renditions', variants_field='variants'
+        ):
+            instance._skip_signals = True
+
+        if old_digest:
+            transaction.on_commit(
+                lambda: release_blobs_task.delay(
+                    digests=[old_digest], kind=Blob.KINDS.MEDIA
+                )
+            )
+    except Exception as e:
+        logger.warning(
+            f'Media deduplication failed for post media: {instance.pk}: {e}'
+        )
+
+
 @receiver(post_save, sender=PostMedia)
 def compress_post_media_file(sender, instance, **kwargs):
 
@@ -52,12 +94,33 @@ def compress_post_media_file(sender, instance, **kwargs):
                 instance._skip_signals = True
                 instance.save(update_fields=['media_type'])
 
+                transaction.on_commit(
+                    lambda: process_postmedia_video_task.delay(
+                        postmedia_id=instance.pk
+                    )
+                )
+
     except Exception as e:
         logger.warning(
             f'Image compression failed for post media: {instance.pk}: {e}'
         )
 
 
+@receiver(pre_delete, sender=Post)
+def collect_post_media_digests(sender, instance, *args, **kwargs):
+
+    """
+    Signal to remember the blobs referenced by the media of a Post
+    before they are deleted along with it.
+    """
+
+    instance._media_digests = [
+        digest for digest, file_name in
+        instance.media.exclude(digest='').values_list('digest', 'file')
+        if is_blob_file(file_name)
+    ]
+
+
 @receiver(post_delete, sender=Post)
 def delete_post_media(sender, instance, *args, **kwargs):
 
@@ -66,9 +129,134 @@ def delete_post_media(sender, instance, *args, **kwargs):
     instance is deleted, triggering a Celery task.
     """
 
+    public_id = instance.public_id
+    digests = getattr(instance, '_media_digests', [])
+
     try:
-        delete_post_media_task.delay(instance.public_id)
+        transaction.on_commit(
+            lambda: delete_post_media_task.delay(public_id, digests=digests)
+        )
     except Exception as e:
         logger.warning(
             f'Post media deletion failed for: {instance.pk}: {e}'
         )
+
+
+@receiver(pre_save, sender=Post)
+def track_post_status(sender, instance, **kwargs):
+
+    """
+    Signal to remember the stored status of a Post before it is
+    saved, so status changes can be propagated to feed timelines.
+    Saves limited to other fields cannot change it and skip the query.
+    """
+
+    update_fields = kwargs.get('update_fields')
+
+    if update_fields is not None and 'status' not in update_fields:
+        instance._previous_status = instance.status
+    elif instance.pk:
+        instance._previous_status = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('status', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def update_feed_timelines(sender, instance, created, **kwargs):
+
+    """
+    Signal to fan a Post out to feed timelines when it is created or
+    re-activated, and to remove it from them when it is hidden.
+    """
+
+    previous_status = getattr(instance, '_previous_status', None)
+
+    if not created and previous_status == instance.status:
+        return
+
+    post_id, author_id = instance.pk, instance.author_id
+
+    try:
+        if instance.status == Post.POST_STATUS.ACTIVE:
+            transaction.on_commit(
+                lambda: fanout_post_task.delay(post_id=post_id)
+            )
+        elif not created:
+            transaction.on_commit(
+                lambda: remove_post_from_timelines_task.delay(
+                    post_id=post_id, author_id=author_id
+                )
+            )
+    except Exception as e:
+        logger.warning(
+            f'Feed timeline update failed for post: {post_id}: {e}'
+        )
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_timelines(sender, instance, *args, **kwargs):
+
+    """
+    Signal to remove a deleted Post from feed timelines.
+    """
+
+    post_id = instance.pk
+    author_id = instance.author_id
+
+    try:
+        transaction.on_commit(
+            lambda: remove_post_from_timelines_task.delay(
+                post_id=post_id, author_id=author_id
+            )
+        )
+    except Exception as e:
+        logger.warning(
+            f'Feed timeline removal failed for post: {instance.pk}: {e}'
+        )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+
+    """
+    Signal to add the followed author's recent posts to the
+    follower's feed timeline.
+    """
+
+    if not created:
+        return
+
+    user_id = instance.follower_id
+    author_id = instance.user_id
+
+    try:
+        transaction.on_commit(
+            lambda: backfill_timeline_task.delay(user_id=user_id, author_id=author_id)
+        )
+    except Exception as e:
+        logger.warning(
+            f'Feed timeline backfill failed for follow: {instance.pk}: {e}'
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def purge_timeline(sender, instance, *args, **kwargs):
+
+    """
+    Signal to remove the unfollowed author's posts from the
+    follower's feed timeline.
+    """
+
+    user_id = instance.follower_id
+    author_id = instance.user_id
+
+    try:
+        transaction.on_commit(
+            lambda: purge_timeline_task.delay(user_id=user_id, author_id=author_id)
+        )
+    except Exception as e:
+        logger.warning(
+            f'Feed timeline purge failed for follow: {instance.pk}: {e}'
+        )
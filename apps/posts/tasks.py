@@ -3,16 +3,23 @@ import shutil
 import logging
 
 from django.conf import settings
+from django.db import transaction
 
 from celery import shared_task
 
-from .models import PostMedia
+from .models import PostMedia, Post
+from . import timeline, counters, engagement
+
+from apps.blobs.models import Blob
+from apps.blobs.store import BLOB_DIR, is_blob_file, store_blob, release_blobs
 
 from utils.files import (
     ALLOWED_IMAGE_EXTENSIONS,
     compress_image,
-    process_obj_media_file
+    process_obj_media_file,
+    process_obj_media_files
 )
+from utils.video import process_obj_video_file
 
 
 logger = logging.getLogger(__name__)
@@ -28,13 +35,17 @@ def process_postmedia_image_task(self, postmedia_id=None, quality=60):
 
     try:
         instance = PostMedia.objects.get(pk=postmedia_id)
-        if not instance.file:
+        if not instance.file or is_blob_file(instance.file.name):
             return
 
-        process_obj_media_file(
+        if process_obj_media_file(
             obj=instance, file_field='file', quality=quality,
-            crop=False, skip_signals=True
-        )
+            crop=False, skip_signals=True, renditions_field='renditions'
+        ):
+            store_blob(
+                instance, file_field='file', kind=Blob.KINDS.MEDIA,
+                renditions_field='renditions', variants_field='variants'
+            )
     except PostMedia.DoesNotExist:
         logger.error(
             f'Post: {postmedia_id} not found.'
@@ -47,11 +58,84 @@ def process_postmedia_image_task(self, postmedia_id=None, quality=60):
     
 
 @shared_task(bind=True, max_retries=3)
-def delete_post_media_task(self, public_id):
+def process_postmedia_video_task(self, postmedia_id=None, quality=60):
+
+    """
+    Celery task that transcodes the post media video for the given
+    postmedia_id and extracts its poster frame.
+    """
+
+    try:
+        instance = PostMedia.objects.select_related('post').get(pk=postmedia_id)
+        if not instance.file or is_blob_file(instance.file.name):
+            return
+
+        if process_obj_video_file(
+            obj=instance, file_field='file', quality=quality, skip_signals=True
+        ):
+            store_blob(
+                instance, file_field='file', kind=Blob.KINDS.MEDIA,
+                renditions_field='renditions', variants_field='variants'
+            )
+    except PostMedia.DoesNotExist:
+        logger.error(
+            f'Post: {postmedia_id} not found.'
+        )
+    except Exception as exc:
+        logger.warning(
+            f'Video processing failed for post media: {postmedia_id}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def process_post_media_task(self, post_id=None, postmedia_ids=None, quality=60):
+
+    """
+    Celery task that processes and compresses all image media of the
+    given post in a worker-local pool, optionally limited to
+    postmedia_ids, moves them into the blob store and saves the
+    results with a single bulk update.
+    """
+
+    try:
+        media = PostMedia.objects.select_related('post').filter(
+            post_id=post_id, media_type=PostMedia.MEDIA_TYPES.IMAGE
+        ).exclude(
+            file__startswith=f'{BLOB_DIR}/'
+        )
+
+        if postmedia_ids:
+            media = media.filter(pk__in=postmedia_ids)
+
+        processed = process_obj_media_files(
+            media, file_field='file', quality=quality,
+            renditions_field='renditions'
+        )
+
+        if processed:
+            with transaction.atomic():
+                for instance in processed:
+                    store_blob(
+                        instance, file_field='file', kind=Blob.KINDS.MEDIA,
+                        renditions_field='renditions', save=False
+                    )
+
+                PostMedia.objects.bulk_update(processed, ['file', 'renditions'])
+    except Exception as exc:
+        logger.warning(
+            f'Image compression failed for post: {post_id}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def delete_post_media_task(self, public_id, digests=None):
 
     """
     Celery task that deletes all media files associated
-    with the post identified by public_id.
+    with the post identified by public_id, and the blobs
+    in digests that are no longer referenced.
     """
 
     try:
@@ -61,8 +145,116 @@ def delete_post_media_task(self, public_id):
 
         if os.path.exists(path):
             shutil.rmtree(path)
+
+        release_blobs(digests or [], kind=Blob.KINDS.MEDIA)
     except Exception as exc:
         logger.error(
             f'Failed to delete media for post: {public_id}, {exc}'
         )
         raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def fanout_post_task(self, post_id):
+
+    """
+    Celery task that pushes the post identified by post_id
+    into the feed timelines of its author and followers.
+    """
+
+    try:
+        post = Post.objects.get(pk=post_id, status=Post.POST_STATUS.ACTIVE)
+        timeline.fanout_post(post)
+    except Post.DoesNotExist:
+        logger.info(
+            f'Post: {post_id} not found or not active, skipping fan-out.'
+        )
+    except Exception as exc:
+        logger.warning(
+            f'Feed fan-out failed for post: {post_id}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def remove_post_from_timelines_task(self, post_id, author_id):
+
+    """
+    Celery task that removes the post identified by post_id
+    from the feed timelines of its author and followers.
+    """
+
+    try:
+        timeline.remove_post(post_id, author_id)
+    except Exception as exc:
+        logger.warning(
+            f'Feed removal failed for post: {post_id}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def backfill_timeline_task(self, user_id, author_id):
+
+    """
+    Celery task that adds the recent posts of a newly
+    followed author to the user's feed timeline.
+    """
+
+    try:
+        timeline.backfill_author(user_id, author_id)
+    except Exception as exc:
+        logger.warning(
+            f'Feed backfill failed for user: {user_id}, author: {author_id}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def purge_timeline_task(self, user_id, author_id):
+
+    """
+    Celery task that removes the posts of an unfollowed
+    author from the user's feed timeline.
+    """
+
+    try:
+        timeline.purge_author(user_id, author_id)
+    except Exception as exc:
+        logger.warning(
+            f'Feed purge failed for user: {user_id}, author: {author_id}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task
+def reconcile_post_counters_task():
+
+    """
+    Celery task that detects and repairs drift between the
+    denormalized post counters and the related rows.
+    """
+
+    repaired = counters.reconcile_counters()
+
+    if repaired:
+        logger.info(f'Repaired counters of {repaired} posts.')
+    else:
+        logger.info('No post counter drift found.')
+
+
+@shared_task
+def flush_engagement_task():
+
+    """
+    Celery task that writes likes and saves queued in
+    Redis by the write-behind engagement mode to the database.
+    """
+
+    for kind in (engagement.LIKES, engagement.SAVES):
+        try:
+            flushed = engagement.flush(kind)
+            if flushed:
+                logger.info(f'Flushed {flushed} queued {kind} changes.')
+        except Exception as e:
+            logger.warning(f'Flushing queued {kind} changes failed: {e}')
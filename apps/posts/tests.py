@@ -1,3 +1,755 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
+from uuid import uuid4
 
-# Create your tests here.
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from django_redis import get_redis_connection
+
+from apps.blobs.store import is_blob_file
+from apps.profiles.models import Follow
+
+from utils.pagination import (
+    encode_cursor,
+    decode_cursor,
+    paginate_scored_ids,
+    KeysetPaginator
+)
+from utils.files import (
+    decode_image,
+    compress_image,
+    crop_and_compress_image,
+    process_obj_media_file,
+    get_image_formats,
+    get_accepted_image_formats
+)
+from utils.video import get_ffmpeg_path
+from utils.testing import RedisTestCase, MediaTestCase, make_image, make_video
+
+from .models import Post, PostMedia, Like, Save, Comment
+from . import timeline, counters, engagement
+from .media import create_post_media
+from .tasks import flush_engagement_task
+
+
+User = get_user_model()
+
+
+class PostTestCase(RedisTestCase):
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='password'
+        )
+
+    def create_post(self, author, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=author, **kwargs)
+
+
+# ---------- TIMELINE ----------
+
+
+class TimelineTests(PostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('reader')
+        self.author = self.create_user('author')
+        Follow.objects.create(user=self.author, follower=self.user)
+
+    def get_post_ids(self, user):
+        return [post_id for post_id, _ in timeline.get_timeline_entries(user)]
+
+    def test_rebuilds_missing_timeline_from_database(self):
+        posts = [self.create_post(self.author) for _ in range(3)]
+
+        self.assertEqual(self.get_post_ids(self.user), [post.pk for post in reversed(posts)])
+
+    def test_new_post_is_pushed_to_materialized_timelines(self):
+        self.get_post_ids(self.user)
+
+        post = self.create_post(self.author)
+
+        stored = get_redis_connection('default').zrange(
+            timeline.get_timeline_key(self.user.pk), 0, -1
+        )
+        self.assertIn(str(post.pk).encode(), stored)
+        self.assertEqual(self.get_post_ids(self.author), [post.pk])
+
+    def test_page_is_stable_across_inserts(self):
+        posts = [self.create_post(self.author) for _ in range(6)]
+        expected = [post.pk for post in reversed(posts)]
+
+        first = timeline.get_timeline_page(self.user, per_page=3)
+        self.assertEqual(first.object_list, expected[:3])
+        self.assertTrue(first.has_next())
+
+        newer = [self.create_post(self.author) for _ in range(2)]
+
+        second = timeline.get_timeline_page(
+            self.user, cursor=first.next_cursor, per_page=3
+        )
+        self.assertEqual(second.object_list, expected[3:])
+        self.assertFalse(second.has_next())
+
+        self.assertEqual(
+            timeline.get_timeline_page(self.user, per_page=2).object_list,
+            [post.pk for post in reversed(newer)]
+        )
+
+    def test_unfollow_purges_entries(self):
+        self.create_post(self.author)
+        own = self.create_post(self.user)
+        self.get_post_ids(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(user=self.author, follower=self.user).delete()
+
+        self.assertEqual(self.get_post_ids(self.user), [own.pk])
+
+    def test_follow_backfills_recent_posts(self):
+        other = self.create_user('other')
+        post = self.create_post(other)
+        self.get_post_ids(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=other, follower=self.user)
+
+        self.assertEqual(self.get_post_ids(self.user), [post.pk])
+
+    def test_hidden_and_deleted_posts_are_removed(self):
+        hidden = self.create_post(self.author)
+        deleted = self.create_post(self.author)
+        self.assertEqual(self.get_post_ids(self.user), [deleted.pk, hidden.pk])
+
+        hidden.status = Post.POST_STATUS.HIDDEN
+        with self.captureOnCommitCallbacks(execute=True):
+            hidden.save()
+            deleted.delete()
+
+        self.assertEqual(self.get_post_ids(self.user), [])
+
+        hidden.status = Post.POST_STATUS.ACTIVE
+        with self.captureOnCommitCallbacks(execute=True):
+            hidden.save()
+
+        self.assertEqual(self.get_post_ids(self.user), [hidden.pk])
+
+    @mock.patch('apps.posts.signals.purge_timeline_task.delay')
+    @mock.patch('apps.posts.signals.backfill_timeline_task.delay')
+    def test_rolled_back_follows_leave_timelines_alone(self, backfill, purge):
+        other = self.create_user('other')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=other, follower=self.user)
+                    Follow.objects.filter(user=self.author, follower=self.user).delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        backfill.assert_not_called()
+        purge.assert_not_called()
+
+    def test_pages_seek_past_ties_in_the_stored_and_pulled_posts(self):
+        popular = self.create_user('popular')
+        Follow.objects.create(user=popular, follower=self.user)
+
+        posts = [self.create_post(author) for author in (self.author, popular) * 4]
+        Post.objects.update(created=timezone.now())
+
+        conn = get_redis_connection('default')
+        conn.sadd(timeline.FANOUT_ON_READ_AUTHORS_KEY, popular.pk)
+        conn.delete(timeline.get_timeline_key(self.user.pk))
+
+        seen, cursor = [], None
+        while True:
+            page = timeline.get_timeline_page(self.user, cursor=cursor, per_page=3)
+            seen += page.object_list
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, sorted((post.pk for post in posts), reverse=True))
+        self.assertEqual(conn.zcard(timeline.get_timeline_key(self.user.pk)), 5)
+        self.assertEqual(len(timeline.get_timeline_entries(self.user, limit=3)), 3)
+
+    def test_empty_timeline_stays_materialized(self):
+        self.assertEqual(self.get_post_ids(self.user), [])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_post_ids(self.user), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_authors_are_merged_on_read(self):
+        self.get_post_ids(self.user)
+
+        post = self.create_post(self.author)
+
+        stored = get_redis_connection('default').zrange(
+            timeline.get_timeline_key(self.user.pk), 0, -1
+        )
+        self.assertNotIn(str(post.pk).encode(), stored)
+        self.assertIn(self.author.pk, timeline.get_fanout_on_read_authors())
+        self.assertEqual(self.get_post_ids(self.user), [post.pk])
+
+    def test_save_of_other_fields_skips_status_lookup(self):
+        post = self.create_post(self.author)
+        post.caption = 'edited'
+
+        with self.assertNumQueries(1):
+            post.save(update_fields=['caption'])
+
+    def test_feed_view_pages_timeline(self):
+        posts = [self.create_post(self.author) for _ in range(6)]
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('posts:feed'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post.pk for post in response.context['posts'].object_list],
+            [post.pk for post in reversed(posts)][:5]
+        )
+
+
+# ---------- PAGINATION ----------
+
+
+class PaginationTests(PostTestCase):
+
+    def test_cursor_round_trips(self):
+        created = timezone.now()
+        public_id = uuid4()
+
+        cursor = encode_cursor([created, public_id, 12.5, 7])
+
+        self.assertEqual(
+            decode_cursor(cursor), [created.isoformat(), str(public_id), 12.5, 7]
+        )
+        self.assertNotIn('=', cursor)
+
+    def test_malformed_cursors_decode_to_none(self):
+        # the last one encodes {"a": 1}, which is not a list of values
+        for cursor in (None, '', 'not a cursor!', 'eyJhIjoxfQ'):
+            self.assertIsNone(decode_cursor(cursor))
+
+    def test_tampered_cursors_start_from_the_first_page(self):
+        author = self.create_user('author')
+        posts = [self.create_post(author) for _ in range(3)]
+        paginator = KeysetPaginator(Post.objects.all(), per_page=2)
+
+        for values in (['x', 'y'], [None, 1], [[1], {}], [timezone.now().isoformat()]):
+            cursor = encode_cursor(values)
+            self.assertIsNone(paginator.get_cursor_values(cursor))
+            self.assertEqual(
+                [post.pk for post in paginator.page(cursor)],
+                [post.pk for post in reversed(posts[1:])]
+            )
+
+    def test_keyset_paginator_walks_ties_without_gaps(self):
+        author = self.create_user('author')
+        posts = [self.create_post(author) for _ in range(7)]
+        Post.objects.update(created=timezone.now())
+
+        paginator = KeysetPaginator(Post.objects.all(), per_page=3)
+        seen, cursor = [], None
+
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.page(cursor)
+            seen += [post.pk for post in page]
+
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, sorted((post.pk for post in posts), reverse=True))
+
+    def test_keyset_paginator_ignores_foreign_cursors(self):
+        author = self.create_user('author')
+        self.create_post(author)
+
+        page = KeysetPaginator(Post.objects.all(), per_page=3).page(encode_cursor([1, 2, 3]))
+
+        self.assertEqual(len(page), 1)
+        self.assertFalse(page.has_next())
+
+    def test_scored_ids_page_on_score_then_id(self):
+        entries = [(5, 2.0), (4, 2.0), (3, 2.0), (9, 1.0), (2, 1.0)]
+
+        first = paginate_scored_ids(entries, per_page=2)
+        second = paginate_scored_ids(entries, cursor=first.next_cursor, per_page=2)
+        third = paginate_scored_ids(entries, cursor=second.next_cursor, per_page=2)
+
+        self.assertEqual(first.object_list, [5, 4])
+        self.assertEqual(second.object_list, [3, 9])
+        self.assertEqual(third.object_list, [2])
+        self.assertFalse(third.has_next())
+
+
+# ---------- COUNTERS ----------
+
+
+@override_settings(ENGAGEMENT_WRITE_BEHIND=False)
+class CounterTests(PostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('reader')
+        self.post = self.create_post(self.create_user('author'))
+        self.client.force_login(self.user)
+
+    def assertCounters(self, **counts):
+        self.post.refresh_from_db()
+        for field, count in counts.items():
+            self.assertEqual(getattr(self.post, field), count, field)
+
+    def test_toggle_views_adjust_counters(self):
+        like_url = reverse('posts:toggle_like', args=[self.post.pk])
+        save_url = reverse('posts:toggle_save', args=[self.post.pk])
+
+        self.client.post(like_url)
+        self.client.post(save_url)
+        self.assertCounters(likes_count=1, saves_count=1)
+
+        self.client.post(like_url)
+        self.assertCounters(likes_count=0, saves_count=1)
+        self.assertFalse(Like.objects.exists())
+
+    def test_add_comment_adjusts_counter(self):
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]), {'body': 'Nice'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertCounters(comments_count=1)
+
+    def test_adjust_counter_rejects_unknown_fields(self):
+        with self.assertRaises(ValueError):
+            counters.adjust_counter(self.post.pk, 'views_count', 1)
+
+    def test_refresh_counters_recomputes_from_rows(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Comment.objects.create(post=self.post, author=self.user, body='Nice')
+
+        counters.refresh_counters([self.post.pk], ['likes_count'])
+        self.assertCounters(likes_count=1, comments_count=0)
+
+        counters.refresh_counters([self.post.pk])
+        self.assertCounters(likes_count=1, comments_count=1, saves_count=0)
+
+    def test_reconcile_repairs_drifted_posts_only(self):
+        other = self.create_post(self.post.author)
+        fan = self.create_user('fan')
+
+        for user in (self.user, fan):
+            Like.objects.create(user=user, post=self.post)
+            Save.objects.create(user=user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=2, saves_count=2)
+
+        # cascade deletes bypass the counters
+        fan.delete()
+
+        self.assertEqual(counters.reconcile_counters(batch_size=1), 1)
+        self.assertCounters(likes_count=1, saves_count=1, comments_count=0)
+
+        other.refresh_from_db()
+        self.assertEqual(other.likes_count, 0)
+        self.assertEqual(counters.reconcile_counters(), 0)
+
+
+# ---------- ENGAGEMENT ----------
+
+
+@override_settings(ENGAGEMENT_WRITE_BEHIND=True)
+class EngagementTests(PostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('reader')
+        self.fan = self.create_user('fan')
+        self.post = self.create_post(self.create_user('author'))
+
+    def test_state_is_seeded_from_the_database(self):
+        Like.objects.create(user=self.fan, post=self.post)
+
+        self.assertEqual(
+            engagement.set_state(engagement.LIKES, self.post.pk, self.user.pk), (True, True, 2)
+        )
+        self.assertEqual(
+            engagement.set_state(engagement.LIKES, self.post.pk, self.user.pk), (True, False, 1)
+        )
+        self.assertEqual(
+            engagement.set_state(engagement.LIKES, self.post.pk, self.fan.pk, active=True),
+            (False, True, 1)
+        )
+
+    def test_missing_post_has_no_state(self):
+        self.assertIsNone(engagement.set_state(engagement.LIKES, self.post.pk + 1, self.user.pk))
+
+    def test_expired_state_is_reseeded_with_every_user(self):
+        engagement.set_state(engagement.LIKES, self.post.pk, self.fan.pk)
+        engagement.flush(engagement.LIKES)
+
+        get_redis_connection('default').delete(
+            engagement.get_state_key(engagement.LIKES, self.post.pk)
+        )
+
+        self.assertEqual(
+            engagement.set_state(engagement.LIKES, self.post.pk, self.user.pk), (True, True, 2)
+        )
+
+    def test_flush_writes_rows_once(self):
+        for user in (self.user, self.fan):
+            engagement.set_state(engagement.LIKES, self.post.pk, user.pk)
+        engagement.set_state(engagement.SAVES, self.post.pk, self.user.pk)
+
+        flush_engagement_task()
+        self.assertEqual(engagement.flush(engagement.LIKES), 0)
+
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 2)
+        self.assertEqual(Save.objects.filter(post=self.post).count(), 1)
+
+        # re-liking an already flushed like queues a no-op change
+        engagement.set_state(engagement.LIKES, self.post.pk, self.fan.pk, active=False)
+        engagement.set_state(engagement.LIKES, self.post.pk, self.fan.pk, active=True)
+        self.assertEqual(engagement.flush(engagement.LIKES), 1)
+
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.saves_count), (2, 1))
+
+    def test_flush_deletes_unliked_rows(self):
+        Like.objects.create(user=self.fan, post=self.post)
+
+        engagement.set_state(engagement.LIKES, self.post.pk, self.fan.pk)
+        engagement.flush(engagement.LIKES)
+
+        self.assertFalse(Like.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_flush_retries_a_leftover_batch_first(self):
+        conn = get_redis_connection('default')
+        pending_key = engagement.get_pending_key(engagement.LIKES)
+
+        engagement.set_state(engagement.LIKES, self.post.pk, self.fan.pk)
+        conn.rename(pending_key, f'{pending_key}:flushing')
+        engagement.set_state(engagement.LIKES, self.post.pk, self.user.pk)
+
+        self.assertEqual(engagement.flush(engagement.LIKES), 1)
+        self.assertEqual(list(Like.objects.values_list('user', flat=True)), [self.fan.pk])
+
+        self.assertEqual(engagement.flush(engagement.LIKES), 1)
+        self.assertEqual(Like.objects.count(), 2)
+
+    def test_apply_state_overlays_unflushed_changes(self):
+        engagement.set_state(engagement.LIKES, self.post.pk, self.user.pk)
+
+        post = Post.objects.get(pk=self.post.pk)
+        engagement.apply_state([post], self.user.pk)
+        self.assertTrue(post.liked)
+        self.assertEqual(post.likes_count, 1)
+        self.assertFalse(hasattr(post, 'saved'))
+
+        anonymous = Post.objects.get(pk=self.post.pk)
+        engagement.apply_state([anonymous], None)
+        self.assertFalse(hasattr(anonymous, 'liked'))
+        self.assertEqual(anonymous.likes_count, 1)
+
+        with override_settings(ENGAGEMENT_WRITE_BEHIND=False):
+            untouched = engagement.apply_state([Post.objects.get(pk=self.post.pk)], self.user.pk)
+        self.assertEqual(untouched[0].likes_count, 0)
+
+    def test_views_read_unflushed_state(self):
+        Follow.objects.create(user=self.post.author, follower=self.user)
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse('posts:toggle_like', args=[self.post.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Like.objects.exists())
+
+        post = self.client.get(reverse('posts:feed')).context['posts'].object_list[0]
+        self.assertTrue(post.liked)
+        self.assertEqual(post.likes_count, 1)
+
+        response = self.client.post(reverse('posts:toggle_like', args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+# ---------- MEDIA ----------
+
+
+class ImageRenditionTests(MediaTestCase, PostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post(self.create_user('author'))
+
+    def create_media(self, file):
+        return PostMedia.objects.create(post=self.post, file=file)
+
+    def test_renditions_are_generated_from_one_decode(self):
+        media = self.create_media(make_image())
+
+        self.assertTrue(process_obj_media_file(media, renditions_field='renditions'))
+
+        widths = {name: stored['width'] for name, stored in media.renditions.items()}
+        self.assertEqual(widths, {'thumb': 160, 'grid': 480, 'feed': 1080, 'full': 2048})
+        self.assertEqual(media.renditions['grid']['height'], 320)
+
+        # the stored file is capped to the largest size and doubles as it
+        self.assertTrue(media.file.name.endswith('.jpg'))
+        self.assertEqual(media.renditions['full']['jpeg'], media.file.name)
+
+        for stored in media.renditions.values():
+            self.assertTrue(media.file.storage.exists(stored['jpeg']))
+
+        media.refresh_from_db()
+        self.assertEqual(media.renditions['thumb']['width'], 160)
+
+    def test_small_images_are_not_upscaled(self):
+        media = self.create_media(make_image(size=(100, 50)))
+
+        process_obj_media_file(media, renditions_field='renditions')
+
+        for stored in media.renditions.values():
+            self.assertEqual((stored['width'], stored['height']), (100, 50))
+            self.assertEqual(stored['jpeg'], media.file.name)
+
+    def test_images_resolve_rendition_urls(self):
+        media = self.create_media(make_image())
+        self.assertEqual(media.images['grid'], media.file.url)
+
+        process_obj_media_file(media, renditions_field='renditions')
+
+        self.assertTrue(media.images['grid'].endswith('_grid.jpg'))
+        self.assertEqual(
+            [width for _, width in (
+                candidate.rsplit(' ', 1) for candidate in media.images.srcset.split(', ')
+            )],
+            ['160w', '480w', '1080w', '2048w']
+        )
+        with self.assertRaises(KeyError):
+            media.images['poster']
+
+
+@override_settings(IMAGE_FORMATS=('webp', 'jpeg'))
+class ImageFormatTests(MediaTestCase, PostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post(self.create_user('author'))
+
+    def process(self, file):
+        media = PostMedia.objects.create(post=self.post, file=file)
+        process_obj_media_file(media, renditions_field='renditions')
+        return media
+
+    def open_rendition(self, media, rendition, image_format):
+        return Image.open(media.file.storage.open(media.renditions[rendition][image_format]))
+
+    def test_renditions_are_encoded_in_every_format(self):
+        media = self.process(make_image())
+
+        self.assertEqual(get_image_formats(), ('webp', 'jpeg'))
+        for stored in media.renditions.values():
+            self.assertTrue(stored['webp'].endswith('.webp'))
+            self.assertTrue(media.file.storage.exists(stored['webp']))
+
+        with self.open_rendition(media, 'grid', 'webp') as image:
+            self.assertEqual((image.format, image.width), ('WEBP', 480))
+
+    def test_transparency_is_kept_in_webp_and_flattened_in_jpeg(self):
+        media = self.process(
+            make_image(size=(600, 600), mode='RGBA', color=(255, 0, 0, 128))
+        )
+
+        with self.open_rendition(media, 'grid', 'webp') as image:
+            self.assertEqual(image.mode, 'RGBA')
+
+        with self.open_rendition(media, 'grid', 'jpeg') as image:
+            self.assertEqual(image.mode, 'RGB')
+            # half transparent red over white, not over black
+            self.assertGreater(image.getpixel((0, 0))[1], 100)
+
+    def test_accept_header_negotiates_the_format(self):
+        self.assertEqual(
+            get_accepted_image_formats('image/avif;q=0, image/webp, */*;q=0.8'),
+            {'webp', 'jpeg'}
+        )
+        self.assertEqual(get_accepted_image_formats(''), {'jpeg'})
+
+        media = self.process(make_image())
+
+        self.assertTrue(media.images.url('feed', accept={'webp', 'jpeg'}).endswith('_feed.webp'))
+        self.assertTrue(media.images.url('feed', accept={'avif', 'jpeg'}).endswith('_feed.jpg'))
+
+    def test_picture_lists_modern_formats_before_jpeg(self):
+        media = self.process(make_image())
+
+        html = render_to_string('includes/picture.html', {
+            'images': media.images, 'src': media.images['feed'], 'sizes': '100vw'
+        })
+
+        self.assertIn('<source type="image/webp"', html)
+        self.assertLess(html.index('<source'), html.index('<img'))
+        self.assertIn('_thumb.webp 160w', html)
+
+
+class ImageDecodingTests(PostTestCase):
+
+    def test_oversized_images_are_rejected_before_decoding(self):
+        with override_settings(IMAGE_MAX_PIXELS=100 * 100):
+            with self.assertRaises(ValueError):
+                decode_image(make_image(size=(101, 100)))
+
+            self.assertEqual(decode_image(make_image(size=(100, 100))).size, (100, 100))
+
+    def test_jpegs_are_drafted_at_a_reduced_scale(self):
+        file = make_image('photo.jpg', size=(4000, 3000), image_format='JPEG')
+
+        with mock.patch.object(
+            JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft
+        ) as draft:
+            image = decode_image(file, max_size=500)
+
+        draft.assert_called_once_with(mock.ANY, None, (500, 375))
+        self.assertEqual(image.size, (500, 375))
+
+    def test_images_are_fitted_and_cropped(self):
+        self.assertEqual(decode_image(make_image(), max_size=500).size, (500, 333))
+        self.assertEqual(decode_image(make_image(), crop_size=300).size, (300, 300))
+
+    def test_modes_are_normalized(self):
+        self.assertEqual(decode_image(make_image(mode='P', size=(10, 10))).mode, 'RGB')
+        self.assertEqual(decode_image(make_image(mode='LA', size=(10, 10))).mode, 'RGBA')
+        self.assertEqual(decode_image(make_image(mode='L', size=(10, 10))).mode, 'L')
+
+    def test_compress_and_crop_encode_one_jpeg(self):
+        compressed = compress_image(make_image(size=(300, 200), mode='RGBA'))
+        cropped = crop_and_compress_image(make_image(), crop_size=300)
+
+        self.assertEqual(compressed.name, 'photo.jpg')
+        with Image.open(cropped) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (300, 300)))
+
+    def test_undecodable_files_are_returned_unchanged(self):
+        file = SimpleUploadedFile('photo.png', b'not an image')
+
+        with self.assertLogs('utils.files', 'WARNING'):
+            self.assertIs(compress_image(file), file)
+
+
+class PostMediaBatchTests(MediaTestCase, PostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('author')
+        self.post = self.create_post(self.user)
+
+    def get_files(self):
+        return [
+            make_image(f'photo{idx}.png', size=(600, 400), color=color)
+            for idx, color in enumerate(('red', 'green', 'blue'))
+        ]
+
+    @mock.patch('apps.posts.media.process_postmedia_video_task.delay')
+    @mock.patch('apps.posts.media.process_post_media_task.delay')
+    def test_media_is_inserted_at_once_with_one_task(self, delay, video_delay):
+        files = self.get_files() + [SimpleUploadedFile('clip.mp4', b'video')]
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                media = create_post_media(self.post, files)
+
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT INTO "posts_postmedia"')
+        ]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(
+            [obj.media_type for obj in media],
+            ['image', 'image', 'image', 'video']
+        )
+        delay.assert_called_once_with(
+            post_id=self.post.pk, postmedia_ids=[obj.pk for obj in media[:3]]
+        )
+        video_delay.assert_called_once_with(postmedia_id=media[3].pk)
+
+    def test_batch_task_processes_every_image(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_post_media(self.post, self.get_files())
+
+        media = list(self.post.media.all())
+
+        self.assertEqual(len(media), 3)
+        for obj in media:
+            self.assertTrue(is_blob_file(obj.file.name))
+            self.assertEqual(obj.renditions['grid']['width'], 480)
+            self.assertTrue(obj.file.storage.exists(obj.renditions['grid']['jpeg']))
+
+    def test_create_post_view_uploads_every_file(self):
+        self.client.force_login(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('posts:create_post'),
+                {'caption': 'Trip', 'tags_': '#travel', 'files': self.get_files()}
+            )
+
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(caption='Trip')
+        self.assertEqual(post.media.count(), 3)
+        self.assertFalse(post.media.filter(renditions={}).exists())
+
+
+class PostVideoTests(MediaTestCase, PostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post(self.create_user('author'))
+
+    def create_media(self, file):
+        with self.captureOnCommitCallbacks(execute=True):
+            media = PostMedia.objects.create(post=self.post, file=file)
+
+        media.refresh_from_db()
+        return media
+
+    @override_settings(FFMPEG_PATH='missing-ffmpeg')
+    def test_videos_are_kept_as_uploaded_without_ffmpeg(self):
+        with self.assertLogs('utils.video', 'WARNING'):
+            media = self.create_media(SimpleUploadedFile('clip.mov', b'video'))
+
+        self.assertEqual(media.media_type, PostMedia.MEDIA_TYPES.VIDEO)
+        self.assertTrue(media.file.name.endswith('.mov'))
+        self.assertEqual((media.variants, media.renditions), ({}, {}))
+        self.assertEqual(media.images['grid'], media.file.url)
+
+    @skipUnless(get_ffmpeg_path(), 'ffmpeg is not installed')
+    def test_videos_are_transcoded_with_a_poster(self):
+        media = self.create_media(make_video())
+
+        self.assertTrue(is_blob_file(media.file.name))
+        self.assertTrue(media.file.name.endswith('.mp4'))
+        self.assertTrue(media.file.storage.exists(media.variants['low']))
+        self.assertTrue(media.variant_urls['low'].endswith('_low.mp4'))
+
+        # the poster is taken from the 1280px web version
+        self.assertEqual(media.renditions['full']['width'], 1280)
+        self.assertEqual(media.renditions['grid']['width'], 480)
+        self.assertTrue(media.images['grid'].endswith('_grid.jpg'))
@@ -0,0 +1,359 @@
+import logging
+
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Q
+
+from django_redis import get_redis_connection
+
+from apps.profiles.models import Follow
+
+from utils.pagination import CursorPage, decode_score_cursor, paginate_scored_ids
+
+from .models import Post
+
+
+logger = logging.getLogger(__name__)
+
+
+TIMELINE_KEY = 'feed:timeline:{user_id}'
+FANOUT_ON_READ_AUTHORS_KEY = 'feed:fanout_on_read_authors'
+
+FANOUT_BATCH_SIZE = 1000
+
+# Member kept in every materialized timeline, so an empty one still exists.
+TIMELINE_MARKER = b'built'
+
+
+def get_timeline_key(user_id) -> str:
+    return TIMELINE_KEY.format(user_id=user_id)
+
+
+def get_timeline_size() -> int:
+    return getattr(settings, 'FEED_TIMELINE_SIZE', 500)
+
+
+def get_timeline_ttl() -> int:
+    return getattr(settings, 'FEED_TIMELINE_TTL', 60 * 60 * 24 * 7)
+
+
+def get_fanout_max_followers() -> int:
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 10000)
+
+
+def post_score(created: datetime) -> float:
+    return created.timestamp()
+
+
+def get_fanout_on_read_authors() -> set:
+    conn = get_redis_connection('default')
+    return {int(author_id) for author_id in conn.smembers(FANOUT_ON_READ_AUTHORS_KEY)}
+
+
+def push_to_timelines(post_id: int, score: float, user_ids):
+
+    """
+    Add a post to the timelines of the given users. Only timelines that
+    are already materialized are updated, the rest are rebuilt on read.
+    """
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    conn = get_redis_connection('default')
+    keys = [get_timeline_key(user_id) for user_id in user_ids]
+    size = get_timeline_size()
+
+    with conn.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.exists(key)
+        existing = [key for key, exists in zip(keys, pipe.execute()) if exists]
+
+    if not existing:
+        return
+
+    with conn.pipeline(transaction=False) as pipe:
+        for key in existing:
+            pipe.zadd(key, {post_id: score})
+            pipe.zremrangebyrank(key, 0, -size - 1)
+        pipe.execute()
+
+
+def remove_from_timelines(post_ids, user_ids):
+
+    """
+    Remove the given posts from the timelines of the given users.
+    """
+
+    post_ids = list(post_ids)
+    user_ids = list(user_ids)
+    if not post_ids or not user_ids:
+        return
+
+    conn = get_redis_connection('default')
+
+    with conn.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.zrem(get_timeline_key(user_id), *post_ids)
+        pipe.execute()
+
+
+def fanout_post(post: Post):
+
+    """
+    Push a post into its author's timeline and the timelines of all of
+    the author's followers. Authors with more followers than
+    FEED_FANOUT_MAX_FOLLOWERS are served with fan-out-on-read instead.
+    """
+
+    conn = get_redis_connection('default')
+    score = post_score(post.created)
+
+    push_to_timelines(post.pk, score, [post.author_id])
+
+    followers = Follow.objects.filter(user_id=post.author_id)
+
+    if followers.count() > get_fanout_max_followers():
+        conn.sadd(FANOUT_ON_READ_AUTHORS_KEY, post.author_id)
+        return
+
+    conn.srem(FANOUT_ON_READ_AUTHORS_KEY, post.author_id)
+
+    batch = []
+    for follower_id in followers.values_list('follower_id', flat=True).iterator(
+        chunk_size=FANOUT_BATCH_SIZE
+    ):
+        batch.append(follower_id)
+
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            push_to_timelines(post.pk, score, batch)
+            batch = []
+
+    push_to_timelines(post.pk, score, batch)
+
+
+def remove_post(post_id: int, author_id: int):
+
+    """
+    Remove a post from its author's timeline and the timelines of
+    all of the author's followers.
+    """
+
+    remove_from_timelines([post_id], [author_id])
+
+    batch = []
+    for follower_id in Follow.objects.filter(user_id=author_id).values_list(
+        'follower_id', flat=True
+    ).iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(follower_id)
+
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            remove_from_timelines([post_id], batch)
+            batch = []
+
+    remove_from_timelines([post_id], batch)
+
+
+def backfill_author(user_id: int, author_id: int):
+
+    """
+    Add the recent posts of a newly followed author to a user's timeline.
+    """
+
+    if author_id in get_fanout_on_read_authors():
+        return
+
+    posts = (
+        Post.objects.filter(author_id=author_id, status=Post.POST_STATUS.ACTIVE)
+        .order_by('-created')
+        .values_list('id', 'created')[:get_timeline_size()]
+    )
+
+    entries = {post_id: post_score(created) for post_id, created in posts}
+    if not entries:
+        return
+
+    conn = get_redis_connection('default')
+    key = get_timeline_key(user_id)
+
+    if not conn.exists(key):
+        return
+
+    with conn.pipeline(transaction=False) as pipe:
+        pipe.zadd(key, entries)
+        pipe.zremrangebyrank(key, 0, -get_timeline_size() - 1)
+        pipe.execute()
+
+
+def purge_author(user_id: int, author_id: int):
+
+    """
+    Remove the posts of an unfollowed author from a user's timeline.
+    """
+
+    post_ids = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-created')
+        .values_list('id', flat=True)[:get_timeline_size()]
+    )
+
+    remove_from_timelines(post_ids, [user_id])
+
+
+def rebuild_timeline(user):
+
+    """
+    Materialize a user's timeline from the database. Used when the
+    timeline is missing, e.g. for users who were inactive past its TTL.
+    The timeline keeps a marker member, so it stays materialized even
+    when the user follows no one with posts.
+    """
+
+    conn = get_redis_connection('default')
+    key = get_timeline_key(user.pk)
+
+    following_ids = (
+        Follow.objects.filter(follower=user)
+        .exclude(user_id__in=get_fanout_on_read_authors())
+        .values_list('user_id', flat=True)
+    )
+
+    posts = (
+        Post.objects.filter(
+            Q(author=user) | Q(author_id__in=following_ids),
+            status=Post.POST_STATUS.ACTIVE
+        )
+        .order_by('-created')
+        .values_list('id', 'created')[:get_timeline_size()]
+    )
+
+    entries = {post_id: post_score(created) for post_id, created in posts}
+    entries[TIMELINE_MARKER] = float('-inf')
+
+    with conn.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.zadd(key, entries)
+        pipe.expire(key, get_timeline_ttl())
+        pipe.execute()
+
+
+def get_stored_entries(
+        key: str, max_score, min_score, after: tuple=None, limit: int=None
+    ) -> list:
+
+    """
+    Read up to limit (post_id, score) entries of a materialized timeline
+    between the scores, newest first, seeking past the (score, id) key
+    after. Members tied with that score are read separately, so ties
+    are paged without gaps.
+    """
+
+    conn = get_redis_connection('default')
+
+    with conn.pipeline(transaction=False) as pipe:
+        if after:
+            pipe.zrevrangebyscore(key, after[0], after[0], withscores=True)
+            max_score = f'({after[0]!r}'
+        pipe.zrevrangebyscore(
+            key, max_score, min_score, withscores=True,
+            **({'start': 0, 'num': limit} if limit else {})
+        )
+        pipe.expire(key, get_timeline_ttl())
+        results = pipe.execute()[:-1]
+
+    stored = [
+        (int(post_id), score) for post_id, score in results[-1]
+        if post_id != TIMELINE_MARKER
+    ]
+
+    if after:
+        stored += [
+            (int(post_id), score) for post_id, score in results[0]
+            if post_id != TIMELINE_MARKER and int(post_id) < after[1]
+        ]
+
+    return stored
+
+
+def get_timeline_entries(
+        user, start: datetime=None, end: datetime=None, after: tuple=None,
+        limit: int=None
+    ) -> list:
+
+    """
+    Return up to limit (post_id, score) entries of a user's feed, newest
+    first, optionally bounded by creation datetime and continuing after
+    the (score, id) key of the last entry seen. Posts of followed
+    authors that are not fanned out are merged in from the database,
+    with the same bounds, so a page costs the same however long the
+    timeline is.
+    """
+
+    conn = get_redis_connection('default')
+    key = get_timeline_key(user.pk)
+
+    if not conn.exists(key):
+        rebuild_timeline(user)
+
+    max_score = post_score(end) if end else '+inf'
+    min_score = post_score(start) if start else '-inf'
+
+    # a cursor past the end bound does not narrow the range
+    if after and end and after[0] > max_score:
+        after = None
+
+    entries = dict(get_stored_entries(key, max_score, min_score, after=after, limit=limit))
+
+    fanout_on_read_authors = get_fanout_on_read_authors()
+
+    if fanout_on_read_authors:
+        followed_authors = Follow.objects.filter(
+            follower=user, user_id__in=fanout_on_read_authors
+        ).values_list('user_id', flat=True)
+
+        posts = Post.objects.filter(
+            author_id__in=followed_authors,
+            status=Post.POST_STATUS.ACTIVE
+        )
+
+        if start:
+            posts = posts.filter(created__gte=start)
+        if end:
+            posts = posts.filter(created__lte=end)
+
+        if after:
+            created = datetime.fromtimestamp(after[0], tz=timezone.utc)
+            posts = posts.filter(
+                Q(created__lt=created) | Q(created=created, id__lt=after[1])
+            )
+
+        posts = posts.order_by('-created', '-id').values_list(
+            'id', 'created'
+        )[:limit or get_timeline_size()]
+
+        for post_id, created in posts:
+            entries[post_id] = post_score(created)
+
+    return sorted(
+        entries.items(), key=lambda entry: (entry[1], entry[0]), reverse=True
+    )[:limit]
+
+
+def get_timeline_page(
+        user, cursor: str=None, per_page: int=5,
+        start: datetime=None, end: datetime=None
+    ) -> CursorPage:
+
+    """
+    Return one page of post ids from a user's feed, keyed on (score, id)
+    so deep pages cost the same as the first one.
+    """
+
+    entries = get_timeline_entries(
+        user, start=start, end=end, after=decode_score_cursor(cursor),
+        limit=per_page + 1
+    )
+
+    return paginate_scored_ids(entries, per_page=per_page)
@@ -1,23 +1,16 @@
-from datetime import timedelta
+from datetime import datetime, time
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.db.models import (
-    Exists, OuterRef,
-    Count, Case, When,
-    Q, IntegerField, F
-)
+from django.db.models import Exists, OuterRef
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from django.views.decorators.http import require_http_methods
 from django.http import HttpResponse, Http404
 from django.conf import settings
 from django.utils import timezone
-from django.core.paginator import (
-    Paginator,
-    PageNotAnInteger,
-    EmptyPage
-)
+from django.core.paginator import Paginator
 
 from .forms import (
     PostForm,
@@ -26,9 +19,13 @@ from .forms import (
 )
 from .models import Post, Like, Save, Comment
 from .filters import PostFilter
+from . import timeline, counters, engagement
 
 from apps.profiles.models import Follow
-from apps.chat.models import Message, Chat
+from apps.chat.models import Message
+from apps.chat.direct import get_direct_chats
+
+from utils.pagination import sort_by_ids
 
 
 User = get_user_model()
@@ -37,69 +34,76 @@ User = get_user_model()
 # ---------- FEED ----------
 
 
-def get_feed_queryset(user):
+def get_feed_queryset(user, post_ids):
 
     """
-    Returns a queryset of posts for the feed, including posts from the user
-    and users they follow, annotated with like/save status and engagement scores.
+    Returns a queryset of the given feed posts, annotated with
+    like/save status.
     """
 
     return (
         Post.objects.filter(
-            Q(author=user) | Q(author__followers__follower=user),
+            pk__in=post_ids,
             status=Post.POST_STATUS.ACTIVE
         )
         .select_related('author', 'author__profile')
         .prefetch_related(
-            'media', 'tags', 'likes', 'comments'
+            'media', 'tags'
         )
         .annotate(
             liked=Exists(Like.objects.filter(user=user, post=OuterRef('pk'))),
             saved=Exists(Save.objects.filter(user=user, post=OuterRef('pk'))),
-
-            likes_count=Count('likes', distinct=True),
-            comments_count=Count('comments', distinct=True),
-            
-            priority_score=Case(
-                When(author=user, then=100),
-                default=10,
-                output_field=IntegerField()
-            ),
-            time_score=Case(
-                When(created__gte=timezone.now() - timedelta(hours=24), then=20),
-                When(created__gte=timezone.now() - timedelta(days=7), then=10),
-                When(created__gte=timezone.now() - timedelta(days=30), then=5),
-                default=1,
-                output_field=IntegerField()
-            ),
-        )
-        .annotate(
-            final_score=F('priority_score') + F('time_score') + F('likes_count') + F('comments_count')
         )
-        .order_by('-final_score', '-created')
+    )
+
+
+def get_feed_page(user, posts_filter, cursor=None):
+
+    """
+    Returns a page of post ids from the user's materialized feed
+    timeline, restricted to the date range of the filter form.
+    """
+
+    start = end = None
+
+    if posts_filter.form.is_valid():
+        tz = timezone.get_current_timezone()
+
+        start_date = posts_filter.form.cleaned_data.get('start_date')
+        end_date = posts_filter.form.cleaned_data.get('end_date')
+
+        if start_date:
+            start = datetime.combine(start_date, time.min, tzinfo=tz)
+        if end_date:
+            end = datetime.combine(end_date, time.min, tzinfo=tz)
+
+    return timeline.get_timeline_page(
+        user,
+        cursor=cursor,
+        per_page=getattr(settings, 'POSTS_PER_PAGE', 5),
+        start=start,
+        end=end
     )
 
 
 @login_required
 def feed(request):
-    queryset = get_feed_queryset(user=request.user)
-
     posts_filter = PostFilter(
         request.GET,
-        queryset=queryset
+        queryset=Post.objects.none()
     )
 
-    paginator = Paginator(
-        posts_filter.qs, getattr(settings, 'POSTS_PER_PAGE', 5)
+    posts = get_feed_page(
+        request.user, posts_filter, cursor=request.GET.get('cursor')
     )
-    page = request.GET.get('page', 1)
 
-    try:
-        posts = paginator.page(page)
-    except PageNotAnInteger:
-        posts = paginator.page(1)
-    except EmptyPage:
-        posts = paginator.page(paginator.num_pages)
+    posts.object_list = engagement.apply_state(
+        sort_by_ids(
+            get_feed_queryset(request.user, posts.object_list),
+            posts.object_list
+        ),
+        request.user.pk
+    )
 
     if request.htmx:
         template_name = 'posts/includes/posts_list.html'
@@ -144,11 +148,9 @@ def post_preview(request, post_id):
             saved=Exists(
                 Save.objects.filter(user=request.user, post=OuterRef('pk'))
             ),
-            comments_count=Count('comments'),
-            likes_count=Count('likes'),
         )
         .prefetch_related(
-            'media', 'tags', 'likes', 'comments'
+            'media', 'tags'
         )
         .select_related(
             'author', 'author__profile'
@@ -157,6 +159,8 @@ def post_preview(request, post_id):
 
     if not post:
         raise Http404()
+
+    engagement.apply_state([post], request.user.pk)
     
     root_comments = (
         post.comments.filter(
@@ -243,14 +247,31 @@ def delete_post(request, post_id):
 @login_required
 def toggle_like(request, post_id):
     if request.method == 'POST':
+        if engagement.is_enabled():
+            state = engagement.set_state(engagement.LIKES, post_id, request.user.pk)
+            if state is None:
+                raise Http404()
+
+            post = Post(pk=post_id)
+            _, post.liked, post.likes_count = state
+
+            return render(request, 'posts/partials/like_button.html', {'post': post})
+
         post = get_object_or_404(Post, pk=post_id)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
 
-        if not created:
-            like.delete()
-            post.liked = False
-        else:
-            post.liked = True
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+
+            if not created:
+                deleted, _ = Like.objects.filter(pk=like.pk).delete()
+                if deleted:
+                    counters.adjust_counter(post.pk, 'likes_count', -1)
+                post.liked = False
+            else:
+                counters.adjust_counter(post.pk, 'likes_count', 1)
+                post.liked = True
+
+        post.refresh_from_db(fields=['likes_count'])
 
         return render(request, 'posts/partials/like_button.html', {'post': post})
 
@@ -259,14 +280,29 @@ def toggle_like(request, post_id):
 @login_required
 def toggle_save(request, post_id):
     if request.method == 'POST':
+        if engagement.is_enabled():
+            state = engagement.set_state(engagement.SAVES, post_id, request.user.pk)
+            if state is None:
+                raise Http404()
+
+            post = Post(pk=post_id)
+            _, post.saved, post.saves_count = state
+
+            return render(request, 'posts/partials/save_button.html', {'post': post})
+
         post = get_object_or_404(Post, pk=post_id)
-        save, created = Save.objects.get_or_create(user=request.user, post=post)
 
-        if not created:
-            save.delete()
-            post.saved = False
-        else:
-            post.saved = True
+        with transaction.atomic():
+            save, created = Save.objects.get_or_create(user=request.user, post=post)
+
+            if not created:
+                deleted, _ = Save.objects.filter(pk=save.pk).delete()
+                if deleted:
+                    counters.adjust_counter(post.pk, 'saves_count', -1)
+                post.saved = False
+            else:
+                counters.adjust_counter(post.pk, 'saves_count', 1)
+                post.saved = True
 
         return render(request, 'posts/partials/save_button.html', {'post': post})
 
@@ -286,7 +322,9 @@ def add_comment(request, post_id):
             comment.post = post
             comment.author = request.user
 
-            comment.save()
+            with transaction.atomic():
+                comment.save()
+                counters.adjust_counter(post.pk, 'comments_count', 1)
 
             return render(request, 'posts/partials/comment.html', {'node': comment})
 
@@ -358,20 +396,17 @@ def send_post_to_chat(request, post_id):
         usernames = request.POST.get('recipients', '').split(',')
 
         recipients = User.objects.filter(username__in=usernames)
+        chats = get_direct_chats(request.user, recipients)
 
-        for user in recipients:
-            chat = Chat.objects.filter(members=request.user).filter(members=user).first()
-
-            if not chat:
-                chat = Chat.objects.create()
-                chat.members.add(request.user, user)
-
-            Message.objects.create(
+        Message.objects.bulk_create([
+            Message(
                 message_type=Message.MESSAGE_TYPES.POST,
                 chat=chat,
                 sender=request.user,
                 post=post
             )
+            for chat in chats.values()
+        ])
 
         response = HttpResponse(status=204)
         response['HX-Trigger'] = 'close'
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:04
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+from utils.migrations import PostgresOnly
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0005_profile_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        PostgresOnly(
+            migrations.AddIndex(
+                model_name='profile',
+                index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='profiles_profile_search_idx'),
+            )
+        ),
+        PostgresOnly(
+            migrations.RunSQL(
+                sql=[
+                    """
+                    CREATE TRIGGER profiles_profile_search_vector_update
+                    BEFORE INSERT OR UPDATE OF bio ON profiles_profile
+                    FOR EACH ROW EXECUTE FUNCTION
+                    tsvector_update_trigger(search_vector, 'pg_catalog.english', bio)
+                    """,
+                    "UPDATE profiles_profile SET search_vector = to_tsvector('pg_catalog.english', coalesce(bio, ''))",
+                ],
+                reverse_sql="DROP TRIGGER IF EXISTS profiles_profile_search_vector_update ON profiles_profile",
+            )
+        ),
+    ]
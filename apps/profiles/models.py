@@ -2,12 +2,15 @@ import logging
 
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import FileExtensionValidator
 
 from utils.files import (
     base_upload_to,
     validate_file_size,
-    ALLOWED_IMAGE_EXTENSIONS
+    ALLOWED_IMAGE_EXTENSIONS,
+    ImageRenditions
 )
 
 
@@ -35,6 +38,8 @@ class Profile(models.Model):
         null=True, blank=True
     )
 
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+
     bio = models.TextField(max_length=500, null=True, blank=True)
     location = models.CharField(max_length=100, null=True, blank=True)
     url = models.URLField(max_length=200, null=True, blank=True)
@@ -42,10 +47,16 @@ class Profile(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    # maintained from the bio by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Profile'
         verbose_name_plural = 'Profiles'
+        indexes = [
+            GinIndex(fields=('search_vector',), name='profiles_profile_search_idx'),
+        ]
     
     def __str__(self):
         return f'{self.user.username} (profile)'
@@ -58,6 +69,16 @@ class Profile(models.Model):
         if self.image:
             return self.image.url
         return '/static/img/def.png'
+
+    @property
+    def images(self):
+        return ImageRenditions(self.image, self.renditions)
+
+    @property
+    def thumb_or_default(self):
+        if self.image:
+            return self.images.url('thumb')
+        return '/static/img/def.png'
     
     @property
     def username(self):
@@ -29,7 +29,8 @@ def process_profile_image_task(self, profile_id=None, crop_size=500, quality=60)
 
         process_obj_media_file(
             obj=profile, file_field='image', quality=quality,
-            crop=True, crop_size=crop_size, skip_signals=True
+            crop=True, crop_size=crop_size, skip_signals=True,
+            renditions_field='renditions'
         )
     except Profile.DoesNotExist:
         logger.error(
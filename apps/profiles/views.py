@@ -5,10 +5,12 @@ from django.http import HttpResponseForbidden
 from django.views.decorators.http import require_http_methods
 from django.db.models import Count, Q
 from django.core.cache import cache
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.urls import reverse
 
 from apps.posts.models import Post
+from apps.posts import engagement
+
+from utils.pagination import KeysetPaginator
 
 from .forms import ProfileURLForm, ProfileBioForm
 from .models import Follow, Profile
@@ -135,18 +137,13 @@ def toggle_follow(request, username):
 @login_required
 def get_user_posts(request, username):
     user = get_object_or_404(User, username=username)
-    posts = []
+    posts = Post.objects.none()
 
     if not 'saved' in request.GET:
         posts = (
             user.posts.filter(
                 status=Post.POST_STATUS.ACTIVE
             )
-            .order_by('-created')
-            .annotate(
-                likes_count=Count('likes'),
-                comments_count=Count('comments'),
-            )
             .select_related('author', 'author__profile')
             .prefetch_related('media')
         )
@@ -158,26 +155,17 @@ def get_user_posts(request, username):
                 pk__in=saved_posts_pks,
                 status=Post.POST_STATUS.ACTIVE
             )
-            .annotate(
-                likes_count=Count('likes'),
-                comments_count=Count('comments'),
-            )
         )
 
-    paginator = Paginator(
+    paginator = KeysetPaginator(
         posts, per_page=6
     )
-    page = request.GET.get('page', 1)
-
-    try:
-        posts = paginator.page(page)
-    except PageNotAnInteger:
-        posts = paginator.page(1)
-    except EmptyPage:
-        posts = paginator.page(paginator.num_pages)
+    posts = paginator.page(request.GET.get('cursor'))
+    posts.object_list = engagement.apply_state(posts.object_list, request.user.pk)
 
     context = {
         'posts': posts,
+        'saved': 'saved' in request.GET,
         'load_url': reverse(
             'profiles:get_user_posts',
             kwargs={
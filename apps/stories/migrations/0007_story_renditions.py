@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0006_alter_story_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
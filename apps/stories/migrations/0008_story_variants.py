@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0007_story_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
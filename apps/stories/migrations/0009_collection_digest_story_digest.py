@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0008_story_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='digest',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='digest',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -8,8 +8,10 @@ from django.core.validators import FileExtensionValidator
 from django.utils import timezone
 
 from utils.files import (
-    base_upload_to, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS, validate_file_size
+    base_upload_to, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS, validate_file_size,
+    ImageRenditions
 )
+from utils.video import get_variant_urls
 
 
 User = get_user_model()
@@ -57,6 +59,11 @@ class Story(models.Model):
         max_length=5, choices=MEDIA_TYPES.choices, default=MEDIA_TYPES.IMAGE
     )
 
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    digest = models.CharField(max_length=64, blank=True, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(default=set_expiry_datetime, null=True, blank=True)
 
@@ -70,6 +77,14 @@ class Story(models.Model):
     def __str__(self):
         return f'{self.author.username} (story)'
 
+    @property
+    def images(self):
+        return ImageRenditions(self.media, self.renditions)
+
+    @property
+    def variant_urls(self):
+        return get_variant_urls(self.media, self.variants)
+
 
 class Collection(models.Model):
     
@@ -86,6 +101,8 @@ class Collection(models.Model):
         ],
         null=True, blank=True
     )
+
+    digest = models.CharField(max_length=64, blank=True, editable=False)
     
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -105,5 +122,5 @@ class Collection(models.Model):
         if self.image:
             return self.image.url
         if self.stories.exists():
-            return self.stories.first().media.url
+            return self.stories.first().images.url('thumb')
         return '/static/img/def_collection.jpg'
@@ -10,11 +10,16 @@ from django.conf import settings
 from .models import Story, Collection
 from .tasks import (
     process_story_image_task,
+    process_story_video_task,
     delete_story_media_task,
     process_collection_image_task,
     delete_collection_media_task
 )
 
+from apps.blobs.models import Blob
+from apps.blobs.store import dedupe_upload, get_held_digest, get_replaced_digest
+from apps.blobs.tasks import release_blobs_task
+
 from utils.files import (
     ALLOWED_IMAGE_EXTENSIONS,
     ALLOWED_VIDEO_EXTENSIONS,
@@ -26,6 +31,38 @@ from utils.files import (
 logger = logging.getLogger(__name__)
 
 
+@receiver(pre_save, sender=Story)
+def dedupe_story_media_file(sender, instance, **kwargs):
+
+    """
+    Signal to hash a newly uploaded Story file and reuse the
+    stored blob when the same content was uploaded before.
+    """
+
+    try:
+        old_digest = get_replaced_digest(
+            instance, file_field='media', renditions_field='renditions',
+            variants_field='variants'
+        )
+
+        if dedupe_upload(
+            instance, file_field='media', kind=Blob.KINDS.MEDIA,
+            renditions_field='renditions', variants_field='variants'
+        ):
+            instance._skip_signals = True
+
+        if old_digest:
+            transaction.on_commit(
+                lambda: release_blobs_task.delay(
+                    digests=[old_digest], kind=Blob.KINDS.MEDIA
+                )
+            )
+    except Exception as e:
+        logger.warning(
+            f'Media deduplication failed for story: {instance.pk}: {e}'
+        )
+
+
 @receiver(post_save, sender=Story)
 def process_story_media_file(sender, instance, **kwargs):
 
@@ -57,6 +94,12 @@ def process_story_media_file(sender, instance, **kwargs):
                 instance._skip_signals = True
                 instance.save(update_fields=['media_type'])
 
+                transaction.on_commit(
+                    lambda: process_story_video_task.delay(
+                        story_id=instance.pk
+                    )
+                )
+
     except Exception as e:
         logger.warning(
             f'Image compression failed for story: {instance.pk}: {e}'
@@ -65,12 +108,37 @@ def process_story_media_file(sender, instance, **kwargs):
 
 @receiver(post_delete, sender=Story)
 def delete_story_media(sender, instance, *args, **kwargs):
+    public_id = instance.public_id
+    digest = get_held_digest(instance, file_field='media')
+
     try:
-        delete_story_media_task.delay(instance.public_id)
+        transaction.on_commit(
+            lambda: delete_story_media_task.delay(
+                public_id, digests=[digest] if digest else []
+            )
+        )
     except Exception as e:
         logger.warning(f'Story media deletion failed: {e}')
 
 
+@receiver(pre_save, sender=Collection)
+def dedupe_collection_image(sender, instance, **kwargs):
+    try:
+        old_digest = get_replaced_digest(instance, file_field='image')
+
+        if dedupe_upload(instance, file_field='image', kind=Blob.KINDS.COVER):
+            instance._skip_signals = True
+
+        if old_digest:
+            transaction.on_commit(
+                lambda: release_blobs_task.delay(
+                    digests=[old_digest], kind=Blob.KINDS.COVER
+                )
+            )
+    except Exception as e:
+        logger.warning(f'Image deduplication failed for collection: {instance.pk}: {e}')
+
+
 @receiver(post_save, sender=Collection)
 def process_collection_media_file(sender, instance, **kwargs):
     if getattr(instance, '_skip_signals', False):
@@ -87,8 +155,15 @@ def process_collection_media_file(sender, instance, **kwargs):
     
 @receiver(post_delete, sender=Collection)
 def delete_collection_media(sender, instance, *args, **kwargs):
+    public_id = instance.public_id
+    digest = get_held_digest(instance, file_field='image')
+
     try:
-        delete_collection_media_task.delay(instance.public_id)
+        transaction.on_commit(
+            lambda: delete_collection_media_task.delay(
+                public_id, digests=[digest] if digest else []
+            )
+        )
     except Exception as e:
         logger.warning(
             f'Collection media deletion failed for: {instance.pk}: {e}'
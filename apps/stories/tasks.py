@@ -9,7 +9,11 @@ from celery import shared_task
 
 from .models import Story, Collection
 
+from apps.blobs.models import Blob
+from apps.blobs.store import is_blob_file, store_blob, release_blobs
+
 from utils.files import process_obj_media_file
+from utils.video import process_obj_video_file
 
 
 logger = logging.getLogger(__name__)
@@ -44,13 +48,17 @@ def process_story_image_task(self, story_id=None, quality=60):
 
     try:
         instance = Story.objects.get(pk=story_id)
-        if not instance.media:
+        if not instance.media or is_blob_file(instance.media.name):
             return
 
-        process_obj_media_file(
+        if process_obj_media_file(
             obj=instance, file_field='media', quality=quality,
-            crop=False, skip_signals=True
-        )
+            crop=False, skip_signals=True, renditions_field='renditions'
+        ):
+            store_blob(
+                instance, file_field='media', kind=Blob.KINDS.MEDIA,
+                renditions_field='renditions', variants_field='variants'
+            )
     except Story.DoesNotExist:
         logger.error(
             f'Story {story_id} not found for image compression.'
@@ -63,11 +71,43 @@ def process_story_image_task(self, story_id=None, quality=60):
 
 
 @shared_task(bind=True, max_retries=3)
-def delete_story_media_task(self, public_id):
+def process_story_video_task(self, story_id=None, quality=60):
+
+    """
+    Celery task that transcodes the story video for the
+    given story_id and extracts its poster frame.
+    """
+
+    try:
+        instance = Story.objects.get(pk=story_id)
+        if not instance.media or is_blob_file(instance.media.name):
+            return
+
+        if process_obj_video_file(
+            obj=instance, file_field='media', quality=quality, skip_signals=True
+        ):
+            store_blob(
+                instance, file_field='media', kind=Blob.KINDS.MEDIA,
+                renditions_field='renditions', variants_field='variants'
+            )
+    except Story.DoesNotExist:
+        logger.error(
+            f'Story {story_id} not found for video processing.'
+        )
+    except Exception as exc:
+        logger.warning(
+            f'Video processing failed for story: {story_id}: {exc}'
+        )
+        raise self.retry(countdown=60, exc=exc)
+
+
+@shared_task(bind=True, max_retries=3)
+def delete_story_media_task(self, public_id, digests=None):
 
     """
     Celery task that deletes all media files associated
-    with the story identified by publid_id.
+    with the story identified by publid_id, and the blobs
+    in digests that are no longer referenced.
     """
 
     try:
@@ -77,6 +117,8 @@ def delete_story_media_task(self, public_id):
 
         if os.path.exists(path):
             shutil.rmtree(path)
+
+        release_blobs(digests or [], kind=Blob.KINDS.MEDIA)
     except Exception as exc:
         logger.error(
             f'Failed to delete media for story: {public_id}, {exc}'
@@ -94,13 +136,14 @@ def process_collection_image_task(self, collection_id=None, quality=60):
 
     try:
         instance = Collection.objects.get(pk=collection_id)
-        if not instance.image:
+        if not instance.image or is_blob_file(instance.image.name):
             return
 
-        process_obj_media_file(
+        if process_obj_media_file(
             obj=instance, file_field='image', quality=quality,
             crop=True, crop_size=400, skip_signals=True
-        )
+        ):
+            store_blob(instance, file_field='image', kind=Blob.KINDS.COVER)
     except Story.DoesNotExist:
         logger.error(
             f'Collection: {collection_id} not found for image compression.'
@@ -113,11 +156,12 @@ def process_collection_image_task(self, collection_id=None, quality=60):
 
 
 @shared_task(bind=True, max_retries=3)
-def delete_collection_media_task(self, public_id):
+def delete_collection_media_task(self, public_id, digests=None):
 
     """
     Celery task that deletes all media files associated
-    with the collection identified by publid_id.
+    with the collection identified by publid_id, and the
+    blobs in digests that are no longer referenced.
     """
 
     try:
@@ -127,6 +171,8 @@ def delete_collection_media_task(self, public_id):
 
         if os.path.exists(path):
             shutil.rmtree(path)
+
+        release_blobs(digests or [], kind=Blob.KINDS.COVER)
     except Exception as exc:
         logger.error(
             f'Failed to delete media for collection: {public_id}: {exc}'
@@ -1,3 +1,62 @@
-from django.test import TestCase
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+from apps.blobs.store import is_blob_file
+
+from utils.video import get_ffmpeg_path
+from utils.testing import MediaTestCase, make_image, make_video
+
+from .models import Story
+
+
+User = get_user_model()
+
+
+class StoryTestCase(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+
+    def create_story(self, file):
+        with self.captureOnCommitCallbacks(execute=True):
+            story = Story.objects.create(author=self.user, media=file)
+
+        story.refresh_from_db()
+        return story
+
+
+# ---------- MEDIA ----------
+
+
+class StoryMediaTests(StoryTestCase):
+
+    def test_images_get_renditions(self):
+        story = self.create_story(make_image())
+
+        self.assertEqual(story.media_type, Story.MEDIA_TYPES.IMAGE)
+        self.assertEqual(story.renditions['feed']['width'], 1080)
+        self.assertTrue(story.images['thumb'].endswith('_thumb.jpg'))
+
+    @override_settings(FFMPEG_PATH='missing-ffmpeg')
+    def test_videos_are_kept_as_uploaded_without_ffmpeg(self):
+        with self.assertLogs('utils.video', 'WARNING'):
+            story = self.create_story(SimpleUploadedFile('clip.mov', b'video'))
+
+        self.assertEqual(story.media_type, Story.MEDIA_TYPES.VIDEO)
+        self.assertTrue(story.media.name.endswith('.mov'))
+        self.assertEqual(story.variant_urls, {})
+
+    @skipUnless(get_ffmpeg_path(), 'ffmpeg is not installed')
+    def test_videos_are_transcoded_with_a_poster(self):
+        story = self.create_story(make_video())
+
+        self.assertTrue(is_blob_file(story.media.name))
+        self.assertTrue(story.media.name.endswith('.mp4'))
+        self.assertTrue(story.media.storage.exists(story.variants['low']))
+        self.assertEqual(story.renditions['feed']['width'], 1080)
@@ -10,7 +10,8 @@ from .models import Story, Collection
 from .forms import CollectionForm
 
 from apps.profiles.models import Follow
-from apps.chat.models import Message, Chat
+from apps.chat.models import Message
+from apps.chat.direct import get_direct_chat, get_direct_chats
 
 
 User = get_user_model()
@@ -137,11 +138,10 @@ def send_story_reply(request, story_id):
     
     story = get_object_or_404(Story, pk=story_id)
 
-    chat = Chat.objects.filter(members=request.user).filter(members=story.author).first()
+    chat = get_direct_chat(request.user, story.author)
 
     if not chat:
-        chat = Chat.objects.create()
-        chat.members.add(request.user, story.author)
+        return redirect('/')
 
     reply = request.POST.get('reply', '')
 
@@ -187,20 +187,17 @@ def send_story_to_chat(request, story_id):
         usernames = request.POST.get('recipients', '').split(',')
 
         recipients = User.objects.filter(username__in=usernames)
+        chats = get_direct_chats(request.user, recipients)
 
-        for user in recipients:
-            chat = Chat.objects.filter(members=request.user).filter(members=user).first()
-
-            if not chat:
-                chat = Chat.objects.create()
-                chat.members.add(request.user, user)
-
-            Message.objects.create(
+        Message.objects.bulk_create([
+            Message(
                 message_type=Message.MESSAGE_TYPES.STORY,
                 chat=chat,
                 sender=request.user,
                 story=story
             )
+            for chat in chats.values()
+        ])
 
         response = HttpResponse(status=204)
         response['HX-Trigger'] = 'close'
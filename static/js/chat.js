@@ -10,6 +10,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const form = document.getElementById("chat_message_form");
     const input = document.getElementById("chat-input");
     const indicator = document.getElementById("typing_indicator");
+    const readIndicator = document.getElementById("read_indicator");
 
     let socket = null;
     let typingTimeout;
@@ -29,13 +30,24 @@ document.addEventListener("DOMContentLoaded", () => {
                         indicator.classList.add("d-none");
                     }
                     scrollToBottom();
+                } else if (data.type === "read" && readIndicator) {
+                    readIndicator.classList.remove("d-none");
                 }
             } catch (e) {
+                if (readIndicator && event.data.includes('id="chat_messages"')) {
+                    readIndicator.classList.add("d-none");
+                }
                 scrollToBottom();
             }
         });
     });
 
+    document.addEventListener("visibilitychange", () => {
+        if (socket && document.visibilityState === "visible") {
+            socket.send(JSON.stringify({ type: "read", read: true }));
+        }
+    });
+
     input.addEventListener("input", () => {
         if (!socket) return;
 
@@ -0,0 +1,47 @@
+function initSearchSuggestions() {
+    const input = document.getElementById("search_input");
+    const datalist = document.getElementById("search_suggestions");
+
+    if (!input || !datalist) {
+        return;
+    }
+
+    let suggestTimeout;
+    let controller;
+
+    input.addEventListener("input", () => {
+        clearTimeout(suggestTimeout);
+
+        suggestTimeout = setTimeout(async () => {
+            const query = input.value.trim();
+            if (!query) {
+                datalist.replaceChildren();
+                return;
+            }
+
+            if (controller) controller.abort();
+            controller = new AbortController();
+
+            try {
+                const url = `${input.dataset.autocompleteUrl}?query=${encodeURIComponent(query)}`;
+                const response = await fetch(url, { signal: controller.signal });
+                const data = await response.json();
+
+                const options = [
+                    ...data.profiles.map((profile) => profile.username),
+                    ...data.tags.map((tag) => tag.name),
+                ].map((value) => {
+                    const option = document.createElement("option");
+                    option.value = value;
+                    return option;
+                });
+
+                datalist.replaceChildren(...options);
+            } catch (e) {
+                // a newer keystroke aborted this request
+            }
+        }, 150);
+    });
+}
+
+document.addEventListener("DOMContentLoaded", initSearchSuggestions);
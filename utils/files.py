@@ -1,9 +1,13 @@
 import os
+import math
+import hashlib
 import logging
+import tempfile
 import shortuuid
 
-from PIL import Image
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, features
 
 from django.core.files import File
 from django.conf import settings
@@ -21,6 +25,25 @@ ALLOWED_VIDEO_EXTENSIONS = (
     'mp4', 'mov', 'avi', 'mkv', 'webm'
 )
 
+IMAGE_RENDITIONS = {
+    'thumb': 160,
+    'grid': 480,
+    'feed': 1080,
+    'full': 2048,
+}
+
+IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+
+IMAGE_SPOOL_SIZE = 1024 * 1024
+
+IMAGE_AVIF_SPEED = 8
+
+IMAGE_FORMAT_MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
 
 def get_file_ext(file_name: str) -> str:
     ext = os.path.splitext(file_name)[-1].lower().lstrip('.')
@@ -49,6 +72,122 @@ def base_upload_to(instance, filename, base_dir='uploads', id_attr='public_id'):
     return f'{base_dir}/{obj_id}/{new_filename}{ext}'
 
 
+def get_file_digest(file) -> str:
+
+    """
+    SHA-256 hex digest of a file's content, read in chunks.
+    """
+
+    digest = hashlib.sha256()
+
+    for chunk in file.chunks():
+        digest.update(chunk)
+
+    file.seek(0)
+
+    return digest.hexdigest()
+
+
+def get_media_type(file_name: str) -> str:
+    return 'video' if get_file_ext(file_name) in ALLOWED_VIDEO_EXTENSIONS else 'image'
+
+
+def get_image_max_pixels() -> int:
+    return getattr(settings, 'IMAGE_MAX_PIXELS', 50_000_000)
+
+
+def fit_size(size: tuple, max_size: int) -> tuple:
+
+    """
+    Scale a (width, height) size to fit in a max_size square,
+    keeping the aspect ratio. Never upscales.
+    """
+
+    width, height = size
+    scale = max_size / max(width, height)
+
+    if scale >= 1:
+        return size
+
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def resize_image(image, size: tuple):
+
+    """
+    Resize a decoded image. Large reductions run through reduce()
+    first, which is much cheaper than resampling the full bitmap.
+    """
+
+    if image.size == tuple(size):
+        return image
+
+    return image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+
+def crop_square(image, size: int = 300):
+
+    """
+    Center-crop a decoded image to a square and resize it in a
+    single pass, without materializing the cropped bitmap.
+    """
+
+    width, height = image.size
+
+    min_side = min(width, height)
+    left = (width - min_side) // 2
+    top = (height - min_side) // 2
+
+    return image.resize(
+        (size, size), Image.LANCZOS,
+        box=(left, top, left + min_side, top + min_side), reducing_gap=2.0
+    )
+
+
+def decode_image(file, max_size: int = None, crop_size: int = None):
+
+    """
+    Decode an image file into an RGB, RGBA or L bitmap no larger than
+    needed: the shorter side is scaled to crop_size for crops, the
+    longer side to max_size otherwise. JPEGs are decoded at a reduced
+    scale with draft(), so their full-resolution bitmap is never held
+    in memory. Images over IMAGE_MAX_PIXELS are rejected before decoding.
+    """
+
+    image = Image.open(file)
+
+    width, height = image.size
+
+    if width * height > get_image_max_pixels():
+        image.close()
+        raise ValueError(f'Image is too large to process: {width}x{height}')
+
+    if crop_size:
+        scale = crop_size / min(width, height)
+    elif max_size:
+        scale = max_size / max(width, height)
+    else:
+        scale = 1
+
+    if scale < 1:
+        image.draft(None, (math.ceil(width * scale), math.ceil(height * scale)))
+
+    image.load()
+
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    if crop_size:
+        return crop_square(image, crop_size)
+
+    if max_size:
+        return resize_image(image, fit_size(image.size, max_size))
+
+    return image
+
+
 def compress_image(file, quality: int = 60):
 
     """
@@ -56,18 +195,10 @@ def compress_image(file, quality: int = 60):
     """
 
     try:
-        with Image.open(file) as image:
-            if image.mode in ('P', 'RGBA'):
-                image = image.convert('RGB')
-            
-            buffer = BytesIO()
-            name = os.path.splitext(file.name)[0] + '.jpg'
+        image = decode_image(file)
+        name = os.path.splitext(file.name)[0] + '.jpg'
 
-            image.save(buffer, format='JPEG', quality=quality, optimize=True)
-
-            buffer.seek(0)
-
-            return File(buffer, name=name)
+        return encode_image(image, name, quality=quality)
 
     except Exception as e:
         logger.warning(f'Image compression failed: {e}')
@@ -80,44 +211,305 @@ def crop_image(file, size: int = 300):
     Crop and resize an image file to a square of specified size."""
 
     try:
-        with Image.open(file) as image:
-            if image.mode in ('P', 'RGBA'):
-                image = image.convert('RGB')
-            
-            buffer = BytesIO()
-            name = os.path.splitext(file.name)[0] + '.jpg'
+        image = decode_image(file, crop_size=size)
+        name = os.path.splitext(file.name)[0] + '.jpg'
+
+        return encode_image(image, name, quality=75)
 
-            width, height = image.size
+    except Exception as e:
+        logger.warning(f'Could not resize image: {e}')
 
-            if width != height:
-                min_side = min(width, height)
-                left = (width - min_side) // 2
-                top = (height - min_side) // 2
-                right = left + min_side
-                bottom = top + min_side
-                image = image.crop((left, top, right, bottom))
 
-            image = image.resize((size, size), Image.LANCZOS)
-            image.save(buffer, format='JPEG')
+def crop_and_compress_image(image, crop_size: int = 300, quality: int = 60):
 
-            buffer.seek(0)
+    """
+    Crop and compress an image file, decoding and encoding it once.
+    """
+
+    try:
+        decoded = decode_image(image, crop_size=crop_size)
+        name = os.path.splitext(image.name)[0] + '.jpg'
 
-            return File(buffer, name=name)
+        return encode_image(decoded, name, quality=quality)
 
     except Exception as e:
-        logger.warning(f'Could not resize image: {e}')
+        logger.warning(f'Image compression failed: {e}')
+        return image
 
 
-def crop_and_compress_image(image, crop_size: int = 300, quality: int = 60):
+def get_image_renditions() -> dict:
+    return getattr(settings, 'IMAGE_RENDITIONS', IMAGE_RENDITIONS)
+
+
+def get_image_max_size() -> int:
+    return max(get_image_renditions().values())
+
+
+def get_rendition_name(file_name: str, rendition: str, ext: str = 'jpg') -> str:
+    stem = os.path.splitext(file_name)[0]
+    return f'{stem}_{rendition}.{ext}'
+
+
+def get_image_formats() -> tuple:
 
     """
-    Crop and compress an image file.
+    Return the output image formats in order of preference, limited to
+    those Pillow can encode. JPEG is always included as the fallback.
     """
 
-    cropped = crop_image(image, crop_size)
-    compressed = compress_image(cropped, quality)
+    formats = getattr(settings, 'IMAGE_FORMATS', IMAGE_FORMATS)
+    formats = tuple(
+        image_format for image_format in formats
+        if image_format == 'jpeg' or features.check(image_format)
+    )
+
+    return formats if 'jpeg' in formats else formats + ('jpeg',)
 
-    return compressed
+
+def get_image_format_ext(image_format: str) -> str:
+    return 'jpg' if image_format == 'jpeg' else image_format
+
+
+def get_accepted_image_formats(accept: str) -> set:
+
+    """
+    Return the image formats listed in an HTTP Accept header.
+    JPEG is always considered acceptable.
+    """
+
+    accepted = {'jpeg'}
+    mime_types = {mime: image_format for image_format, mime in IMAGE_FORMAT_MIME_TYPES.items()}
+
+    for item in (accept or '').split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if quality > 0 and media_type.lower() in mime_types:
+            accepted.add(mime_types[media_type.lower()])
+
+    return accepted
+
+
+def flatten_image(image):
+
+    """
+    Composite an image with an alpha channel onto a white background.
+    """
+
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+
+    return background
+
+
+def encode_image(image, name: str, quality: int = 60, image_format: str = 'jpeg'):
+
+    """
+    Encode a decoded image to a file of the given format. Transparency
+    is kept for WebP and AVIF and flattened for JPEG. Output larger than
+    IMAGE_SPOOL_SIZE spills to a temporary file on disk instead of
+    being held in memory.
+    """
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_SIZE)
+
+    if image_format == 'jpeg':
+        if image.mode not in ('RGB', 'L'):
+            image = flatten_image(image)
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    elif image_format == 'avif':
+        image.save(buffer, format='AVIF', quality=quality, speed=IMAGE_AVIF_SPEED)
+    else:
+        image.save(buffer, format=image_format.upper(), quality=quality)
+
+    buffer.seek(0)
+
+    return File(buffer, name=name)
+
+
+def store_image(image, storage, name: str, quality: int = 60, image_format: str = 'jpeg') -> str:
+
+    """
+    Encode a decoded image and save it to storage under name,
+    replacing any existing file. Returns the stored name.
+    """
+
+    if storage.exists(name):
+        storage.delete(name)
+
+    content = encode_image(image, name, quality, image_format)
+
+    try:
+        return storage.save(name, content)
+    finally:
+        content.close()
+
+
+def save_renditions(image, storage, name: str, quality: int = 60) -> dict:
+
+    """
+    Downscale an already decoded image to every size in IMAGE_RENDITIONS
+    and store the results next to name, the stored JPEG of the image,
+    once per output format. Each size is resized from the previous one,
+    so only one extra bitmap is alive at a time. Sizes the image does
+    not exceed point at name itself instead of being upscaled.
+    """
+
+    formats = get_image_formats()
+    stem = os.path.splitext(name)[0]
+
+    renditions = {}
+    current, current_files = image, None
+
+    sizes = sorted(get_image_renditions().items(), key=lambda item: item[1], reverse=True)
+
+    for rendition, size in sizes:
+        if max(current.size) > size:
+            current = resize_image(current, fit_size(current.size, size))
+
+            current_files = {
+                image_format: store_image(
+                    current, storage,
+                    get_rendition_name(name, rendition, get_image_format_ext(image_format)),
+                    quality, image_format
+                )
+                for image_format in formats
+            }
+        elif current_files is None:
+            current_files = {
+                image_format: name if image_format == 'jpeg' else store_image(
+                    current, storage,
+                    f'{stem}.{get_image_format_ext(image_format)}',
+                    quality, image_format
+                )
+                for image_format in formats
+            }
+
+        renditions[rendition] = {
+            'width': current.width,
+            'height': current.height,
+            **current_files,
+        }
+
+    return renditions
+
+
+def delete_renditions(storage, renditions: dict, keep=()):
+
+    """
+    Delete stored rendition files, except the names listed in keep.
+    """
+
+    for rendition in (renditions or {}).values():
+        for key, name in rendition.items():
+            if key in ('width', 'height') or name in keep:
+                continue
+            if storage.exists(name):
+                storage.delete(name)
+
+
+class ImageRenditions:
+
+    """
+    Resolve the URLs of an image's renditions by name, e.g.
+    `media.images.grid` in templates. Unprocessed images and videos
+    fall back to the file itself.
+    """
+
+    def __init__(self, file, renditions: dict = None):
+        self.file = file
+        self.renditions = renditions or {}
+
+    def __getitem__(self, rendition):
+        if rendition not in get_image_renditions():
+            raise KeyError(rendition)
+        return self.url(rendition)
+
+    def __bool__(self):
+        return bool(self.file)
+
+    def url(self, rendition: str, accept=('jpeg',)) -> str:
+
+        """
+        Return the URL of a rendition in the most preferred of the
+        accepted formats, JPEG if none of them was generated.
+        """
+
+        if not self.file:
+            return ''
+
+        stored = self.renditions.get(rendition)
+        if not stored:
+            return self.file.url
+
+        for image_format in get_image_formats():
+            if image_format in accept and image_format in stored:
+                return self.file.storage.url(stored[image_format])
+
+        return self.file.storage.url(stored['jpeg'])
+
+    def urls(self, accept=('jpeg',)) -> dict:
+        if not self.file:
+            return {}
+        return {
+            rendition: self.url(rendition, accept=accept)
+            for rendition in get_image_renditions()
+        }
+
+    def get_srcset(self, image_format: str = 'jpeg') -> str:
+
+        """
+        A srcset attribute value listing each distinct rendition of the
+        given format with its width, so browsers download the smallest
+        one that fits.
+        """
+
+        widths = {}
+        for stored in self.renditions.values():
+            if image_format not in stored:
+                return ''
+            widths[stored[image_format]] = stored['width']
+
+        return ', '.join(
+            f'{self.file.storage.url(name)} {width}w'
+            for name, width in sorted(widths.items(), key=lambda item: item[1])
+        )
+
+    @property
+    def srcset(self) -> str:
+        return self.get_srcset('jpeg')
+
+    @property
+    def sources(self) -> list:
+
+        """
+        The <source> candidates of a <picture> element for every modern
+        format that was generated, most preferred first.
+        """
+
+        sources = []
+
+        for image_format in get_image_formats():
+            if image_format == 'jpeg':
+                continue
+
+            srcset = self.get_srcset(image_format)
+            if srcset:
+                sources.append({
+                    'type': IMAGE_FORMAT_MIME_TYPES[image_format],
+                    'srcset': srcset,
+                })
+
+        return sources
 
 
 def validate_file_size(file):
@@ -133,41 +525,153 @@ def validate_file_size(file):
         raise ValidationError(f'File size cannot exceed {max_size_mb}')
 
 
-def process_obj_media_file(
-        obj, file_field: str='file', quality: int=60, crop: bool=False, 
-        crop_size: int=500, skip_signals: bool=False
+def process_image_file(
+        file, quality: int=60, crop: bool=False, crop_size: int=500,
+        renditions: bool=False
     ):
-    try:
-        file = getattr(obj, file_field, None)
-        if not file or not file.name:
-            return
-
-        ext = get_file_ext(file.name)
-        
-        if ext not in ALLOWED_IMAGE_EXTENSIONS:
-            return
-        
-        if crop:
-            processed_image = crop_and_compress_image(
-                image=file, crop_size=crop_size, quality=quality
-            )
-        else:
-            processed_image = compress_image(
-                file=file, quality=quality
-            )
 
+    """
+    Replace an image field file with its compressed JPEG in one
+    decode-transform-encode pass, capped to the largest rendition size.
+    Returns the renditions generated from the same decoded bitmap, or
+    None when renditions is False.
+    """
+
+    image = decode_image(
+        file,
+        max_size=None if crop else get_image_max_size(),
+        crop_size=crop_size if crop else None
+    )
+
+    processed_image = encode_image(
+        image, name=os.path.splitext(file.name)[0] + '.jpg', quality=quality
+    )
+
+    try:
         old_file_name = file.name
 
         if file.storage.exists(old_file_name):
             file.storage.delete(old_file_name)
 
+        file.save(
+            processed_image.name, processed_image, save=False
+        )
+    finally:
+        processed_image.close()
+
+    if not renditions:
+        return None
+
+    return save_renditions(image, file.storage, file.name, quality=quality)
+
+
+def process_obj_image(
+        obj, file_field: str='file', quality: int=60, crop: bool=False,
+        crop_size: int=500, renditions_field: str=None
+    ) -> bool:
+
+    """
+    Process the image stored in obj.<file_field> and record its
+    renditions on obj.<renditions_field>, replacing the previous ones.
+    The object is only updated in memory. Returns False for files that
+    are not images.
+    """
+
+    file = getattr(obj, file_field, None)
+    if not file or not file.name:
+        return False
+
+    if get_file_ext(file.name) not in ALLOWED_IMAGE_EXTENSIONS:
+        return False
+
+    old_renditions = getattr(obj, renditions_field, None) if renditions_field else None
+
+    renditions = process_image_file(
+        file, quality=quality, crop=crop, crop_size=crop_size,
+        renditions=bool(renditions_field)
+    )
+
+    if renditions_field:
+        delete_renditions(
+            file.storage, old_renditions,
+            keep={
+                name for stored in renditions.values()
+                for key, name in stored.items() if key not in ('width', 'height')
+            }
+        )
+
+        setattr(obj, renditions_field, renditions)
+
+    return True
+
+
+def process_obj_media_file(
+        obj, file_field: str='file', quality: int=60, crop: bool=False, 
+        crop_size: int=500, skip_signals: bool=False, renditions_field: str=None
+    ):
+
+    """
+    Compress the image stored in obj.<file_field> in place. When
+    renditions_field is given, the downscaled renditions are generated
+    from the same decoded image and recorded on obj.<renditions_field>.
+    Returns True if the image was processed and saved.
+    """
+
+    try:
         if skip_signals:
             obj._skip_signals = True
 
-        file.save(
-            file.name, processed_image, save=False
+        processed = process_obj_image(
+            obj, file_field=file_field, quality=quality, crop=crop,
+            crop_size=crop_size, renditions_field=renditions_field
         )
 
-        obj.save(update_fields=[file_field])
+        if not processed:
+            return False
+
+        update_fields = [file_field]
+        if renditions_field:
+            update_fields.append(renditions_field)
+
+        obj.save(update_fields=update_fields)
+
+        return True
     except Exception as e:
         logger.warning(f'Exception during image processing: {e}')
+        return False
+
+
+def process_obj_media_files(
+        objs, file_field: str='file', quality: int=60, crop: bool=False,
+        crop_size: int=500, renditions_field: str=None, max_workers: int=None
+    ) -> list:
+
+    """
+    Process the images of several objects concurrently in a worker-local
+    thread pool. Pillow releases the GIL while decoding, resampling and
+    encoding, so the files are processed in parallel without forking
+    Celery's daemonic worker processes. The objects are only updated in
+    memory; the processed ones are returned for the caller to save in bulk.
+    """
+
+    def process(obj):
+        try:
+            processed = process_obj_image(
+                obj, file_field=file_field, quality=quality, crop=crop,
+                crop_size=crop_size, renditions_field=renditions_field
+            )
+            return obj if processed else None
+        except Exception as e:
+            logger.warning(f'Exception during image processing: {e}')
+            return None
+
+    objs = list(objs)
+    if not objs:
+        return []
+
+    max_workers = max_workers or getattr(settings, 'IMAGE_PROCESSING_WORKERS', 4)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(objs))) as executor:
+        processed = [obj for obj in executor.map(process, objs) if obj is not None]
+
+    return processed
@@ -0,0 +1,211 @@
+import json
+import base64
+import binascii
+
+from uuid import UUID
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values) -> str:
+
+    """
+    Encode a list of ordering key values into an opaque URL-safe cursor.
+    """
+
+    values = [
+        value.isoformat() if isinstance(value, datetime)
+        else str(value) if isinstance(value, UUID)
+        else value
+        for value in values
+    ]
+
+    raw = json.dumps(values, separators=(',', ':')).encode()
+
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+
+    """
+    Decode a cursor produced by encode_cursor. Returns None for
+    missing or malformed cursors.
+    """
+
+    if not cursor:
+        return None
+
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError):
+        return None
+
+    return values if isinstance(values, list) else None
+
+
+class CursorPage:
+
+    """
+    A page of results produced by keyset pagination. Unlike Django's
+    Page it carries no totals, only the cursor of the next page.
+    """
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return f'<CursorPage next={self.next_cursor}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def decode_score_cursor(cursor: str):
+
+    """
+    Decode a (score, id) cursor of scored entries. Returns None for
+    missing or malformed cursors.
+    """
+
+    values = decode_cursor(cursor)
+    if (
+        values and len(values) == 2
+        and all(isinstance(value, (int, float)) for value in values)
+    ):
+        return (values[0], values[1])
+
+    return None
+
+
+def paginate_scored_ids(entries, cursor: str = None, per_page: int = 5) -> CursorPage:
+
+    """
+    Paginate an in-memory list of (id, score) entries sorted by
+    (score, id) descending, such as a bounded Redis sorted set.
+    """
+
+    last_key = decode_score_cursor(cursor)
+    if last_key:
+        entries = [
+            (obj_id, score) for obj_id, score in entries
+            if (score, obj_id) < last_key
+        ]
+
+    page_entries = entries[:per_page]
+
+    next_cursor = None
+    if len(entries) > per_page:
+        obj_id, score = page_entries[-1]
+        next_cursor = encode_cursor([score, obj_id])
+
+    return CursorPage([obj_id for obj_id, _ in page_entries], next_cursor)
+
+
+def sort_by_ids(objects, ids) -> list:
+
+    """
+    Return the objects in the order of the given ids.
+    """
+
+    positions = {obj_id: position for position, obj_id in enumerate(ids)}
+
+    return sorted(objects, key=lambda obj: positions[obj.pk])
+
+
+class KeysetPaginator:
+
+    """
+    Paginate a queryset by seeking past the ordering key values of the
+    last row of the previous page, so no COUNT or OFFSET is ever run.
+    The last ordering key must be unique, e.g. ('-created', '-id').
+    """
+
+    def __init__(self, queryset, per_page: int, ordering=('-created', '-id')):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def get_seek_filter(self, values) -> Q:
+        seek = Q()
+
+        for idx, key in enumerate(self.ordering):
+            field = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+
+            condition = {
+                prev_key.lstrip('-'): values[prev_idx]
+                for prev_idx, prev_key in enumerate(self.ordering[:idx])
+            }
+            condition[f'{field}__{lookup}'] = values[idx]
+
+            seek |= Q(**condition)
+
+        return seek
+
+    def get_field(self, name: str):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+
+        if name == 'pk':
+            return self.queryset.model._meta.pk
+
+        return self.queryset.model._meta.get_field(name)
+
+    def get_cursor_values(self, cursor: str):
+
+        """
+        Decode a cursor into ordering key values converted by the fields
+        they seek on. Returns None for missing, malformed or tampered
+        cursors, which would otherwise fail in the database.
+        """
+
+        values = decode_cursor(cursor)
+        if not values or len(values) != len(self.ordering):
+            return None
+
+        try:
+            values = [
+                self.get_field(key.lstrip('-')).to_python(value)
+                for key, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            return None
+
+        if any(value is None for value in values):
+            return None
+
+        return values
+
+    def get_key_values(self, obj) -> list:
+        return [getattr(obj, key.lstrip('-')) for key in self.ordering]
+
+    def page(self, cursor: str = None) -> CursorPage:
+        queryset = self.queryset.order_by(*self.ordering)
+
+        # a malformed cursor starts from the first page
+        values = self.get_cursor_values(cursor)
+        if values:
+            queryset = queryset.filter(self.get_seek_filter(values))
+
+        object_list = list(queryset[:self.per_page + 1])
+
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = encode_cursor(self.get_key_values(object_list[-1]))
+
+        return CursorPage(object_list, next_cursor)
@@ -0,0 +1,90 @@
+import io
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from django_redis import get_redis_connection
+
+from core.celery import app as celery_app
+
+from .video import run_ffmpeg
+
+
+def make_image(
+        name='photo.png', size=(3000, 2000), mode='RGB', image_format='PNG',
+        color='red'
+    ):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, format=image_format)
+
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+def make_video(name='clip.mov', size=(1920, 1080)):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, name)
+        run_ffmpeg(
+            '-f', 'lavfi', '-i', f'testsrc=size={size[0]}x{size[1]}:rate=10:duration=1',
+            '-c:v', 'mpeg4', path
+        )
+
+        with open(path, 'rb') as file:
+            return SimpleUploadedFile(name, file.read())
+
+
+class RedisTestCase(TestCase):
+
+    """
+    TestCase for code that keeps state in Redis and queues Celery tasks.
+    Redis and the cache are flushed before every test, and tasks run
+    eagerly so their effects can be asserted right away. Callbacks
+    registered with transaction.on_commit still need
+    captureOnCommitCallbacks(execute=True) to run.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls._celery_conf = {
+            'task_always_eager': celery_app.conf.task_always_eager,
+            'task_eager_propagates': celery_app.conf.task_eager_propagates,
+        }
+        celery_app.conf.update(task_always_eager=True, task_eager_propagates=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        celery_app.conf.update(cls._celery_conf)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        get_redis_connection('default').flushdb()
+        cache.clear()
+
+
+class MediaTestCase(RedisTestCase):
+
+    """
+    RedisTestCase whose uploads are stored in a temporary MEDIA_ROOT,
+    removed after the test class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root)
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import tempfile
+import shortuuid
+
+from django.conf import settings
+from django.core.files import File
+
+
+logger = logging.getLogger(__name__)
+
+
+UPLOAD_ID_RE = re.compile(r'^[A-Za-z0-9]{22}$')
+
+MANIFEST_NAME = 'upload.json'
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class AssembledFile(File):
+
+    """
+    A File backed by an assembled upload on local disk. Like Django's
+    TemporaryUploadedFile, FileSystemStorage moves it into place
+    instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_upload_root() -> str:
+    return str(getattr(
+        settings, 'CHUNKED_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'uploads')
+    ))
+
+
+def get_chunk_size() -> int:
+    return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def get_upload_ttl() -> int:
+    return getattr(settings, 'CHUNKED_UPLOAD_TTL', 60 * 60 * 24)
+
+
+def get_upload_dir(upload_id: str) -> str:
+    return os.path.join(get_upload_root(), upload_id)
+
+
+def get_chunk_path(upload_id: str, index: int) -> str:
+    return os.path.join(get_upload_dir(upload_id), f'{index:05d}.part')
+
+
+def create_upload(user_id: int, filename: str, size: int, **meta) -> dict:
+
+    """
+    Start a chunked upload and write its manifest. The manifest never
+    changes afterwards; received chunks are tracked by the part files.
+    """
+
+    chunk_size = get_chunk_size()
+
+    upload = {
+        'id': shortuuid.uuid(),
+        'user_id': user_id,
+        'filename': os.path.basename(filename),
+        'size': size,
+        'chunk_size': chunk_size,
+        'total_chunks': max(1, -(-size // chunk_size)),
+        'created': time.time(),
+        **meta,
+    }
+
+    os.makedirs(get_upload_dir(upload['id']))
+
+    with open(os.path.join(get_upload_dir(upload['id']), MANIFEST_NAME), 'w') as manifest:
+        json.dump(upload, manifest)
+
+    return upload
+
+
+def get_upload(upload_id: str, user_id: int = None):
+
+    """
+    Return the manifest of an upload, or None if it does not exist,
+    belongs to another user or has expired.
+    """
+
+    if not UPLOAD_ID_RE.match(upload_id or ''):
+        return None
+
+    try:
+        with open(os.path.join(get_upload_dir(upload_id), MANIFEST_NAME)) as manifest:
+            upload = json.load(manifest)
+    except (OSError, ValueError):
+        return None
+
+    if user_id is not None and upload['user_id'] != user_id:
+        return None
+
+    if time.time() - upload['created'] > get_upload_ttl():
+        return None
+
+    return upload
+
+
+def get_expected_chunk_size(upload: dict, index: int) -> int:
+    if index < upload['total_chunks'] - 1:
+        return upload['chunk_size']
+    return upload['size'] - upload['chunk_size'] * (upload['total_chunks'] - 1)
+
+
+def get_received_chunks(upload: dict) -> list:
+    return sorted(
+        int(name.split('.')[0])
+        for name in os.listdir(get_upload_dir(upload['id']))
+        if name.endswith('.part')
+    )
+
+
+def get_missing_chunks(upload: dict) -> list:
+    received = set(get_received_chunks(upload))
+    return [index for index in range(upload['total_chunks']) if index not in received]
+
+
+def save_chunk(upload: dict, index: int, stream) -> bool:
+
+    """
+    Stream one chunk from a file-like object to disk. The chunk is
+    written to a temporary file and renamed into place, so a failed or
+    concurrent retry never leaves a partial part behind. Returns False
+    if the chunk does not have the expected size.
+    """
+
+    expected = get_expected_chunk_size(upload, index)
+    upload_dir = get_upload_dir(upload['id'])
+
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.tmp')
+    written = 0
+
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            while written <= expected:
+                data = stream.read(COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                tmp_file.write(data)
+                written += len(data)
+
+        if written != expected:
+            os.remove(tmp_path)
+            return False
+
+        os.replace(tmp_path, get_chunk_path(upload['id'], index))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return True
+
+
+def assemble_upload(upload: dict) -> AssembledFile:
+
+    """
+    Concatenate the chunks of a complete upload into a single file,
+    streaming each part, and remove the parts as they are consumed.
+    """
+
+    upload_dir = get_upload_dir(upload['id'])
+    path = os.path.join(upload_dir, 'assembled' + os.path.splitext(upload['filename'])[-1])
+
+    with open(path, 'wb') as assembled:
+        for index in range(upload['total_chunks']):
+            chunk_path = get_chunk_path(upload['id'], index)
+
+            with open(chunk_path, 'rb') as chunk:
+                shutil.copyfileobj(chunk, assembled, COPY_BUFFER_SIZE)
+
+            os.remove(chunk_path)
+
+    return AssembledFile(open(path, 'rb'), name=upload['filename'])
+
+
+def delete_upload(upload_id: str):
+    if UPLOAD_ID_RE.match(upload_id or ''):
+        shutil.rmtree(get_upload_dir(upload_id), ignore_errors=True)
+
+
+def delete_expired_uploads() -> int:
+
+    """
+    Remove the chunks of uploads that were abandoned past their TTL.
+    """
+
+    root = get_upload_root()
+    if not os.path.isdir(root):
+        return 0
+
+    deleted = 0
+    cutoff = time.time() - get_upload_ttl()
+
+    for upload_id in os.listdir(root):
+        upload_dir = os.path.join(root, upload_id)
+
+        try:
+            expired = os.path.getmtime(os.path.join(upload_dir, MANIFEST_NAME)) < cutoff
+        except OSError:
+            expired = os.path.getmtime(upload_dir) < cutoff
+
+        if expired:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            deleted += 1
+
+    return deleted
@@ -0,0 +1,210 @@
+import os
+import shutil
+import logging
+import tempfile
+import subprocess
+
+from django.core.files import File
+from django.conf import settings
+
+from .files import (
+    ALLOWED_VIDEO_EXTENSIONS,
+    get_file_ext,
+    get_rendition_name,
+    get_image_max_size,
+    decode_image,
+    store_image,
+    save_renditions,
+    delete_renditions
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+VIDEO_MAX_SIZE = 1280
+
+VIDEO_VARIANTS = {
+    'low': {'max_size': 640, 'crf': 30, 'audio_bitrate': '64k'},
+}
+
+
+def get_ffmpeg_path():
+    return shutil.which(getattr(settings, 'FFMPEG_PATH', 'ffmpeg'))
+
+
+def get_transcode_timeout() -> int:
+    return getattr(settings, 'VIDEO_TRANSCODE_TIMEOUT', 600)
+
+
+def scale_filter(max_size: int) -> str:
+
+    """
+    An ffmpeg scale filter fitting the video in a max_size square with
+    even dimensions, as H.264 requires. Never upscales.
+    """
+
+    ratio = f'min(1,min({max_size}/iw,{max_size}/ih))'
+    return f"scale='trunc(iw*{ratio}/2)*2':'trunc(ih*{ratio}/2)*2'"
+
+
+def run_ffmpeg(*args):
+    subprocess.run(
+        [get_ffmpeg_path(), '-hide_banner', '-loglevel', 'error', '-y', *args],
+        check=True, capture_output=True, timeout=get_transcode_timeout()
+    )
+
+
+def transcode_video(
+        source: str, destination: str, max_size: int=VIDEO_MAX_SIZE,
+        crf: int=23, audio_bitrate: str='128k'
+    ):
+
+    """
+    Transcode a video to H.264/AAC MP4 with the moov atom moved to the
+    front (faststart), so playback starts before the download finishes.
+    """
+
+    run_ffmpeg(
+        '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', scale_filter(max_size),
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(crf),
+        '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', audio_bitrate,
+        '-movflags', '+faststart',
+        destination
+    )
+
+
+def extract_poster(source: str, destination: str):
+
+    """
+    Save a representative frame from the start of a video as a JPEG.
+    """
+
+    run_ffmpeg(
+        '-i', source,
+        '-map', '0:v:0',
+        '-vf', 'thumbnail=50',
+        '-frames:v', '1', '-q:v', '2',
+        destination
+    )
+
+
+def process_video_file(file, quality: int=60):
+
+    """
+    Replace a video field file with a web-optimized MP4 and store a
+    lower-bitrate variant and a poster frame next to it. Returns the
+    variants and the poster's image renditions.
+    """
+
+    storage = file.storage
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        web_path = os.path.join(tmp_dir, 'web.mp4')
+        poster_path = os.path.join(tmp_dir, 'poster.jpg')
+
+        transcode_video(file.path, web_path)
+        extract_poster(web_path, poster_path)
+
+        variant_paths = {}
+        for variant, options in VIDEO_VARIANTS.items():
+            variant_paths[variant] = os.path.join(tmp_dir, f'{variant}.mp4')
+            transcode_video(web_path, variant_paths[variant], **options)
+
+        old_file_name = file.name
+
+        with open(web_path, 'rb') as web_file:
+            file.save(
+                os.path.splitext(os.path.basename(old_file_name))[0] + '.mp4',
+                File(web_file), save=False
+            )
+
+        if old_file_name != file.name and storage.exists(old_file_name):
+            storage.delete(old_file_name)
+
+        variants = {}
+        for variant, path in variant_paths.items():
+            name = get_rendition_name(file.name, variant, 'mp4')
+
+            if storage.exists(name):
+                storage.delete(name)
+
+            with open(path, 'rb') as variant_file:
+                variants[variant] = storage.save(name, File(variant_file))
+
+        image = decode_image(poster_path, max_size=get_image_max_size())
+
+    poster_name = store_image(
+        image, storage, get_rendition_name(file.name, 'poster', 'jpg'), quality
+    )
+
+    return variants, save_renditions(image, storage, poster_name, quality=quality)
+
+
+def process_obj_video_file(
+        obj, file_field: str='file', quality: int=60, skip_signals: bool=False,
+        renditions_field: str='renditions', variants_field: str='variants'
+    ):
+
+    """
+    Transcode the video stored in obj.<file_field> in place, recording
+    its variants on obj.<variants_field> and the renditions of its
+    poster on obj.<renditions_field>. Skipped when ffmpeg is missing.
+    Returns True if the video was processed and saved.
+    """
+
+    try:
+        file = getattr(obj, file_field, None)
+        if not file or not file.name:
+            return False
+
+        if get_file_ext(file.name) not in ALLOWED_VIDEO_EXTENSIONS:
+            return False
+
+        if not get_ffmpeg_path():
+            logger.warning(f'ffmpeg not found, skipping video processing: {file.name}')
+            return False
+
+        if skip_signals:
+            obj._skip_signals = True
+
+        old_renditions = getattr(obj, renditions_field, None)
+        old_variants = getattr(obj, variants_field, None) or {}
+
+        variants, renditions = process_video_file(file, quality=quality)
+
+        delete_renditions(
+            file.storage, old_renditions,
+            keep={
+                name for stored in renditions.values()
+                for key, name in stored.items() if key not in ('width', 'height')
+            }
+        )
+
+        for name in old_variants.values():
+            if name not in variants.values() and file.storage.exists(name):
+                file.storage.delete(name)
+
+        setattr(obj, renditions_field, renditions)
+        setattr(obj, variants_field, variants)
+
+        obj.save(update_fields=[file_field, renditions_field, variants_field])
+
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.warning(
+            f'ffmpeg failed for {obj}: {e.stderr.decode(errors="replace")[-500:]}'
+        )
+    except Exception as e:
+        logger.warning(f'Exception during video processing: {e}')
+
+    return False
+
+
+def get_variant_urls(file, variants: dict) -> dict:
+    if not file:
+        return {}
+    return {variant: file.storage.url(name) for variant, name in (variants or {}).items()}